@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import tempfile
+
 import django_heroku
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.IPWhitelistMiddleware',
+    'core.middleware.DataLoaderMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'core.middleware.JsonDebugToolbarMiddleware',
 ]
@@ -113,6 +116,32 @@ DATABASES = {
 
 CACHE_ENABLED = True
 
+# Search results are cached in a backend that all worker processes can
+# reach, so a popular search only has to be computed once per deploy.
+RESULT_CACHE_ALIAS = 'results'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    RESULT_CACHE_ALIAS: {
+        'BACKEND': os.getenv(
+            'RESULT_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'RESULT_CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'bookslikethis-results')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+}
+
+# Optional file written by the build_index command. Processes load search
+# data from it instead of the DB when it matches the current data.
+INDEX_SNAPSHOT_PATH = os.getenv('INDEX_SNAPSHOT_PATH')
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -18,12 +18,15 @@ from django.urls import include
 from django.urls import path
 from django.views import generic
 
+from core.views import health_view
 from core.views import homepage_view
 from core.views import search_views
 
 urlpatterns = [
     path('api/search/', search_views.SearchView.as_view()),
+    path('api/search/batch/', search_views.BatchSearchView.as_view()),
     path('api/autocomplete/', search_views.AutocompleteView.as_view()),
+    path('healthz', health_view.HealthView.as_view()),
     path('search/', homepage_view.HomepageView.as_view()),
     path('robots.txt', generic.TemplateView.as_view(
         template_name='robots.txt', content_type='text/plain')),
@@ -1,19 +1,80 @@
 import functools
+import hashlib
+import time
 
 from django.conf import settings
+from django.core import cache as dj_cache
+from django.db import models as dj_models
+
+from core import models
+
+# Max seconds a process goes without rechecking the data generation.
+DATA_GENERATION_CHECK_INTERVAL = 10
+
+# This process's last seen data generation, and when it was checked.
+_data_generation = {'generation': None, 'checked_at': None}
+
+
+def get_data_generation():
+    """Gets the current content data generation.
+
+    The generation changes whenever content data is loaded or cleared,
+    across all processes. The DB is checked at most once every
+    DATA_GENERATION_CHECK_INTERVAL seconds per process.
+
+    Returns:
+        Integer generation. 0 if content data has never changed.
+    """
+    now = time.monotonic()
+    checked_at = _data_generation['checked_at']
+    if (checked_at is None or
+            now - checked_at >= DATA_GENERATION_CHECK_INTERVAL):
+        generation = models.DataGeneration.objects.filter(
+            id=models.DataGeneration.SINGLETON_ID).values_list(
+            'generation', flat=True).first()
+        _data_generation['generation'] = generation or 0
+        _data_generation['checked_at'] = now
+    return _data_generation['generation']
+
+
+def bump_data_generation():
+    """Marks all cached content data as stale, in every process.
+
+    Call this after changing content data.
+    """
+    models.DataGeneration.objects.get_or_create(
+        id=models.DataGeneration.SINGLETON_ID)
+    models.DataGeneration.objects.filter(
+        id=models.DataGeneration.SINGLETON_ID).update(
+        generation=dj_models.F('generation') + 1)
+    forget_data_generation()
+
+
+def forget_data_generation():
+    """Makes the next get_data_generation call recheck the DB."""
+    _data_generation['checked_at'] = None
 
 
 def lru_cache(maxsize=None, typed=False):
     """Wraps functools.lru_cache to obey a setting at function call time.
 
     "settings.CACHE_ENABLED = False" will disable any caching.
+
+    The cache is cleared when the data generation changes.
+    See get_data_generation. The decorated function's cache_generation()
+    returns the generation of the cached data, or None before any call.
     """
     def wrapper(func):
         lru_func = functools.lru_cache(
             maxsize=maxsize, typed=typed)(func)
+        cached_generation = [None]
 
         def inner(*args, **kwargs):
             if settings.CACHE_ENABLED:
+                generation = get_data_generation()
+                if generation != cached_generation[0]:
+                    lru_func.cache_clear()
+                    cached_generation[0] = generation
                 return lru_func(*args, **kwargs)
             else:
                 return func(*args, **kwargs)
@@ -23,6 +84,107 @@ def lru_cache(maxsize=None, typed=False):
         # so no functionality is lost.
         inner.cache_info = lru_func.cache_info
         inner.cache_clear = lru_func.cache_clear
+        inner.cache_generation = lambda: cached_generation[0]
         return functools.update_wrapper(inner, func)
 
     return wrapper
+
+
+def get_result_cache():
+    """Gets the cache backend shared by all processes.
+
+    See settings.RESULT_CACHE_ALIAS.
+
+    Returns:
+        A Django cache backend.
+    """
+    return dj_cache.caches[settings.RESULT_CACHE_ALIAS]
+
+
+def make_result_key(prefix, key_parts):
+    """Builds a fixed length result cache key.
+
+    Keys from arbitrarily large arguments stay within backend key
+    length limits, such as memcached's 250 characters.
+
+    Args:
+        prefix: String namespace for the key.
+        key_parts: Tuple of values identifying the result. Its repr must be
+            stable across processes, so use sorted tuples, not sets or dicts.
+
+    Returns:
+        String cache key.
+    """
+    digest = hashlib.sha1(repr(key_parts).encode('utf-8')).hexdigest()
+    return '%s:%s' % (prefix, digest)
+
+
+def get_or_compute_result(prefix, key_parts, compute, version=None):
+    """Fetches a result from the shared result cache, computing it on a miss.
+
+    "settings.CACHE_ENABLED = False" will disable any caching.
+
+    Results are also keyed on the data generation, so a data change makes
+    older results unreachable. See get_data_generation.
+
+    Args:
+        prefix: String namespace for the key.
+        key_parts: Tuple of values identifying the result.
+            See make_result_key.
+        compute: Callable taking no arguments that returns the result.
+            Must not return None, and the result must be picklable.
+        version: Optional, integer version of the result format. Bump this
+            to ignore results stored by older code.
+
+    Returns:
+        The cached or newly computed result.
+    """
+    if not settings.CACHE_ENABLED:
+        return compute()
+    result_cache = get_result_cache()
+    key = make_result_key(prefix, key_parts + (get_data_generation(),))
+    result = result_cache.get(key, version=version)
+    if result is None:
+        result = compute()
+        result_cache.set(key, result, version=version)
+    return result
+
+
+def get_or_compute_results(prefix, key_parts_list, compute_many, version=None):
+    """Fetches many results from the shared result cache at once.
+
+    Like get_or_compute_result, but with one cache round trip for all
+    lookups and one for all stores, and a single call to compute every
+    missing result.
+
+    Args:
+        prefix: String namespace for the keys.
+        key_parts_list: List of key_parts tuples. See make_result_key.
+        compute_many: Callable taking a list of the key_parts tuples
+            missing from the cache, and returning a list of their results
+            in the same order. Results must not be None, and must be
+            picklable.
+        version: Optional, integer version of the result format.
+
+    Returns:
+        List of results, in the same order as key_parts_list.
+    """
+    key_parts_list = list(key_parts_list)
+    if not settings.CACHE_ENABLED:
+        return list(compute_many(key_parts_list))
+    result_cache = get_result_cache()
+    generation = get_data_generation()
+    keys = [
+        make_result_key(prefix, key_parts + (generation,))
+        for key_parts in key_parts_list]
+    key_to_result = result_cache.get_many(keys, version=version)
+    key_to_missing_parts = {
+        key: key_parts for (key, key_parts) in zip(keys, key_parts_list)
+        if key not in key_to_result}
+    if key_to_missing_parts:
+        computed = dict(zip(
+            key_to_missing_parts.keys(),
+            compute_many(list(key_to_missing_parts.values()))))
+        result_cache.set_many(computed, version=version)
+        key_to_result.update(computed)
+    return [key_to_result[key] for key in keys]
@@ -1,4 +1,8 @@
+import time
+from unittest import mock
+
 from core import cache
+from core import models
 from core import test
 
 
@@ -50,6 +54,20 @@ class LRUCacheTest(test.TestCase):
         self.assertEqual(cache_info.hits, 0)
         self.assertEqual(cache_info.misses, 0)
 
+    def test_data_generation_change(self):
+        self.assertEqual(self.add(1, 1), 2)
+        self.assertEqual(self.add(1, 1), 2)
+        self.assertEqual(self.add.cache_info().hits, 1)
+
+        self.assertEqual(self.add.cache_generation(), 0)
+
+        cache.bump_data_generation()
+        self.assertEqual(self.add(1, 1), 2)
+        cache_info = self.add.cache_info()
+        self.assertEqual(cache_info.hits, 0)
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(self.add.cache_generation(), 1)
+
     def test_clear(self):
         self.assertEqual(self.add(1, 1), 2)
         self.assertEqual(self.add(1, 1), 2)
@@ -62,3 +80,116 @@ class LRUCacheTest(test.TestCase):
         cache_info = self.add.cache_info()
         self.assertEqual(cache_info.hits, 0)
         self.assertEqual(cache_info.misses, 1)
+
+
+class DataGenerationTest(test.TestCase):
+
+    def test_happy(self):
+        self.assertEqual(cache.get_data_generation(), 0)
+        cache.bump_data_generation()
+        self.assertEqual(cache.get_data_generation(), 1)
+        cache.bump_data_generation()
+        self.assertEqual(cache.get_data_generation(), 2)
+
+    def test_check_interval(self):
+        self.assertEqual(cache.get_data_generation(), 0)
+        # Simulate another process changing the data.
+        models.DataGeneration.objects.create(
+            id=models.DataGeneration.SINGLETON_ID, generation=5)
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_data_generation(), 0)
+
+        with mock.patch.object(
+                cache.time, 'monotonic',
+                return_value=(time.monotonic() +
+                              cache.DATA_GENERATION_CHECK_INTERVAL)):
+            self.assertEqual(cache.get_data_generation(), 5)
+
+
+class MakeResultKeyTest(test.TestCase):
+
+    def test_happy(self):
+        key = cache.make_result_key('prefix', ((1, 2), (('a', 1),)))
+        self.assertTrue(key.startswith('prefix:'))
+        self.assertEqual(
+            key, cache.make_result_key('prefix', ((1, 2), (('a', 1),))))
+        self.assertNotEqual(
+            key, cache.make_result_key('prefix', ((1, 3), (('a', 1),))))
+        self.assertNotEqual(
+            key, cache.make_result_key('other', ((1, 2), (('a', 1),))))
+
+    def test_long_key_parts(self):
+        key = cache.make_result_key('prefix', (tuple(range(1000)),))
+        self.assertLess(len(key), 250)
+
+
+class GetOrComputeResultTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_happy(self):
+        compute = mock.Mock(return_value=[1, 2])
+        self.assertEqual(
+            cache.get_or_compute_result('test', (1,), compute), [1, 2])
+        self.assertEqual(
+            cache.get_or_compute_result('test', (1,), compute), [1, 2])
+        compute.assert_called_once_with()
+
+        cache.get_or_compute_result('test', (2,), compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_version(self):
+        compute = mock.Mock(return_value=[1, 2])
+        cache.get_or_compute_result('test', (1,), compute, version=1)
+        cache.get_or_compute_result('test', (1,), compute, version=2)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_data_generation(self):
+        compute = mock.Mock(return_value=[1, 2])
+        cache.get_or_compute_result('test', (1,), compute)
+        cache.bump_data_generation()
+        cache.get_or_compute_result('test', (1,), compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_disabled(self):
+        compute = mock.Mock(return_value=[1, 2])
+        with self.settings(CACHE_ENABLED=False):
+            cache.get_or_compute_result('test', (1,), compute)
+            cache.get_or_compute_result('test', (1,), compute)
+        self.assertEqual(compute.call_count, 2)
+
+
+class GetOrComputeResultsTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_happy(self):
+        compute_many = mock.Mock(
+            side_effect=lambda key_parts_list: [
+                key_parts[0] * 10 for key_parts in key_parts_list])
+        self.assertEqual(
+            cache.get_or_compute_results(
+                'test', [(1,), (2,), (1,)], compute_many),
+            [10, 20, 10])
+        compute_many.assert_called_once_with([(1,), (2,)])
+
+        self.assertEqual(
+            cache.get_or_compute_results(
+                'test', [(2,), (3,)], compute_many),
+            [20, 30])
+        compute_many.assert_called_with([(3,)])
+
+    def test_shared_with_single_lookups(self):
+        cache.get_or_compute_result('test', (1,), lambda: 10)
+        compute_many = mock.Mock(return_value=[])
+        self.assertEqual(
+            cache.get_or_compute_results('test', [(1,)], compute_many),
+            [10])
+        compute_many.assert_not_called()
+
+    def test_disabled(self):
+        compute_many = mock.Mock(return_value=[10])
+        with self.settings(CACHE_ENABLED=False):
+            cache.get_or_compute_results('test', [(1,)], compute_many)
+            cache.get_or_compute_results('test', [(1,)], compute_many)
+        self.assertEqual(compute_many.call_count, 2)
@@ -1,59 +1,132 @@
+import numpy as np
+
 from core import models
 from core import cache
+from core import data_loader
+from core import index_snapshot
+from core import trope_store
+from django.db import connection
 from django.db import models as dj_models
 
 
-def get_tropes(tag_names=None):
-    """Fetches all tropes.
+def get_trope_ids(tag_names=None):
+    """Fetches trope ids.
 
     Args:
         tag_names: Iterable of tag names to limit tropes to.
 
     Returns:
-        List of models.Trope objects, with tags prefetched.
+        List of integer trope ids, ascending.
     """
-    tropes = _get_tropes()
     if tag_names is None:
-        return tropes
+        return get_trope_store().get_trope_ids()
+    return list(_get_sorted_trope_ids(_canonicalize_tag_names(tag_names)))
 
-    filtered_tropes = []
-    tag_names = set(tag_names)
-    for trope in tropes:
-        if trope.get_tag_set().intersection(tag_names):
-            filtered_tropes.append(trope)
-    return filtered_tropes
 
+def get_trope_id_set(tag_names):
+    """Fetches the ids of tropes with any of the given tags, as a set.
 
-@cache.lru_cache(maxsize=1)
-def _get_tropes():
-    """Fetches all tropes.
+    Args:
+        tag_names: Iterable of tag names to limit tropes to.
 
     Returns:
-        List of models.Trope objects, with tag names prefetched.
+        frozenset of integer trope ids.
     """
-    tropes = list(models.Trope.objects.all())
-    trope_id_to_tags = get_tags_for_tropes([t.id for t in tropes])
-    for trope in tropes:
-        trope.set_tag_set(trope_id_to_tags[trope.id])
-    return tropes
+    return _get_trope_id_set(_canonicalize_tag_names(tag_names))
 
 
 @cache.lru_cache(maxsize=32)
-def get_trope_to_occurrence_count(tag_names=None):
+def _get_trope_id_set(tag_names):
+    """See get_trope_id_set. tag_names must be canonicalized."""
+    return get_trope_store().get_trope_id_set(tag_names)
+
+
+@cache.lru_cache(maxsize=32)
+def _get_sorted_trope_ids(tag_names):
+    """See get_trope_ids. tag_names must be canonicalized.
+
+    Returns:
+        Tuple of integer trope ids, ascending.
+    """
+    return tuple(sorted(_get_trope_id_set(tag_names)))
+
+
+def _canonicalize_tag_names(tag_names):
+    """Orders and dedupes tag names, so equal sets share cache entries.
+
+    Args:
+        tag_names: Iterable of string tag names, or None.
+
+    Returns:
+        Sorted tuple of unique string tag names, or None.
+    """
+    if tag_names is None:
+        return None
+    return tuple(sorted(set(tag_names)))
+
+
+@cache.lru_cache(maxsize=1)
+def get_trope_store():
+    """Fetches every trope and its tags.
+
+    Returns:
+        trope_store.TropeStore object.
+    """
+    return trope_store.TropeStore(
+        get_all_trope_ids(), *get_trope_tag_edges())
+
+
+def get_all_trope_ids(use_snapshot=True):
+    """Fetches the id of every trope.
+
+    Args:
+        use_snapshot: Optional, boolean, whether to read the index snapshot
+            instead of the DB when one is available.
+
+    Returns:
+        numpy int64 array of trope ids.
+    """
+    snapshot = index_snapshot.get_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        return snapshot.arrays['trope_ids']
+    return np.array(
+        list(models.Trope.objects.values_list('id', flat=True)),
+        dtype=np.int64)
+
+
+def get_trope_to_occurrence_count(tag_names=None, use_snapshot=True):
     """Gets number of works per trope.
 
     Args:
         tag_names: Optional, tuple of string trope tag names.
             If supplied, only tropes with at least one of those
             tags will be counted.
+        use_snapshot: Optional, boolean, whether to read the index snapshot
+            instead of the DB when one is available.
 
     Returns:
         Dict of integer trope id to integer count of works.
         Tropes with zero works are omitted.
     """
-    tropes = get_tropes(tag_names=tag_names)
+    return _get_trope_to_occurrence_count(
+        _canonicalize_tag_names(tag_names), use_snapshot=use_snapshot)
+
+
+@cache.lru_cache(maxsize=32)
+def _get_trope_to_occurrence_count(tag_names, use_snapshot=True):
+    """See get_trope_to_occurrence_count. tag_names must be canonicalized."""
+    trope_ids = get_trope_ids(tag_names=tag_names)
+    snapshot = index_snapshot.get_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        trope_ids = set(trope_ids)
+        return {
+            trope_id: count for (trope_id, count) in zip(
+                snapshot.arrays['occurrence_trope_ids'].tolist(),
+                snapshot.arrays['occurrence_counts'].tolist())
+            if trope_id in trope_ids}
+
     trope_works = models.TropeWork.objects.filter(
-        trope_id__in=[t.id for t in tropes])
+        trope_id__in=trope_ids)
     return {
         tw['trope']: tw['num_works']
         for tw in trope_works.values('trope').annotate(
@@ -61,12 +134,24 @@ def get_trope_to_occurrence_count(tag_names=None):
 
 
 @cache.lru_cache(maxsize=1)
-def get_genre_info():
+def get_genre_info(use_snapshot=True):
     """Fetches genre information.
 
+    Args:
+        use_snapshot: Optional, boolean, whether to read the index snapshot
+            instead of the DB when one is available.
+
     Returns:
         Dict of genre id to (name, depth) tuple.
     """
+    snapshot = index_snapshot.get_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        return {
+            genre_id: (name, depth) for (genre_id, name, depth) in zip(
+                snapshot.arrays['genre_ids'].tolist(),
+                snapshot.metadata['genre_names'],
+                snapshot.arrays['genre_depths'].tolist())}
+
     genre_id_to_name = {}
     genre_map = {}
     for genre_id, genre_name, parent_id in (
@@ -90,66 +175,148 @@ def get_genre_info():
     return genre_id_to_name_and_depth
 
 
-def get_genres_with_depth_for_works(work_ids):
-    """Fetch genres for a list of works.
+def get_trope_work_edges(use_snapshot=True):
+    """Fetches every distinct trope-work connection.
 
     Args:
-        work_ids: List of work ids.
+        use_snapshot: Optional, boolean, whether to read the index snapshot
+            instead of the DB when one is available.
 
     Returns:
-        Dict of work id to set of (genre name, genre depth) tuples.
-        Depth indicates the genre's depth in the genre hierarchy -
-        genres may have parents, and depth 0 indicates a root genre.
+        Tuple of two equal length numpy int64 arrays: work ids, and the
+        id of the trope connected to the work at the same position.
     """
-    genre_id_to_name_and_depth = get_genre_info()
+    snapshot = index_snapshot.get_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        return (
+            snapshot.arrays['trope_work_work_ids'],
+            snapshot.arrays['trope_work_trope_ids'])
+    edges = np.array(
+        list(models.TropeWork.objects.order_by().values_list(
+            'work_id', 'trope_id').distinct()),
+        dtype=np.int64).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def get_genre_work_edges(use_snapshot=True):
+    """Fetches every distinct genre-work connection.
+
+    Args:
+        use_snapshot: Optional, boolean, whether to read the index snapshot
+            instead of the DB when one is available.
+
+    Returns:
+        Tuple of two equal length numpy int64 arrays: work ids, and the
+        id of the genre connected to the work at the same position.
+    """
+    snapshot = index_snapshot.get_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        return (
+            snapshot.arrays['genre_work_work_ids'],
+            snapshot.arrays['genre_work_genre_ids'])
+    edges = np.array(
+        list(models.GenreMap.objects.order_by().values_list(
+            'work_id', 'genre_id').distinct()),
+        dtype=np.int64).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def get_trope_tag_edges(use_snapshot=True):
+    """Fetches every trope-tag connection.
+
+    Args:
+        use_snapshot: Optional, boolean, whether to read the index snapshot
+            instead of the DB when one is available.
 
-    work_id_to_genre_name_and_depth = {wid: set([]) for wid in work_ids}
-    for work_id, genre_id in models.GenreMap.objects.filter(
-            work_id__in=work_ids).values_list('work_id', 'genre_id'):
-        work_id_to_genre_name_and_depth[work_id].add(
-            genre_id_to_name_and_depth[genre_id])
+    Returns:
+        Tuple of two equal length sequences: a numpy int64 array of trope
+        ids, and a list of the string name of the tag connected to the
+        trope at the same position.
+    """
+    snapshot = index_snapshot.get_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        tag_names = snapshot.metadata['tag_names']
+        return (
+            snapshot.arrays['trope_tag_trope_ids'],
+            [tag_names[i]
+             for i in snapshot.arrays['trope_tag_tag_indexes'].tolist()])
+    edges = list(models.TropeTagMap.objects.order_by().values_list(
+        'trope_id', 'trope_tag__name').distinct())
+    return (
+        np.array([trope_id for (trope_id, _) in edges], dtype=np.int64),
+        [tag_name for (_, tag_name) in edges])
 
-    return work_id_to_genre_name_and_depth
 
+def get_precomputed_similar_works(work_id, limit=None):
+    """Fetches stored similarity search results for a single work.
 
-def get_work_ids_with_tropes(trope_ids):
-    """Fetches works with at least one of the given tropes.
+    See the build_similar_works command.
 
     Args:
-        trope_ids: List of trope ids.
+        work_id: Integer work id.
+        limit: Optional, integer max number of results to return.
+            None means unlimited.
 
     Returns:
-        Set of work ids.
+        None if there are no stored results for the work. Otherwise, a
+        tuple of:
+            List of work ids, most similar first.
+            Dict of trope id to distinctiveness rating. Has entries for
+                the work's tropes that are shared with any stored result.
     """
-    if not trope_ids:
-        return set([])
-    return set(models.TropeWork.objects.filter(
-        trope_id__in=trope_ids).values_list(
-        'work_id', flat=True))
+    return get_precomputed_similar_works_by_work_id(
+        [work_id], limit=limit).get(work_id)
 
 
-def get_tags_for_tropes(trope_ids):
-    """Fetches tags associated with each trope.
+def get_precomputed_similar_works_by_work_id(work_ids, limit=None):
+    """Fetches stored similarity search results for many single works.
 
     Args:
-        trope_ids: Iterable of trope ids.
+        work_ids: Iterable of integer work ids.
+        limit: Optional, integer max number of results to return per work.
+            None means unlimited.
 
     Returns:
-        Dict of trope id to frozenset of string tag names.
+        Dict of work id to a tuple, as returned by
+        get_precomputed_similar_works. Works without stored results are
+        omitted.
     """
-    trope_id_to_tags = {tid: set() for tid in trope_ids}
-    for trope_id, tag_name in models.TropeTagMap.objects.filter(
-            trope_id__in=trope_ids).select_related(
-            'trope_tag').values_list(
-            'trope_id', 'trope_tag__name'):
-        trope_id_to_tags[trope_id].add(tag_name)
+    work_id_to_results = data_loader.load_many(
+        ('precomputed_similar_works', limit), work_ids,
+        lambda missing_work_ids: _get_precomputed_similar_works_by_work_id(
+            missing_work_ids, limit))
     return {
-        tid: frozenset(tags)
-        for (tid, tags) in trope_id_to_tags.items()}
+        work_id: results for (work_id, results) in work_id_to_results.items()
+        if results is not None}
+
+
+def _get_precomputed_similar_works_by_work_id(work_ids, limit):
+    """See get_precomputed_similar_works_by_work_id."""
+    # Results computed from older data are ignored.
+    similar_works = models.SimilarWork.objects.filter(
+        work_id__in=work_ids, data_generation=cache.get_data_generation())
+    if limit is not None:
+        similar_works = similar_works.filter(rank__lt=limit)
+    work_id_to_similar_work_ids = {}
+    for work_id, similar_work_id in similar_works.order_by(
+            'work_id', 'rank').values_list('work_id', 'similar_work_id'):
+        work_id_to_similar_work_ids.setdefault(work_id, []).append(
+            similar_work_id)
+    work_id_to_trope_weights = {
+        work_id: {} for work_id in work_id_to_similar_work_ids}
+    for work_id, trope_id, weight in (
+            models.SimilarWorkTropeWeight.objects.filter(
+                work_id__in=work_id_to_similar_work_ids.keys()).values_list(
+                'work_id', 'trope_id', 'weight')):
+        work_id_to_trope_weights[work_id][trope_id] = weight
+    return {
+        work_id: (similar_work_ids, work_id_to_trope_weights[work_id])
+        for (work_id, similar_work_ids) in
+        work_id_to_similar_work_ids.items()}
 
 
-def get_tropes_by_work_id(work_ids, tag_names=None):
-    """Fetches tropes associated with each work.
+def get_trope_ids_by_work_id(work_ids, tag_names=None):
+    """Fetches ids of the tropes associated with each work.
 
     Args:
         work_ids: List of work ids.
@@ -157,19 +324,38 @@ def get_tropes_by_work_id(work_ids, tag_names=None):
             limit tropes to.
 
     Returns:
-        Dict of work id to set of models.Trope objects.
+        Dict of work id to set of integer trope ids.
+    """
+    tag_names = _canonicalize_tag_names(tag_names)
+    allowed_trope_ids = (
+        get_trope_id_set(tag_names) if tag_names is not None else None)
+    return data_loader.load_many(
+        ('trope_ids_by_work_id', tag_names), work_ids,
+        lambda missing_work_ids: _get_trope_ids_by_work_id(
+            missing_work_ids, allowed_trope_ids))
+
+
+def _get_trope_ids_by_work_id(work_ids, allowed_trope_ids):
+    """See get_trope_ids_by_work_id.
+
+    Args:
+        work_ids: List of work ids.
+        allowed_trope_ids: Set of trope ids to limit tropes to, or None.
     """
     if not work_ids:
         return {}
-    tropes = {t.id: t for t in get_tropes(tag_names=tag_names)}
     trope_works = models.TropeWork.objects.filter(
         work_id__in=work_ids).values_list('work_id', 'trope_id')
 
-    work_to_tropes = {wid: set([]) for wid in work_ids}
-    for work_id, trope_id in trope_works:
-        if trope_id in tropes:
-            work_to_tropes[work_id].add(tropes[trope_id])
-    return work_to_tropes
+    work_to_trope_ids = {wid: set([]) for wid in work_ids}
+    if allowed_trope_ids is None:
+        for work_id, trope_id in trope_works:
+            work_to_trope_ids[work_id].add(trope_id)
+    else:
+        for work_id, trope_id in trope_works:
+            if trope_id in allowed_trope_ids:
+                work_to_trope_ids[work_id].add(trope_id)
+    return work_to_trope_ids
 
 
 def get_work_ids_by_name(work_names):
@@ -181,78 +367,92 @@ def get_work_ids_by_name(work_names):
     Returns:
         List of work ids in no particular order.
     """
-    return list(models.Work.objects.filter(
-        name__in=work_names).values_list('id', flat=True))
+    name_to_work_ids = data_loader.load_many(
+        'work_ids_by_name', work_names, _get_work_ids_by_name)
+    return list({
+        work_id for work_ids in name_to_work_ids.values()
+        for work_id in work_ids or ()})
+
+
+def _get_work_ids_by_name(work_names):
+    """Fetches work ids for each name.
+
+    Returns:
+        Dict of string work name to list of work ids.
+    """
+    name_to_work_ids = {}
+    for work_id, name in models.Work.objects.filter(
+            name__in=work_names).values_list('id', 'name'):
+        name_to_work_ids.setdefault(name, []).append(work_id)
+    return name_to_work_ids
 
 
-def get_work_info_dicts_by_id(
-        work_ids, allowed_trope_id_to_weight=None, max_tropes_per_work=10):
-    """Fetches work info by id.
+def get_ranked_trope_ids_by_work_id(
+        work_ids, allowed_trope_id_to_weight=None, max_tropes_per_work=None):
+    """Ranks the tropes of works in the DB, fetching only the top ones.
+
+    The allowed tropes and their weights are sent with the query, and a
+    window function ranks each work's tropes, so trope rows beyond
+    max_tropes_per_work never leave Postgres.
 
     Args:
-        work_ids: List of work ids.
+        work_ids: Iterable of work ids.
         allowed_trope_id_to_weight: Optional, dict of trope id to float
-            weight. Limits the tropes returned with each work to ones in
-            this dict. The returned tropes are also ordered according to
-            their associated weight value, highest first. Pass None to return
-            all tropes in no specific order.
-        max_tropes_per_work: Optional, integer max trope dicts to return
-            with any work. Pass None for unlimited.
+            weight. Pass None to allow every trope, ordered by id.
+        max_tropes_per_work: Optional, integer max trope ids to return per
+            work. Pass None for unlimited.
 
     Returns:
-        List of dicts with these fields:
-            -id
-            -name
-            -url
-            -creator: dict with name and url fields
-            -genre: list of unique genre names.
-            -tropes:  list of trope info dicts for shared tropes, ordered by
-                allowed_trope_id_to_weights. Has these keys:
-                -id
-                -name
-                -url
-                -laconic_description
-            -total_shared_tropes: Integer, total shared allowed tropes.
-                Ignores max_tropes_per_work.
-        Results follow the same order as the work_ids argument.
-
-    Raises:
-        DoesNotExist if any work_id is not found in the DB.
+        Tuple of two dicts, keyed by work id. Works without allowed tropes
+        are omitted.
+            -List of trope ids, highest weight first, then by id.
+            -Integer count of every allowed trope of the work.
     """
-    id_to_work = {
-        w.id: w for w in models.Work.objects.filter(
-            id__in=work_ids).select_related(
-            'creator').prefetch_related('genres', 'tropes')}
-    info_dicts = []
-    for work_id in work_ids:
-        if work_id not in id_to_work:
-            raise models.Work.DoesNotExist
-        work = id_to_work[work_id]
-        info_dict = {
-            'id': work.id, 'name': work.name, 'url': work.url,
-            'creator': ({'id': work.creator.id,
-                         'name': work.creator.name,
-                         'url': work.creator.url}
-                        if work.creator else None),
-            'genres': list({g.name for g in work.genres.all()}),
-        }
-        # Add trope data, filtered and sorted by weight if applicable.
-        tropes = [{
-            'id': t.id,
-            'name': t.name,
-            'url': t.url,
-            'laconic_description': t.laconic_description}
-            for t in work.tropes.all()
-            if (allowed_trope_id_to_weight is None or
-                t.id in allowed_trope_id_to_weight)]
-        if allowed_trope_id_to_weight is not None:
-            tropes = sorted(
-                tropes,
-                key=lambda td: allowed_trope_id_to_weight[td['id']],
-                reverse=True)
-        info_dict['total_shared_tropes'] = len(tropes)
-        if max_tropes_per_work is not None:
-            tropes = tropes[:max_tropes_per_work]
-        info_dict['tropes'] = tropes
-        info_dicts.append(info_dict)
-    return info_dicts
+    params = [list(work_ids)]
+    if allowed_trope_id_to_weight is None:
+        weight_join = ''
+        order_by = 'tw.trope_id'
+    else:
+        if not allowed_trope_id_to_weight:
+            return {}, {}
+        weight_join = (
+            'JOIN unnest(%s::integer[], %s::double precision[]) '
+            'AS w(trope_id, weight) ON w.trope_id = tw.trope_id')
+        params.append(list(allowed_trope_id_to_weight.keys()))
+        params.append(
+            [float(w) for w in allowed_trope_id_to_weight.values()])
+        order_by = 'w.weight DESC, tw.trope_id'
+    rank_filter = ''
+    if max_tropes_per_work is not None:
+        # Keep one row per work even when max is 0, for the total count.
+        rank_filter = 'WHERE ranked.rank <= GREATEST(%s, 1)'
+        params.append(max_tropes_per_work)
+    sql = '''
+        SELECT ranked.work_id, ranked.trope_id, ranked.rank, ranked.total
+        FROM (
+            SELECT
+                tw.work_id,
+                tw.trope_id,
+                ROW_NUMBER() OVER (
+                    PARTITION BY tw.work_id ORDER BY {order_by}) AS rank,
+                COUNT(*) OVER (PARTITION BY tw.work_id) AS total
+            FROM (
+                SELECT DISTINCT work_id, trope_id FROM {table}
+                WHERE work_id = ANY(%s)) AS tw
+            {weight_join}
+        ) AS ranked
+        {rank_filter}
+        ORDER BY ranked.work_id, ranked.rank
+    '''.format(
+        order_by=order_by, table=models.TropeWork._meta.db_table,
+        weight_join=weight_join, rank_filter=rank_filter)
+    work_id_to_trope_ids = {}
+    work_id_to_total = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for work_id, trope_id, rank, total in cursor.fetchall():
+            work_id_to_total[work_id] = total
+            trope_ids = work_id_to_trope_ids.setdefault(work_id, [])
+            if max_tropes_per_work is None or rank <= max_tropes_per_work:
+                trope_ids.append(trope_id)
+    return work_id_to_trope_ids, work_id_to_total
@@ -1,25 +1,24 @@
-from unittest import mock
-
+from core import cache
 from core import data_api
 from core import factories
 from core import models
 from core import test
 
 
-class GetTropesTest(test.TestCase):
+class GetTropeIdsTest(test.TestCase):
 
     def test_empty_db(self):
-        self.assertEqual(data_api.get_tropes(), [])
-        self.assertEqual(data_api.get_tropes(tag_names=('tag', )), [])
+        self.assertEqual(data_api.get_trope_ids(), [])
+        self.assertEqual(data_api.get_trope_ids(tag_names=('tag', )), [])
 
     def test_happy(self):
         trope = factories.TropeFactory.create()
         trope_two = factories.TropeFactory.create()
-        self.assertEqual(
-            set(data_api.get_tropes()), {trope, trope_two})
+        self.assertEqual(data_api.get_trope_ids(), [trope.id, trope_two.id])
         trope_three = factories.TropeFactory.create()
         self.assertEqual(
-            set(data_api.get_tropes()), {trope, trope_two, trope_three})
+            data_api.get_trope_ids(),
+            [trope.id, trope_two.id, trope_three.id])
 
     def test_tag_filter(self):
         trope_tag = factories.TropeTagFactory.create(name='it')
@@ -27,32 +26,32 @@ class GetTropesTest(test.TestCase):
         trope = factories.TropeFactory.create(tags=[trope_tag])
         trope_two = factories.TropeFactory.create(tags=[trope_tag_two])
         self.assertEqual(
-            data_api.get_tropes(tag_names=('not it', )),
+            data_api.get_trope_ids(tag_names=('not it', )),
             [])
         self.assertEqual(
-            data_api.get_tropes(tag_names=(trope_tag.name, )),
-            [trope])
+            data_api.get_trope_ids(tag_names=(trope_tag.name, )),
+            [trope.id])
         self.assertEqual(
-            set(data_api.get_tropes(
-                tag_names=(trope_tag.name, trope_tag_two.name))),
-            {trope, trope_two})
+            data_api.get_trope_ids(
+                tag_names=(trope_tag.name, trope_tag_two.name)),
+            [trope.id, trope_two.id])
 
 
-class GetTropesCacheTest(test.TestCase):
+class GetTropeStoreCacheTest(test.TestCase):
 
     MOCK_CACHE = False
 
     def setUp(self):
-        data_api._get_tropes.cache_clear()
+        data_api.get_trope_store.cache_clear()
 
     def test_caching(self):
-        data_api.get_tropes()
-        cache_info = data_api._get_tropes.cache_info()
+        data_api.get_trope_ids()
+        cache_info = data_api.get_trope_store.cache_info()
         self.assertEqual(cache_info.misses, 1)
         self.assertEqual(cache_info.hits, 0)
 
-        data_api.get_tropes()
-        cache_info = data_api._get_tropes.cache_info()
+        data_api.get_trope_ids()
+        cache_info = data_api.get_trope_store.cache_info()
         self.assertEqual(cache_info.misses, 1)
         self.assertEqual(cache_info.hits, 1)
 
@@ -108,16 +107,23 @@ class GetTropeToOccurrenceCountCacheTest(test.TestCase):
     MOCK_CACHE = False
 
     def setUp(self):
-        data_api.get_trope_to_occurrence_count.cache_clear()
+        data_api._get_trope_to_occurrence_count.cache_clear()
 
     def test_caching(self):
         data_api.get_trope_to_occurrence_count()
-        cache_info = data_api.get_trope_to_occurrence_count.cache_info()
+        cache_info = data_api._get_trope_to_occurrence_count.cache_info()
         self.assertEqual(cache_info.misses, 1)
         self.assertEqual(cache_info.hits, 0)
 
         data_api.get_trope_to_occurrence_count()
-        cache_info = data_api.get_trope_to_occurrence_count.cache_info()
+        cache_info = data_api._get_trope_to_occurrence_count.cache_info()
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(cache_info.hits, 1)
+
+    def test_tag_name_order(self):
+        data_api.get_trope_to_occurrence_count(tag_names=('a', 'b'))
+        data_api.get_trope_to_occurrence_count(tag_names=['b', 'a', 'a'])
+        cache_info = data_api._get_trope_to_occurrence_count.cache_info()
         self.assertEqual(cache_info.misses, 1)
         self.assertEqual(cache_info.hits, 1)
 
@@ -161,91 +167,128 @@ class GetGenreInfoCacheTest(test.TestCase):
         self.assertEqual(cache_info.hits, 1)
 
 
-class GetGenresWithDepthForWorksTest(test.TestCase):
+class GetTropeWorkEdgesTest(test.TestCase):
 
     def test_happy(self):
-        genre = factories.GenreFactory.create()
-        work = factories.WorkFactory.create(genres=[genre])
-        self.assertEqual(
-            data_api.get_genres_with_depth_for_works([work.id]),
-            {work.id: {(genre.name, 0)}})
+        trope = factories.TropeFactory.create()
+        trope_two = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+        # Duplicate connections are only returned once.
+        work_two = factories.WorkFactory.create(tropes=[trope, trope])
+        work_ids, trope_ids = data_api.get_trope_work_edges()
+        self.assertCountEqual(
+            zip(work_ids.tolist(), trope_ids.tolist()),
+            [(work.id, trope.id), (work.id, trope_two.id),
+             (work_two.id, trope.id)])
+
+    def test_empty_db(self):
+        work_ids, trope_ids = data_api.get_trope_work_edges()
+        self.assertEqual(work_ids.tolist(), [])
+        self.assertEqual(trope_ids.tolist(), [])
+
 
-    def test_sub_genre(self):
+class GetGenreWorkEdgesTest(test.TestCase):
+
+    def test_happy(self):
         genre = factories.GenreFactory.create()
-        sub_genre = factories.GenreFactory.create(parent_genre=genre)
-        work = factories.WorkFactory.create(genres=[genre, sub_genre])
-        self.assertEqual(
-            data_api.get_genres_with_depth_for_works([work.id]),
-            {work.id: {(genre.name, 0), (sub_genre.name, 1)}})
+        genre_two = factories.GenreFactory.create()
+        work = factories.WorkFactory.create(genres=[genre, genre_two])
+        work_two = factories.WorkFactory.create(genres=[genre])
+        factories.WorkFactory.create()
+        work_ids, genre_ids = data_api.get_genre_work_edges()
+        self.assertCountEqual(
+            zip(work_ids.tolist(), genre_ids.tolist()),
+            [(work.id, genre.id), (work.id, genre_two.id),
+             (work_two.id, genre.id)])
+
+    def test_empty_db(self):
+        work_ids, genre_ids = data_api.get_genre_work_edges()
+        self.assertEqual(work_ids.tolist(), [])
+        self.assertEqual(genre_ids.tolist(), [])
 
-    def test_no_genres(self):
-        work = factories.WorkFactory.create()
-        self.assertEqual(
-            data_api.get_genres_with_depth_for_works([work.id]),
-            {work.id: set([])})
-        factories.GenreFactory.create()
-        self.assertEqual(
-            data_api.get_genres_with_depth_for_works([work.id]),
-            {work.id: set([])})
 
+class GetTropeTagEdgesTest(test.TestCase):
+
+    def test_happy(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        tag_two = factories.TropeTagFactory.create(name='setting')
+        trope = factories.TropeFactory.create(tags=[tag, tag_two])
+        trope_two = factories.TropeFactory.create(tags=[tag])
+        factories.TropeFactory.create()
+        trope_ids, tag_names = data_api.get_trope_tag_edges()
+        self.assertCountEqual(
+            zip(trope_ids.tolist(), tag_names),
+            [(trope.id, tag.name), (trope.id, tag_two.name),
+             (trope_two.id, tag.name)])
 
-class GetWorkIdsWithTropesTest(test.TestCase):
+    def test_empty_db(self):
+        trope_ids, tag_names = data_api.get_trope_tag_edges()
+        self.assertEqual(trope_ids.tolist(), [])
+        self.assertEqual(tag_names, [])
+
+
+class GetPrecomputedSimilarWorksTest(test.TestCase):
 
     def setUp(self):
-        self.trope = factories.TropeFactory()
-        self.other_trope = factories.TropeFactory()
-        self.orphan_trope = factories.TropeFactory()
-        self.work = factories.WorkFactory.create(tropes=[self.trope])
-        self.other_work = factories.WorkFactory.create(
-            tropes=[self.other_trope])
+        self.work = factories.WorkFactory.create()
+        self.work_two = factories.WorkFactory.create()
+        self.work_three = factories.WorkFactory.create()
+        self.trope = factories.TropeFactory.create()
+        factories.SimilarWorkFactory.create(
+            work=self.work, similar_work=self.work_three, rank=1)
+        factories.SimilarWorkFactory.create(
+            work=self.work, similar_work=self.work_two, rank=0)
+        factories.SimilarWorkTropeWeightFactory.create(
+            work=self.work, trope=self.trope, weight=2.5)
 
-    def test_match(self):
-        self.assertEqual(
-            data_api.get_work_ids_with_tropes([self.trope.id]),
-            {self.work.id})
-        self.assertEqual(
-            data_api.get_work_ids_with_tropes([self.other_trope.id]),
-            {self.other_work.id})
-        self.assertEqual(
-            data_api.get_work_ids_with_tropes([
-                self.trope.id, self.orphan_trope.id]),
-            {self.work.id})
+    def test_happy(self):
         self.assertEqual(
-            data_api.get_work_ids_with_tropes([
-                self.trope.id, self.other_trope.id, self.orphan_trope.id]),
-            {self.work.id, self.other_work.id})
-
-    def test_no_match(self):
-        # Empty trope ids list.
-        self.assertEqual(data_api.get_work_ids_with_tropes([]), set([]))
-        # Trope id not found.
+            data_api.get_precomputed_similar_works(self.work.id),
+            ([self.work_two.id, self.work_three.id],
+             {self.trope.id: 2.5}))
+
+    def test_limit(self):
         self.assertEqual(
-            data_api.get_work_ids_with_tropes([1]), set([]))
-        # Trope has no works.
-        self.assertEqual(data_api.get_work_ids_with_tropes(
-            [self.orphan_trope.id]), set([]))
+            data_api.get_precomputed_similar_works(self.work.id, limit=1),
+            ([self.work_two.id], {self.trope.id: 2.5}))
 
+    def test_not_precomputed(self):
+        self.assertIsNone(
+            data_api.get_precomputed_similar_works(self.work_two.id))
 
-class GetTagsForTropes(test.TestCase):
+    def test_stale(self):
+        cache.bump_data_generation()
+        self.assertIsNone(
+            data_api.get_precomputed_similar_works(self.work.id))
 
-    def test_happy(self):
-        tag = factories.TropeTagFactory.create()
-        tag_two = factories.TropeTagFactory.create()
-        trope = factories.TropeFactory.create(tags=[tag, tag_two])
-        trope_two = factories.TropeFactory.create(tags=[tag_two])
-        self.assertEqual(
-            data_api.get_tags_for_tropes([trope.id, trope_two.id]),
-            {trope.id: {tag.name, tag_two.name},
-             trope_two.id: {tag_two.name}})
 
-    def test_no_tags(self):
+class GetPrecomputedSimilarWorksByWorkIdTest(test.TestCase):
+
+    def test_happy(self):
+        work = factories.WorkFactory.create()
+        work_two = factories.WorkFactory.create()
+        work_three = factories.WorkFactory.create()
         trope = factories.TropeFactory.create()
+        factories.SimilarWorkFactory.create(
+            work=work, similar_work=work_three, rank=1)
+        factories.SimilarWorkFactory.create(
+            work=work, similar_work=work_two, rank=0)
+        factories.SimilarWorkFactory.create(
+            work=work_two, similar_work=work, rank=0)
+        factories.SimilarWorkTropeWeightFactory.create(
+            work=work, trope=trope, weight=2.0)
+        self.assertEqual(
+            data_api.get_precomputed_similar_works_by_work_id(
+                [work.id, work_two.id, work_three.id]),
+            {work.id: ([work_two.id, work_three.id], {trope.id: 2.0}),
+             work_two.id: ([work.id], {})})
         self.assertEqual(
-            data_api.get_tags_for_tropes([trope.id]),
-            {trope.id: set()})
+            data_api.get_precomputed_similar_works_by_work_id(
+                [work.id], limit=1),
+            {work.id: ([work_two.id], {trope.id: 2.0})})
 
 
-class GetTropesByWorkId(test.TestCase):
+class GetTropeIdsByWorkId(test.TestCase):
 
     def setUp(self):
         self.tag = factories.TropeTagFactory()
@@ -262,50 +305,50 @@ class GetTropesByWorkId(test.TestCase):
 
     def test_happy(self):
         self.assertEqual(
-            data_api.get_tropes_by_work_id([
+            data_api.get_trope_ids_by_work_id([
                 self.work.id, self.both_tags_work.id, self.no_tropes_work.id]),
-            {self.work.id: {self.trope},
-             self.both_tags_work.id: {self.trope, self.other_trope},
+            {self.work.id: {self.trope.id},
+             self.both_tags_work.id: {self.trope.id, self.other_trope.id},
              self.no_tropes_work.id: set([])})
 
     def test_work_id_not_found(self):
-        self.assertEqual(data_api.get_tropes_by_work_id([]), {})
+        self.assertEqual(data_api.get_trope_ids_by_work_id([]), {})
         fake_id = 1
         self.assertEqual(
-            data_api.get_tropes_by_work_id([fake_id]),
+            data_api.get_trope_ids_by_work_id([fake_id]),
             {fake_id: set([])})
 
     def test_tag_filter(self):
         # No tag filter.
-        self.assertEqual(data_api.get_tropes_by_work_id(
-            [self.work.id], tag_names=None), {self.work.id: {self.trope}})
+        self.assertEqual(data_api.get_trope_ids_by_work_id(
+            [self.work.id], tag_names=None), {self.work.id: {self.trope.id}})
         # No tags.
-        self.assertEqual(data_api.get_tropes_by_work_id(
+        self.assertEqual(data_api.get_trope_ids_by_work_id(
             [self.work.id], tag_names=()), {self.work.id: set([])})
         # First tag.
         self.assertEqual(
-            data_api.get_tropes_by_work_id(
+            data_api.get_trope_ids_by_work_id(
                 [self.work.id, self.other_work.id, self.both_tags_work.id],
                 tag_names=(self.tag.name, )),
-            {self.work.id: {self.trope},
+            {self.work.id: {self.trope.id},
              self.other_work.id: set([]),
-             self.both_tags_work.id: {self.trope}})
+             self.both_tags_work.id: {self.trope.id}})
         # Other tag.
         self.assertEqual(
-            data_api.get_tropes_by_work_id(
+            data_api.get_trope_ids_by_work_id(
                 [self.work.id, self.other_work.id, self.both_tags_work.id],
                 tag_names=(self.other_tag.name, )),
             {self.work.id: set([]),
-             self.other_work.id: {self.other_trope},
-             self.both_tags_work.id: {self.other_trope}})
+             self.other_work.id: {self.other_trope.id},
+             self.both_tags_work.id: {self.other_trope.id}})
         # Both tags.
         self.assertEqual(
-            data_api.get_tropes_by_work_id(
+            data_api.get_trope_ids_by_work_id(
                 [self.work.id, self.other_work.id, self.both_tags_work.id],
                 tag_names=(self.tag.name, self.other_tag.name)),
-            {self.work.id: {self.trope},
-             self.other_work.id: {self.other_trope},
-             self.both_tags_work.id: {self.trope, self.other_trope}})
+            {self.work.id: {self.trope.id},
+             self.other_work.id: {self.other_trope.id},
+             self.both_tags_work.id: {self.trope.id, self.other_trope.id}})
 
 
 class GetWorkIdsByName(test.TestCase):
@@ -325,146 +368,57 @@ class GetWorkIdsByName(test.TestCase):
         self.assertEqual(data_api.get_work_ids_by_name([]), [])
 
 
-class GetWorkInfoDictsById(test.TestCase):
+class GetRankedTropeIdsByWorkId(test.TestCase):
 
     def test_happy(self):
-        work = factories.WorkFactory.create()
-        self.assertEqual(
-            data_api.get_work_info_dicts_by_id([work.id]),
-            [{
-                'id': work.id, 'name': work.name, 'url': work.url,
-                'creator': {
-                    'id': work.creator.id,
-                    'name': work.creator.name,
-                    'url': work.creator.url},
-                'genres': [],
-                'total_shared_tropes': 0,
-                'tropes': []
-            }])
-
-    def test_genres(self):
-        genre_one = factories.GenreFactory.create()
-        genre_two = factories.GenreFactory.create()
-        work = factories.WorkFactory.create(genres=[genre_one, genre_two])
-        info_dicts = data_api.get_work_info_dicts_by_id([work.id])
-        self.assertEqual(
-            info_dicts,
-            [{
-                'id': work.id, 'name': work.name, 'url': work.url,
-                'creator': {
-                    'id': work.creator.id,
-                    'name': work.creator.name,
-                    'url': work.creator.url},
-                'genres': mock.ANY,
-                'total_shared_tropes': 0,
-                'tropes': []
-            }])
-        self.assertCountEqual(
-            set(info_dicts[0]['genres']), [genre_one.name, genre_two.name])
-
-    def test_tropes(self):
         trope = factories.TropeFactory.create()
         trope_two = factories.TropeFactory.create()
-        work = factories.WorkFactory.create(tropes=[trope, trope_two])
-        info_dicts = data_api.get_work_info_dicts_by_id([work.id])
+        work = factories.WorkFactory.create(tropes=[trope_two, trope])
+        no_tropes_work = factories.WorkFactory.create()
         self.assertEqual(
-            info_dicts,
-            [{
-                'id': work.id, 'name': work.name, 'url': work.url,
-                'creator': {
-                    'id': work.creator.id,
-                    'name': work.creator.name,
-                    'url': work.creator.url},
-                'genres': [],
-                'total_shared_tropes': 2,
-                'tropes': mock.ANY
-            }])
-        self.assertCountEqual(
-            info_dicts[0]['tropes'],
-            [{'id': trope.id,
-              'name': trope.name,
-              'url': trope.url,
-              'laconic_description': trope.laconic_description},
-             {'id': trope_two.id,
-              'name': trope_two.name,
-              'url': trope_two.url,
-              'laconic_description': trope_two.laconic_description}])
+            data_api.get_ranked_trope_ids_by_work_id(
+                [work.id, no_tropes_work.id]),
+            ({work.id: [trope.id, trope_two.id]}, {work.id: 2}))
 
     def test_filtered_tropes(self):
         trope = factories.TropeFactory.create()
         trope_two = factories.TropeFactory.create()
         trope_three = factories.TropeFactory.create()
         excluded_trope = factories.TropeFactory.create()
-        excluded_trope_two = factories.TropeFactory.create()
         work = factories.WorkFactory.create(
-            tropes=[trope, trope_two, trope_three,
-                    excluded_trope, excluded_trope_two])
-        info_dicts = data_api.get_work_info_dicts_by_id(
-            [work.id], allowed_trope_id_to_weight={
-                trope.id: 1, trope_two.id: 3, trope_three.id: 2})
+            tropes=[trope, trope_two, trope_three, excluded_trope])
         self.assertEqual(
-            info_dicts,
-            [{
-                'id': work.id, 'name': work.name, 'url': work.url,
-                'creator': {
-                    'id': work.creator.id,
-                    'name': work.creator.name,
-                    'url': work.creator.url},
-                'genres': [],
-                'total_shared_tropes': 3,
-                'tropes': [
-                    {
-                       'id': trope_two.id,
-                       'name': trope_two.name,
-                       'url': trope_two.url,
-                       'laconic_description': trope_two.laconic_description
-                    },
-                    {
-                        'id': trope_three.id,
-                        'name': trope_three.name,
-                        'url': trope_three.url,
-                        'laconic_description': trope_three.laconic_description
-                    },
-                    {
-                        'id': trope.id,
-                        'name': trope.name,
-                        'url': trope.url,
-                        'laconic_description': trope.laconic_description
-                    },
-                ]
-            }])
+            data_api.get_ranked_trope_ids_by_work_id(
+                [work.id], allowed_trope_id_to_weight={
+                    trope.id: 1, trope_two.id: 3, trope_three.id: 1}),
+            ({work.id: [trope_two.id, trope.id, trope_three.id]},
+             {work.id: 3}))
 
     def test_max_tropes_per_work(self):
         trope = factories.TropeFactory.create()
         trope_two = factories.TropeFactory.create()
-        work = factories.WorkFactory.create(tropes=[trope, trope_two])
-        info_dicts = data_api.get_work_info_dicts_by_id(
-            [work.id], max_tropes_per_work=2)
-        self.assertEqual(len(info_dicts[0]['tropes']), 2)
-        self.assertEqual(info_dicts[0]['total_shared_tropes'], 2)
-
-        info_dicts = data_api.get_work_info_dicts_by_id(
-            [work.id], max_tropes_per_work=1)
-        self.assertEqual(len(info_dicts[0]['tropes']), 1)
-        self.assertEqual(info_dicts[0]['total_shared_tropes'], 2)
-
-        info_dicts = data_api.get_work_info_dicts_by_id(
-            [work.id], max_tropes_per_work=0)
-        self.assertEqual(len(info_dicts[0]['tropes']), 0)
-        self.assertEqual(info_dicts[0]['total_shared_tropes'], 2)
-
-    def test_no_creator(self):
-        work = factories.WorkFactory.create(creator=None)
+        trope_three = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(
+            tropes=[trope, trope_two, trope_three])
+        other_work = factories.WorkFactory.create(tropes=[trope_three])
+        self.assertEqual(
+            data_api.get_ranked_trope_ids_by_work_id(
+                [work.id, other_work.id],
+                allowed_trope_id_to_weight={
+                    trope.id: 1, trope_two.id: 3, trope_three.id: 1},
+                max_tropes_per_work=2),
+            ({work.id: [trope_two.id, trope.id],
+              other_work.id: [trope_three.id]},
+             {work.id: 3, other_work.id: 1}))
+        self.assertEqual(
+            data_api.get_ranked_trope_ids_by_work_id(
+                [work.id], max_tropes_per_work=0)[1],
+            {work.id: 3})
+
+    def test_no_allowed_tropes(self):
+        trope = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(tropes=[trope])
         self.assertEqual(
-            data_api.get_work_info_dicts_by_id([work.id]),
-            [{
-                'id': work.id, 'name': work.name, 'url': work.url,
-                'creator': None,
-                'genres': [],
-                'total_shared_tropes': 0,
-                'tropes': []
-            }])
-
-    def test_not_found(self):
-        with self.assertRaises(models.Work.DoesNotExist):
-            data_api.get_work_info_dicts_by_id([1])
+            data_api.get_ranked_trope_ids_by_work_id(
+                [work.id], allowed_trope_id_to_weight={}),
+            ({}, {}))
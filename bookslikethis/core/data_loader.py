@@ -0,0 +1,100 @@
+"""Request scoped batching and memoization of keyed data_api lookups.
+
+Within a request_scope, each keyed lookup fetches only the keys no earlier
+call in the scope asked for, in one batch, so different parts of a search
+asking for overlapping data share one DB round trip per new batch. The
+scope also counts DB queries.
+
+Outside of a scope, lookups go straight to the DB. See
+middleware.DataLoaderMiddleware, which gives every request a scope.
+"""
+import contextlib
+import threading
+
+from django.db import connection
+
+_state = threading.local()
+
+
+class DataLoader(object):
+    """Memoized keyed lookups, and a DB query counter, for one scope.
+
+    Attributes:
+        query_count: Integer count of DB queries run in the scope.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self._namespace_to_values = {}
+
+    def load_many(self, namespace, keys, fetch_many):
+        """Looks up values by key, fetching only keys not seen before.
+
+        Args:
+            namespace: Hashable name of the lookup, including any args
+                the values depend on besides the key.
+            keys: Iterable of hashable keys.
+            fetch_many: Function taking a list of keys and returning a
+                dict of key to value. Keys left out of the dict get None.
+
+        Returns:
+            Dict of each key to its value. Values are shared by every
+            caller in the scope, so must not be modified.
+        """
+        key_to_value = self._namespace_to_values.setdefault(namespace, {})
+        missing = [k for k in dict.fromkeys(keys) if k not in key_to_value]
+        if missing:
+            fetched = fetch_many(missing)
+            for key in missing:
+                key_to_value[key] = fetched.get(key)
+        return {key: key_to_value[key] for key in keys}
+
+    def _count_query(self, execute, sql, params, many, context):
+        """Counts a DB query. See connection.execute_wrapper."""
+        self.query_count += 1
+        return execute(sql, params, many, context)
+
+
+@contextlib.contextmanager
+def request_scope():
+    """Makes keyed lookups in this thread share one DataLoader.
+
+    Nested scopes share the outermost scope's DataLoader.
+
+    Yields:
+        DataLoader object.
+    """
+    loader = getattr(_state, 'loader', None)
+    if loader is not None:
+        yield loader
+        return
+    loader = DataLoader()
+    _state.loader = loader
+    try:
+        with connection.execute_wrapper(loader._count_query):
+            yield loader
+    finally:
+        _state.loader = None
+
+
+def get_current_loader():
+    """Gets the DataLoader of this thread's request_scope.
+
+    Returns:
+        DataLoader object, or None outside of a scope.
+    """
+    return getattr(_state, 'loader', None)
+
+
+def load_many(namespace, keys, fetch_many):
+    """Looks up values by key, through the current scope's DataLoader.
+
+    Outside of a request_scope, fetches every key.
+    See DataLoader.load_many.
+    """
+    loader = get_current_loader()
+    if loader is None:
+        keys = list(keys)
+        fetched = fetch_many(list(dict.fromkeys(keys)))
+        return {key: fetched.get(key) for key in keys}
+    return loader.load_many(namespace, keys, fetch_many)
@@ -0,0 +1,79 @@
+from core import data_api
+from core import data_loader
+from core import factories
+from core import models
+from core import test
+
+
+class LoadManyTest(test.TestCase):
+
+    def setUp(self):
+        self.fetched = []
+
+    def _fetch_many(self, keys):
+        self.fetched.append(keys)
+        return {key: key * 10 for key in keys if key != 3}
+
+    def test_no_scope(self):
+        self.assertEqual(
+            data_loader.load_many('ns', [1, 2, 1], self._fetch_many),
+            {1: 10, 2: 20})
+        data_loader.load_many('ns', [1], self._fetch_many)
+        self.assertEqual(self.fetched, [[1, 2], [1]])
+
+    def test_fetches_missing_keys_only(self):
+        with data_loader.request_scope():
+            self.assertEqual(
+                data_loader.load_many('ns', [1, 2], self._fetch_many),
+                {1: 10, 2: 20})
+            self.assertEqual(
+                data_loader.load_many('ns', [2, 3], self._fetch_many),
+                {2: 20, 3: None})
+            data_loader.load_many('ns', [3, 1], self._fetch_many)
+        self.assertEqual(self.fetched, [[1, 2], [3]])
+
+    def test_namespaces(self):
+        with data_loader.request_scope():
+            data_loader.load_many('ns', [1], self._fetch_many)
+            data_loader.load_many('other', [1], self._fetch_many)
+        self.assertEqual(self.fetched, [[1], [1]])
+
+    def test_nested_scope(self):
+        with data_loader.request_scope() as loader:
+            data_loader.load_many('ns', [1], self._fetch_many)
+            with data_loader.request_scope() as nested_loader:
+                self.assertIs(nested_loader, loader)
+                data_loader.load_many('ns', [1], self._fetch_many)
+        self.assertEqual(self.fetched, [[1]])
+
+    def test_scope_ends(self):
+        with data_loader.request_scope():
+            data_loader.load_many('ns', [1], self._fetch_many)
+        data_loader.load_many('ns', [1], self._fetch_many)
+        self.assertEqual(self.fetched, [[1], [1]])
+
+
+class RequestScopeTest(test.TestCase):
+
+    def test_query_count(self):
+        with data_loader.request_scope() as loader:
+            self.assertEqual(loader.query_count, 0)
+            list(models.Work.objects.all())
+            list(models.Trope.objects.all())
+        self.assertEqual(loader.query_count, 2)
+
+    def test_data_api_lookups(self):
+        work = factories.WorkFactory.create(name='war')
+        trope = factories.TropeFactory.create()
+        factories.TropeWorkFactory.create(trope=trope, work=work)
+        with data_loader.request_scope() as loader:
+            self.assertEqual(
+                data_api.get_trope_ids_by_work_id([work.id]),
+                {work.id: {trope.id}})
+            self.assertEqual(data_api.get_work_ids_by_name(['war']), [work.id])
+            query_count = loader.query_count
+            self.assertEqual(
+                data_api.get_trope_ids_by_work_id([work.id]),
+                {work.id: {trope.id}})
+            self.assertEqual(data_api.get_work_ids_by_name(['war']), [work.id])
+            self.assertEqual(loader.query_count, query_count)
@@ -4,6 +4,7 @@ import logging
 import factory
 from factory import django
 
+from core import cache
 from core import models
 
 logging.getLogger("factory").setLevel(logging.WARN)
@@ -89,3 +90,21 @@ class TropeWorkFactory(BaseFactory):
     snippet = 'snippet'
     is_spoiler = False
     is_ymmv = False
+
+
+class SimilarWorkFactory(BaseFactory):
+    class Meta:
+        model = models.SimilarWork
+    work = factory.SubFactory(WorkFactory)
+    similar_work = factory.SubFactory(WorkFactory)
+    rank = factory.Sequence(lambda n: n)
+    score = 0.5
+    data_generation = factory.LazyFunction(cache.get_data_generation)
+
+
+class SimilarWorkTropeWeightFactory(BaseFactory):
+    class Meta:
+        model = models.SimilarWorkTropeWeight
+    work = factory.SubFactory(WorkFactory)
+    trope = factory.SubFactory(TropeFactory)
+    weight = 1.0
@@ -0,0 +1,162 @@
+"""Binary snapshot files of the data behind the in-memory search indexes.
+
+A snapshot holds named numpy arrays and a small JSON metadata dict. Arrays
+are memory mapped when read, so every process reading the same file
+shares one page cache copy, and startup time doesn't depend on DB size.
+
+See the build_index command.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+from core import cache
+
+log = logging.getLogger(__name__)
+
+# Identifies snapshot files.
+MAGIC = b'BLTINDEX'
+# Bump this whenever the file layout or the meaning of its arrays changes.
+# Files with any other version are ignored.
+FORMAT_VERSION = 2
+# Array data starts on multiples of this many bytes.
+ALIGNMENT = 64
+
+_HEADER_LENGTH_FORMAT = '<Q'
+
+
+class IndexSnapshot(object):
+    """Read-only data loaded from a snapshot file.
+
+    Attributes:
+        data_generation: Integer data generation the snapshot was built
+            from. See cache.get_data_generation.
+        arrays: Dict of string name to read-only numpy array.
+        metadata: Dict of JSON compatible metadata.
+    """
+
+    def __init__(self, data_generation, arrays, metadata):
+        self.data_generation = data_generation
+        self.arrays = arrays
+        self.metadata = metadata
+
+
+def write_snapshot(path, data_generation, arrays, metadata):
+    """Writes a snapshot file, replacing any existing file atomically.
+
+    Args:
+        path: String file path.
+        data_generation: Integer data generation of the data.
+        arrays: Dict of string name to numpy array of numbers.
+        metadata: Dict of JSON compatible metadata.
+    """
+    arrays = {
+        name: np.ascontiguousarray(array)
+        for (name, array) in arrays.items()}
+    array_headers = {}
+    offset = 0
+    for name, array in sorted(arrays.items()):
+        offset = _align(offset)
+        array_headers[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({
+        'format_version': FORMAT_VERSION,
+        'data_generation': data_generation,
+        'arrays': array_headers,
+        'metadata': metadata}).encode('utf-8')
+    data_start = _align(
+        len(MAGIC) + struct.calcsize(_HEADER_LENGTH_FORMAT) + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack(_HEADER_LENGTH_FORMAT, len(header)))
+            f.write(header)
+            for name, array in sorted(arrays.items()):
+                f.seek(data_start + array_headers[name]['offset'])
+                f.write(array.tobytes())
+            # Pad the file out to its full length, in case the last
+            # arrays are empty.
+            f.truncate(data_start + offset)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def read_snapshot(path):
+    """Memory maps a snapshot file.
+
+    Args:
+        path: String file path.
+
+    Returns:
+        IndexSnapshot object.
+
+    Raises:
+        ValueError if the file isn't a snapshot of the current
+        FORMAT_VERSION.
+    """
+    with open(path, 'rb') as f:
+        prefix_length = len(MAGIC) + struct.calcsize(_HEADER_LENGTH_FORMAT)
+        prefix = f.read(prefix_length)
+        if len(prefix) != prefix_length or not prefix.startswith(MAGIC):
+            raise ValueError('Not an index snapshot: %s' % path)
+        header_length, = struct.unpack(
+            _HEADER_LENGTH_FORMAT, prefix[len(MAGIC):])
+        header = json.loads(f.read(header_length).decode('utf-8'))
+        if header.get('format_version') != FORMAT_VERSION:
+            raise ValueError(
+                'Unsupported index snapshot version %s: %s' % (
+                    header.get('format_version'), path))
+        data_start = _align(prefix_length + header_length)
+        # The map stays open for as long as any array references it.
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name, array_header in header['arrays'].items():
+        dtype = np.dtype(array_header['dtype'])
+        shape = tuple(array_header['shape'])
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=int(np.prod(shape, dtype=np.int64)),
+            offset=data_start + array_header['offset']).reshape(shape)
+    return IndexSnapshot(
+        header['data_generation'], arrays, header['metadata'])
+
+
+@cache.lru_cache(maxsize=1)
+def get_snapshot():
+    """Loads the snapshot at settings.INDEX_SNAPSHOT_PATH, if it's usable.
+
+    Returns:
+        IndexSnapshot object, or None if there is no snapshot, it can't be
+        read, or it was built from a different data generation.
+    """
+    path = settings.INDEX_SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        snapshot = read_snapshot(path)
+    except (OSError, ValueError) as e:
+        log.warning('Ignoring index snapshot: %s', e)
+        return None
+    if snapshot.data_generation != cache.get_data_generation():
+        log.warning('Ignoring stale index snapshot: %s', path)
+        return None
+    return snapshot
+
+
+def _align(offset):
+    """Rounds an offset up to a multiple of ALIGNMENT."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,103 @@
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+from core import cache
+from core import index_snapshot
+from core import test
+
+
+class SnapshotFileTest(test.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'index')
+
+    def test_round_trip(self):
+        index_snapshot.write_snapshot(
+            self.path, 3,
+            {'ids': np.array([5, 1, 7], dtype=np.int64),
+             'empty': np.zeros(0, dtype=np.int32),
+             'grid': np.array([[True, False], [False, True]])},
+            {'names': ['a', 'b']})
+        snapshot = index_snapshot.read_snapshot(self.path)
+        self.assertEqual(snapshot.data_generation, 3)
+        self.assertEqual(snapshot.metadata, {'names': ['a', 'b']})
+        self.assertEqual(snapshot.arrays['ids'].tolist(), [5, 1, 7])
+        self.assertEqual(snapshot.arrays['ids'].dtype, np.int64)
+        self.assertEqual(snapshot.arrays['empty'].tolist(), [])
+        self.assertEqual(
+            snapshot.arrays['grid'].tolist(), [[True, False], [False, True]])
+        # Arrays are read-only views of the file.
+        self.assertFalse(snapshot.arrays['ids'].flags.writeable)
+
+    def test_replace(self):
+        index_snapshot.write_snapshot(
+            self.path, 1, {'ids': np.array([1])}, {})
+        index_snapshot.write_snapshot(
+            self.path, 2, {'ids': np.array([2, 3])}, {})
+        snapshot = index_snapshot.read_snapshot(self.path)
+        self.assertEqual(snapshot.data_generation, 2)
+        self.assertEqual(snapshot.arrays['ids'].tolist(), [2, 3])
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['index'])
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'something else')
+        with self.assertRaises(ValueError):
+            index_snapshot.read_snapshot(self.path)
+
+    def test_other_version(self):
+        index_snapshot.write_snapshot(self.path, 1, {}, {})
+        with mock.patch.object(
+                index_snapshot, 'FORMAT_VERSION',
+                index_snapshot.FORMAT_VERSION + 1):
+            with self.assertRaises(ValueError):
+                index_snapshot.read_snapshot(self.path)
+
+
+class GetSnapshotTest(test.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'index')
+
+    def test_happy(self):
+        index_snapshot.write_snapshot(
+            self.path, cache.get_data_generation(),
+            {'ids': np.array([1])}, {})
+        with self.settings(INDEX_SNAPSHOT_PATH=self.path):
+            snapshot = index_snapshot.get_snapshot()
+        self.assertEqual(snapshot.arrays['ids'].tolist(), [1])
+
+    def test_stale(self):
+        index_snapshot.write_snapshot(
+            self.path, cache.get_data_generation(), {}, {})
+        cache.bump_data_generation()
+        with self.settings(INDEX_SNAPSHOT_PATH=self.path):
+            self.assertIsNone(index_snapshot.get_snapshot())
+
+    def test_missing(self):
+        with self.settings(INDEX_SNAPSHOT_PATH=None):
+            self.assertIsNone(index_snapshot.get_snapshot())
+        with self.settings(INDEX_SNAPSHOT_PATH=self.path):
+            self.assertIsNone(index_snapshot.get_snapshot())
+
+    def test_unreadable(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'something else')
+        with self.settings(INDEX_SNAPSHOT_PATH=self.path):
+            self.assertIsNone(index_snapshot.get_snapshot())
+
+    def test_permission_denied(self):
+        index_snapshot.write_snapshot(
+            self.path, cache.get_data_generation(), {}, {})
+        with self.settings(INDEX_SNAPSHOT_PATH=self.path), \
+                mock.patch.object(
+                    index_snapshot, 'read_snapshot',
+                    side_effect=PermissionError):
+            self.assertIsNone(index_snapshot.get_snapshot())
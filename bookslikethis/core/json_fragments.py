@@ -0,0 +1,182 @@
+"""Pre-encoded JSON fragments of the trope and work data in search results.
+
+Results for the same tropes and works are returned over and over, so their
+JSON is encoded once per data generation, and responses are assembled by
+joining the encoded bytes.
+"""
+import json
+
+from core import cache
+from core import data_api
+from core import models
+
+
+@cache.lru_cache(maxsize=1)
+def get_trope_fragments():
+    """Encodes every trope's result dict.
+
+    Returns:
+        Dict of integer trope id to JSON bytes of an object with these keys:
+            -id
+            -name
+            -url
+            -laconic_description
+    """
+    return {
+        trope['id']: _encode(trope)
+        for trope in models.Trope.objects.values(
+            'id', 'name', 'url', 'laconic_description').iterator()}
+
+
+@cache.lru_cache(maxsize=1)
+def get_work_header_fragments():
+    """Encodes the trope independent fields of every work's result dict.
+
+    Returns:
+        Dict of integer work id to JSON bytes of the members of an object,
+        without the enclosing braces, so more members can be appended.
+        Has these keys:
+            -id
+            -name
+            -url
+            -creator: dict with id, name and url fields, or null.
+            -genres: list of unique genre names.
+    """
+    genre_info = data_api.get_genre_info()
+    work_id_to_genre_names = {}
+    for work_id, genre_id in zip(
+            *(a.tolist() for a in data_api.get_genre_work_edges())):
+        work_id_to_genre_names.setdefault(work_id, set()).add(
+            genre_info[genre_id][0])
+    fragments = {}
+    for (work_id, name, url, creator_id, creator_name, creator_url) in (
+            models.Work.objects.values_list(
+                'id', 'name', 'url', 'creator_id', 'creator__name',
+                'creator__url').iterator()):
+        header = _encode({
+            'id': work_id, 'name': name, 'url': url,
+            'creator': ({'id': creator_id,
+                         'name': creator_name,
+                         'url': creator_url}
+                        if creator_id is not None else None),
+            'genres': sorted(work_id_to_genre_names.get(work_id, ())),
+        })
+        fragments[work_id] = header[1:-1]
+    return fragments
+
+
+def encode_work_results(
+        work_ids, allowed_trope_id_to_weight=None, max_tropes_per_work=10):
+    """Encodes the result dicts of works, from pre-encoded fragments.
+
+    Args:
+        work_ids: List of work ids.
+        allowed_trope_id_to_weight: Optional, dict of trope id to float
+            weight. Limits the tropes returned with each work to ones in
+            this dict. The returned tropes are also ordered according to
+            their associated weight value, highest first, then by id. Pass
+            None to return all tropes, ordered by id.
+        max_tropes_per_work: Optional, integer max trope dicts to return
+            with any work. Pass None for unlimited.
+
+    Returns:
+        JSON bytes of a list of dicts with these fields, in the same order
+        as work_ids:
+            -id
+            -name
+            -url
+            -creator: dict with id, name and url fields, or null.
+            -genres: sorted list of unique genre names.
+            -tropes: list of trope info dicts for shared tropes, ordered by
+                allowed_trope_id_to_weight. Has these keys:
+                -id
+                -name
+                -url
+                -laconic_description
+            -total_shared_tropes: Integer, total shared allowed tropes.
+                Ignores max_tropes_per_work.
+
+    Raises:
+        DoesNotExist if any work_id is not found in the DB.
+    """
+    work_id_to_trope_ids, work_id_to_total = (
+        data_api.get_ranked_trope_ids_by_work_id(
+            work_ids, allowed_trope_id_to_weight, max_tropes_per_work))
+    return _encode_work_results(
+        work_ids, work_id_to_trope_ids, work_id_to_total)
+
+
+def encode_work_results_batch(result_sets, max_tropes_per_work=10):
+    """Encodes the result dicts of many independent searches.
+
+    The tropes of every result work are fetched in a single query, then
+    ranked per search.
+
+    Args:
+        result_sets: List of tuples of:
+            List of work ids.
+            Dict of trope id to float weight. See the
+                allowed_trope_id_to_weight arg of encode_work_results.
+        max_tropes_per_work: Optional, see encode_work_results.
+
+    Returns:
+        List of JSON bytes, as returned by encode_work_results, in the same
+        order as result_sets.
+
+    Raises:
+        DoesNotExist if any work id is not found in the DB.
+    """
+    work_id_to_all_trope_ids = data_api.get_trope_ids_by_work_id(
+        list({wid for (work_ids, _) in result_sets for wid in work_ids}))
+    encoded = []
+    for work_ids, trope_id_to_weight in result_sets:
+        work_id_to_trope_ids = {}
+        work_id_to_total = {}
+        for work_id in work_ids:
+            trope_ids = sorted(
+                (tid for tid in work_id_to_all_trope_ids.get(work_id, ())
+                 if tid in trope_id_to_weight),
+                key=lambda tid: (-trope_id_to_weight[tid], tid))
+            work_id_to_total[work_id] = len(trope_ids)
+            work_id_to_trope_ids[work_id] = trope_ids[:max_tropes_per_work]
+        encoded.append(_encode_work_results(
+            work_ids, work_id_to_trope_ids, work_id_to_total))
+    return encoded
+
+
+def _encode_work_results(work_ids, work_id_to_trope_ids, work_id_to_total):
+    """Joins the fragments of works and their ranked tropes.
+
+    Args:
+        work_ids: List of work ids.
+        work_id_to_trope_ids: Dict of work id to list of the trope ids to
+            include, in order.
+        work_id_to_total: Dict of work id to integer total shared tropes.
+
+    Returns:
+        JSON bytes of a list of work result dicts.
+
+    Raises:
+        DoesNotExist if any work_id is not found in the DB.
+    """
+    work_fragments = get_work_header_fragments()
+    trope_fragments = get_trope_fragments()
+    parts = []
+    for work_id in work_ids:
+        if work_id not in work_fragments:
+            raise models.Work.DoesNotExist
+        parts.append(b''.join((
+            b'{', work_fragments[work_id],
+            b', "tropes": [',
+            b', '.join(
+                trope_fragments[tid]
+                for tid in work_id_to_trope_ids.get(work_id, [])),
+            b'], "total_shared_tropes": ',
+            str(work_id_to_total.get(work_id, 0)).encode('ascii'),
+            b'}')))
+    return b'[' + b', '.join(parts) + b']'
+
+
+def _encode(value):
+    """Encodes a JSON compatible value to bytes."""
+    return json.dumps(value).encode('utf-8')
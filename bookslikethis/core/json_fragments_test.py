@@ -0,0 +1,79 @@
+import json
+
+from core import factories
+from core import json_fragments
+from core import models
+from core import test
+
+
+class EncodeWorkResultsTest(test.TestCase):
+
+    def test_happy(self):
+        genre = factories.GenreFactory.create(name='b')
+        genre_two = factories.GenreFactory.create(name='a')
+        trope = factories.TropeFactory.create()
+        trope_two = factories.TropeFactory.create()
+        excluded_trope = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(
+            tropes=[trope, trope_two, excluded_trope],
+            genres=[genre, genre_two])
+        work_two = factories.WorkFactory.create(
+            tropes=[trope], creator=None)
+        trope_id_to_weight = {trope.id: 1, trope_two.id: 2}
+
+        encoded = json_fragments.encode_work_results(
+            [work_two.id, work.id],
+            allowed_trope_id_to_weight=trope_id_to_weight)
+
+        def trope_dict(t):
+            return {
+                'id': t.id, 'name': t.name, 'url': t.url,
+                'laconic_description': t.laconic_description}
+
+        self.assertEqual(
+            json.loads(encoded.decode('utf-8')),
+            [{'id': work_two.id, 'name': work_two.name, 'url': work_two.url,
+              'creator': None,
+              'genres': [],
+              'tropes': [trope_dict(trope)],
+              'total_shared_tropes': 1},
+             {'id': work.id, 'name': work.name, 'url': work.url,
+              'creator': {
+                  'id': work.creator.id,
+                  'name': work.creator.name,
+                  'url': work.creator.url},
+              'genres': ['a', 'b'],
+              'tropes': [trope_dict(trope_two), trope_dict(trope)],
+              'total_shared_tropes': 2}])
+
+    def test_max_tropes_per_work(self):
+        trope = factories.TropeFactory.create()
+        trope_two = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+
+        results = json.loads(json_fragments.encode_work_results(
+            [work.id], max_tropes_per_work=1).decode('utf-8'))
+        self.assertEqual(len(results[0]['tropes']), 1)
+        self.assertEqual(results[0]['total_shared_tropes'], 2)
+
+    def test_empty(self):
+        self.assertEqual(json_fragments.encode_work_results([]), b'[]')
+
+    def test_not_found(self):
+        with self.assertRaises(models.Work.DoesNotExist):
+            json_fragments.encode_work_results([1])
+
+
+class FragmentCacheTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def setUp(self):
+        json_fragments.get_trope_fragments.cache_clear()
+
+    def test_caching(self):
+        json_fragments.get_trope_fragments()
+        json_fragments.get_trope_fragments()
+        cache_info = json_fragments.get_trope_fragments.cache_info()
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(cache_info.hits, 1)
@@ -0,0 +1,154 @@
+import random
+import string
+import time
+
+from django.contrib.postgres import search as pg_search
+from django.core.management import base
+from django.db import connection
+from django.db import transaction
+
+from core import models
+from core.search import search_api
+
+
+class Command(base.BaseCommand):
+    """Benchmarks the autocomplete DB query against a plain similarity sort.
+
+    Runs queries made from random prefixes of work names with both the
+    index-assisted KNN query and a query that scores and sorts every work,
+    and reports latency and any differences in results. Run it against a
+    full size catalog, since the gap grows with the number of works. When
+    one isn't at hand, --synthetic-works adds made up works for the run
+    and rolls them back afterwards.
+    """
+
+    help = 'Benchmarks the autocomplete DB query.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--samples', type=int, default=100,
+            help='Number of random queries to run.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed for choosing queries and synthetic names.')
+        parser.add_argument(
+            '--synthetic-works', type=int, default=0,
+            help=('Number of made up works to add for the run. They are '
+                  'rolled back afterwards.'))
+
+    def handle(self, *args, **options):
+        results = benchmark(
+            num_samples=options['samples'], seed=options['seed'],
+            num_synthetic_works=options['synthetic_works'])
+        print(
+            ('works=%d queries=%d mismatches=%d '
+             'sort=%.1fms (p95 %.1fms) knn=%.1fms (p95 %.1fms)') % (
+                results['works'], results['queries'], results['mismatches'],
+                results['sort_seconds'] * 1000,
+                results['sort_p95_seconds'] * 1000,
+                results['knn_seconds'] * 1000,
+                results['knn_p95_seconds'] * 1000))
+
+
+def benchmark(
+        num_samples=100, seed=0, num_synthetic_works=0,
+        limit=search_api.MAX_AUTOCOMPLETE_RESULTS,
+        min_similarity=search_api.MIN_AUTOCOMPLETE_SIMILARITY):
+    """Compares the KNN autocomplete query with a full similarity sort.
+
+    Args:
+        num_samples: Integer number of queries to run.
+        seed: Integer random seed for choosing queries and synthetic names.
+        num_synthetic_works: Integer number of made up works to add before
+            running queries. They are rolled back afterwards.
+        limit: Integer max suggestions per query.
+        min_similarity: Float minimum trigram similarity of a suggestion.
+
+    Returns:
+        Dict with these keys:
+            works: Integer number of works.
+            queries: Integer number of queries run.
+            mismatches: Integer number of queries whose names differ.
+            sort_seconds, knn_seconds: Float mean latency of each query.
+            sort_p95_seconds, knn_p95_seconds: Float 95th percentile
+                latency of each query.
+    """
+    rand = random.Random(seed)
+    with transaction.atomic():
+        if num_synthetic_works > 0:
+            _add_synthetic_works(num_synthetic_works, rand)
+        results = _run_queries(num_samples, rand, limit, min_similarity)
+        transaction.set_rollback(True)
+    return results
+
+
+def _run_queries(num_samples, rand, limit, min_similarity):
+    """Runs the queries of benchmark. See benchmark."""
+    num_works = models.Work.objects.count()
+    results = {
+        'works': num_works, 'queries': 0, 'mismatches': 0,
+        'sort_seconds': 0.0, 'sort_p95_seconds': 0.0,
+        'knn_seconds': 0.0, 'knn_p95_seconds': 0.0}
+    if not num_works or num_samples < 1:
+        return results
+    sort_times = []
+    knn_times = []
+    for _ in range(num_samples):
+        name = models.Work.objects.order_by('id').values_list(
+            'name', flat=True)[rand.randrange(num_works)]
+        query = name[:rand.randint(1, max(len(name), 1))]
+
+        start = time.perf_counter()
+        sort_names = list(models.Work.objects.annotate(
+            similarity=pg_search.TrigramSimilarity('name', query)).filter(
+            similarity__gte=min_similarity).order_by(
+            '-similarity', 'id').values_list('name', flat=True)[:limit])
+        sort_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        knn_names = search_api.query_autocomplete_names(
+            query, limit, min_similarity)
+        knn_times.append(time.perf_counter() - start)
+
+        if sort_names != knn_names:
+            results['mismatches'] += 1
+    results['queries'] = num_samples
+    results['sort_seconds'] = sum(sort_times) / num_samples
+    results['knn_seconds'] = sum(knn_times) / num_samples
+    results['sort_p95_seconds'] = _percentile(sort_times, 0.95)
+    results['knn_p95_seconds'] = _percentile(knn_times, 0.95)
+    return results
+
+
+def _add_synthetic_works(num_works, rand):
+    """Adds made up works, named with words from existing work names.
+
+    Args:
+        num_works: Integer number of works to add.
+        rand: random.Random object.
+    """
+    words = sorted({
+        word
+        for name in models.Work.objects.values_list('name', flat=True)
+        for word in name.split()})
+    if not words:
+        words = [
+            ''.join(rand.choice(string.ascii_lowercase)
+                    for _ in range(rand.randint(3, 9))).capitalize()
+            for _ in range(1000)]
+    models.Work.objects.bulk_create(
+        [models.Work(
+            url='https://example.com/synthetic/%d' % i,
+            name=' '.join(
+                rand.choice(words) for _ in range(rand.randint(1, 5))))
+         for i in range(num_works)],
+        batch_size=10000)
+    # Without fresh stats the planner may not pick the trigram index.
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE %s' % models.Work._meta.db_table)
+
+
+def _percentile(values, fraction):
+    """Gets the value below which a fraction of values fall."""
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
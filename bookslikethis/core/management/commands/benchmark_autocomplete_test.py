@@ -0,0 +1,41 @@
+from unittest import mock
+
+from core import factories
+from core import models
+from core import test
+from core.management.commands import benchmark_autocomplete
+
+
+class BenchmarkTest(test.TestCase):
+
+    def setUp(self):
+        for name in ('Dune', 'Dune Messiah', 'Children of Dune', 'Taken'):
+            factories.WorkFactory.create(name=name)
+
+    def test_happy(self):
+        results = benchmark_autocomplete.benchmark(num_samples=5)
+        self.assertEqual(
+            results,
+            {'works': 4, 'queries': 5, 'mismatches': 0,
+             'sort_seconds': mock.ANY, 'sort_p95_seconds': mock.ANY,
+             'knn_seconds': mock.ANY, 'knn_p95_seconds': mock.ANY})
+
+    def test_synthetic_works(self):
+        results = benchmark_autocomplete.benchmark(
+            num_samples=5, num_synthetic_works=50)
+        self.assertEqual(results['works'], 54)
+        self.assertEqual(results['mismatches'], 0)
+        self.assertEqual(models.Work.objects.count(), 4)
+
+    def test_command(self):
+        with mock.patch('builtins.print') as print_mock:
+            benchmark_autocomplete.Command().handle(
+                samples=2, seed=0, synthetic_works=0)
+        print_mock.assert_called_once()
+
+
+class BenchmarkEmptyDbTest(test.TestCase):
+
+    def test_empty_db(self):
+        self.assertEqual(
+            benchmark_autocomplete.benchmark()['queries'], 0)
@@ -0,0 +1,94 @@
+import numpy as np
+from django.conf import settings
+from django.core.management import base
+
+from core import cache
+from core import data_api
+from core import index_snapshot
+
+
+class Command(base.BaseCommand):
+    """Writes an index snapshot file of the data behind search.
+
+    Processes memory map the file named by settings.INDEX_SNAPSHOT_PATH
+    instead of querying the DB for trope ids, trope tags, trope occurrence
+    counts, genre info and work connections. Rerun this after loading new
+    data. Until then, the snapshot is ignored as stale.
+
+    Processes still query the DB for the current data generation, to check
+    the snapshot isn't stale, and for the names and descriptions in search
+    results and autocomplete.
+    """
+
+    help = 'Builds the search index snapshot file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', type=str, default=settings.INDEX_SNAPSHOT_PATH,
+            help=('File to write. Defaults to the INDEX_SNAPSHOT_PATH '
+                  'setting.'))
+
+    def handle(self, *args, **options):
+        path = options.get('output') or settings.INDEX_SNAPSHOT_PATH
+        if not path:
+            raise base.CommandError(
+                'Pass --output or set INDEX_SNAPSHOT_PATH.')
+
+        print('Building index snapshot...')
+        cache.forget_data_generation()
+        data_generation = cache.get_data_generation()
+        arrays, metadata = self._get_snapshot_data()
+        index_snapshot.write_snapshot(
+            path, data_generation, arrays, metadata)
+        print('Wrote %s.' % path)
+
+    def _get_snapshot_data(self):
+        """Fetches everything a snapshot holds from the DB.
+
+        Returns:
+            Tuple of:
+                Dict of string name to numpy array.
+                Dict of JSON compatible metadata.
+        """
+        trope_work_work_ids, trope_work_trope_ids = (
+            data_api.get_trope_work_edges(use_snapshot=False))
+        genre_work_work_ids, genre_work_genre_ids = (
+            data_api.get_genre_work_edges(use_snapshot=False))
+        trope_tag_trope_ids, trope_tag_names = (
+            data_api.get_trope_tag_edges(use_snapshot=False))
+        tag_names = sorted(set(trope_tag_names))
+        tag_name_to_index = {name: i for (i, name) in enumerate(tag_names)}
+        genre_id_to_name_and_depth = sorted(
+            data_api.get_genre_info(use_snapshot=False).items())
+        trope_id_to_count = sorted(
+            data_api.get_trope_to_occurrence_count(
+                use_snapshot=False).items())
+
+        arrays = {
+            'trope_ids': data_api.get_all_trope_ids(use_snapshot=False),
+            'trope_work_work_ids': trope_work_work_ids,
+            'trope_work_trope_ids': trope_work_trope_ids,
+            'genre_work_work_ids': genre_work_work_ids,
+            'genre_work_genre_ids': genre_work_genre_ids,
+            'trope_tag_trope_ids': trope_tag_trope_ids,
+            'trope_tag_tag_indexes': np.array(
+                [tag_name_to_index[name] for name in trope_tag_names],
+                dtype=np.int32),
+            'genre_ids': np.array(
+                [gid for (gid, _) in genre_id_to_name_and_depth],
+                dtype=np.int64),
+            'genre_depths': np.array(
+                [depth for (_, (_, depth)) in genre_id_to_name_and_depth],
+                dtype=np.int32),
+            'occurrence_trope_ids': np.array(
+                [tid for (tid, _) in trope_id_to_count], dtype=np.int64),
+            'occurrence_counts': np.array(
+                [count for (_, count) in trope_id_to_count],
+                dtype=np.int64),
+        }
+        metadata = {
+            'tag_names': tag_names,
+            'genre_names': [
+                name for (_, (name, _)) in genre_id_to_name_and_depth],
+        }
+        return arrays, metadata
@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+from django.core.management import base
+
+from core import data_api
+from core import factories
+from core import test
+from core.management.commands import build_index
+
+
+class BuildIndexTest(test.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'index')
+
+    def test_happy(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        tag_two = factories.TropeTagFactory.create(name='setting')
+        trope = factories.TropeFactory.create(tags=[tag, tag_two])
+        trope_two = factories.TropeFactory.create(tags=[tag])
+        genre = factories.GenreFactory.create()
+        sub_genre = factories.GenreFactory.create(parent_genre=genre)
+        factories.WorkFactory.create(
+            tropes=[trope, trope_two], genres=[genre, sub_genre])
+        factories.WorkFactory.create(tropes=[trope], genres=[genre])
+        factories.WorkFactory.create()
+
+        build_index.Command().handle(output=self.path)
+
+        with self.settings(INDEX_SNAPSHOT_PATH=self.path):
+            for func in (
+                    data_api.get_trope_work_edges,
+                    data_api.get_genre_work_edges):
+                db_ids, db_other_ids = func(use_snapshot=False)
+                with self.assertNumQueries(0):
+                    ids, other_ids = func()
+                self.assertCountEqual(
+                    zip(ids.tolist(), other_ids.tolist()),
+                    zip(db_ids.tolist(), db_other_ids.tolist()))
+
+            self.assertCountEqual(
+                data_api.get_all_trope_ids().tolist(),
+                [trope.id, trope_two.id])
+
+            db_trope_ids, db_tag_names = data_api.get_trope_tag_edges(
+                use_snapshot=False)
+            trope_ids, tag_names = data_api.get_trope_tag_edges()
+            self.assertCountEqual(
+                zip(trope_ids.tolist(), tag_names),
+                zip(db_trope_ids.tolist(), db_tag_names))
+
+            self.assertEqual(
+                data_api.get_genre_info(),
+                data_api.get_genre_info(use_snapshot=False))
+            for tag_names in (None, (tag_two.name,)):
+                self.assertEqual(
+                    data_api.get_trope_to_occurrence_count(
+                        tag_names=tag_names),
+                    data_api.get_trope_to_occurrence_count(
+                        tag_names=tag_names, use_snapshot=False))
+
+    def test_no_output(self):
+        with self.settings(INDEX_SNAPSHOT_PATH=None):
+            with self.assertRaises(base.CommandError):
+                build_index.Command().handle(output=None)
@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+
+import numpy as np
+from django import db
+from django.core.management import base
+from django.db import transaction
+
+from core import cache
+from core import models
+from core.management.commands import warm_cache
+from core.search import search_api
+from core.search import work_trope_matrix
+
+
+class Command(base.BaseCommand):
+    """Precomputes similarity search results for every work.
+
+    Results are stored in the SimilarWork and SimilarWorkTropeWeight
+    tables, replacing any existing results, and used to answer single
+    work searches. Rerun this after loading new data. Until then, stored
+    results are ignored as stale.
+    """
+
+    help = 'Precomputes similar works for every work.'
+
+    # How many works each worker process scores at a time.
+    CHUNK_SIZE = 100
+
+    # How many records to write to the DB at a time.
+    BATCH_SIZE = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Number of worker processes. Defaults to the CPU count.')
+        parser.add_argument(
+            '--limit', type=int,
+            default=search_api.MAX_PRECOMPUTED_RESULTS,
+            help='Max similar works to store per work.')
+
+    def handle(self, *args, **options):
+        processes = options.get('processes') or 1
+        limit = options.get('limit') or search_api.MAX_PRECOMPUTED_RESULTS
+
+        cache.forget_data_generation()
+        data_generation = cache.get_data_generation()
+        # Fill the in-process caches once so forked workers share them.
+        warm_cache.Command().handle()
+        work_ids = work_trope_matrix.get_work_trope_matrix().work_ids.tolist()
+        chunks = [
+            (work_ids[i:i + Command.CHUNK_SIZE], limit)
+            for i in range(0, len(work_ids), Command.CHUNK_SIZE)]
+
+        print('Scoring %d works...' % len(work_ids))
+        results = []
+        if processes == 1:
+            for chunk in chunks:
+                results.extend(_score_chunk(chunk))
+        else:
+            # DB connections can't be shared across a fork. Each worker
+            # opens its own.
+            db.connections.close_all()
+            with multiprocessing.Pool(processes) as pool:
+                for chunk_results in pool.imap_unordered(
+                        _score_chunk, chunks):
+                    results.extend(chunk_results)
+
+        print('Saving...')
+        self._save_results(results, data_generation)
+        print('Finished.')
+
+    def _save_results(self, results, data_generation):
+        """Replaces all stored results.
+
+        Args:
+            results: List of tuples from _score_chunk.
+            data_generation: Integer data generation the results were
+                computed from.
+        """
+        similar_works = []
+        trope_weights = []
+        for work_id, similar_work_ids, scores, trope_id_to_weight in results:
+            similar_works.extend(
+                models.SimilarWork(
+                    work_id=work_id, similar_work_id=similar_work_id,
+                    rank=rank, score=score, data_generation=data_generation)
+                for rank, (similar_work_id, score) in enumerate(
+                    zip(similar_work_ids, scores)))
+            trope_weights.extend(
+                models.SimilarWorkTropeWeight(
+                    work_id=work_id, trope_id=trope_id, weight=weight)
+                for trope_id, weight in trope_id_to_weight.items())
+
+        with transaction.atomic():
+            models.SimilarWork.objects.all().delete()
+            models.SimilarWorkTropeWeight.objects.all().delete()
+            models.SimilarWork.objects.bulk_create(
+                similar_works, batch_size=Command.BATCH_SIZE)
+            models.SimilarWorkTropeWeight.objects.bulk_create(
+                trope_weights, batch_size=Command.BATCH_SIZE)
+
+
+def _score_chunk(chunk):
+    """Finds similar works for a chunk of works.
+
+    Module level so that it can be sent to worker processes.
+
+    Args:
+        chunk: Tuple of (list of integer work ids, integer result limit).
+
+    Returns:
+        List of tuples of:
+            Integer work id.
+            List of similar work ids, most similar first.
+            List of float similarity scores, one per similar work id.
+            Dict of trope id to distinctiveness rating, for the work's
+                tropes that are shared with any similar work.
+    """
+    work_ids, limit = chunk
+    matrix = work_trope_matrix.get_work_trope_matrix()
+    results = []
+    for work_id in work_ids:
+        similar_work_ids, scores, trope_id_to_weight = (
+            search_api.calc_similar_books_with_scores(work_id, limit=limit))
+        # Only shared tropes are ever displayed with results.
+        _, columns = matrix.gather_rows(matrix.get_rows(similar_work_ids))
+        shared_trope_ids = set(matrix.trope_ids[np.unique(columns)].tolist())
+        results.append((
+            work_id, similar_work_ids, scores,
+            {tid: weight for (tid, weight) in trope_id_to_weight.items()
+             if tid in shared_trope_ids}))
+    return results
@@ -0,0 +1,78 @@
+from core import cache
+from core import data_api
+from core import factories
+from core import models
+from core import test
+from core.management.commands import build_similar_works
+from core.search import search_api
+
+
+class BuildSimilarWorksTest(test.TestCase):
+
+    def setUp(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        self.trope = factories.TropeFactory.create(tags=[tag])
+        self.trope_two = factories.TropeFactory.create(tags=[tag])
+        self.unshared_trope = factories.TropeFactory.create(tags=[tag])
+        self.work = factories.WorkFactory.create(
+            tropes=[self.trope, self.trope_two, self.unshared_trope])
+        self.work_two = factories.WorkFactory.create(
+            tropes=[self.trope, self.trope_two])
+        self.work_three = factories.WorkFactory.create(tropes=[self.trope])
+        self.lonely_work = factories.WorkFactory.create()
+
+    def _build(self, **options):
+        build_options = {'processes': 1, 'limit': None}
+        build_options.update(options)
+        build_similar_works.Command().handle(**build_options)
+
+    def test_happy(self):
+        self._build()
+        similar_works = models.SimilarWork.objects.filter(
+            work=self.work).order_by('rank')
+        self.assertEqual(
+            [sw.similar_work_id for sw in similar_works],
+            [self.work_two.id, self.work_three.id])
+        self.assertGreater(similar_works[0].score, similar_works[1].score)
+        # Unshared tropes aren't stored.
+        self.assertCountEqual(
+            models.SimilarWorkTropeWeight.objects.filter(
+                work=self.work).values_list('trope_id', flat=True),
+            [self.trope.id, self.trope_two.id])
+        self.assertFalse(models.SimilarWork.objects.filter(
+            work=self.lonely_work).exists())
+
+    def test_matches_live(self):
+        self._build()
+        for work in (self.work, self.work_two, self.work_three):
+            similar_work_ids, _, trope_id_to_weight = (
+                search_api.calc_similar_books_with_scores(work.id))
+            precomputed_ids, precomputed_weights = (
+                search_api.get_similar_books([work.id]))
+            self.assertEqual(precomputed_ids, similar_work_ids)
+            for trope_id, weight in precomputed_weights.items():
+                self.assertEqual(weight, trope_id_to_weight[trope_id])
+
+    def test_data_generation(self):
+        cache.bump_data_generation()
+        self._build()
+        self.assertEqual(
+            set(models.SimilarWork.objects.values_list(
+                'data_generation', flat=True)),
+            {cache.get_data_generation()})
+        self.assertIsNotNone(
+            data_api.get_precomputed_similar_works(self.work.id))
+
+    def test_limit(self):
+        self._build(limit=1)
+        self.assertEqual(
+            list(models.SimilarWork.objects.filter(
+                work=self.work).values_list('similar_work_id', flat=True)),
+            [self.work_two.id])
+
+    def test_replaces_results(self):
+        stale = factories.SimilarWorkFactory.create(
+            work=self.work, similar_work=self.lonely_work, rank=0)
+        self._build()
+        self.assertFalse(
+            models.SimilarWork.objects.filter(id=stale.id).exists())
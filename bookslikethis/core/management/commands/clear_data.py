@@ -1,5 +1,6 @@
 from django.core.management import base
 
+from core import cache
 from core import models
 
 
@@ -25,6 +26,9 @@ class Command(base.BaseCommand):
                 Command.confirmation_match_string))
 
     def _delete_data(self):
+        models.SimilarWork.objects.all().delete()
+        models.SimilarWorkTropeWeight.objects.all().delete()
+
         models.TropeWork.objects.all().delete()
         models.TropeTrope.objects.all().delete()
         models.TropeTagMap.objects.all().delete()
@@ -35,3 +39,5 @@ class Command(base.BaseCommand):
         models.Work.objects.all().delete()
         models.Creator.objects.all().delete()
         models.Genre.objects.all().delete()
+
+        cache.bump_data_generation()
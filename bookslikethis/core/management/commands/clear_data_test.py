@@ -1,5 +1,6 @@
 from unittest import mock
 
+from core import cache
 from core import factories
 from core import test
 from core.management.commands import clear_data
@@ -26,6 +27,7 @@ class ClearDataTest(test.TestCase):
             self.assertFalse(
                 model_inst.__class__.objects.filter(
                     id=model_inst.id).exists())
+        self.assertEqual(cache.get_data_generation(), 1)
 
     def test_bad_confirmation(self):
         trope = factories.TropeFactory.create()
@@ -37,3 +39,4 @@ class ClearDataTest(test.TestCase):
             command.handle()
         # Nothing deleted.
         self.assertTrue(trope.__class__.objects.filter(id=trope.id).exists())
+        self.assertEqual(cache.get_data_generation(), 0)
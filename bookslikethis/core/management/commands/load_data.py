@@ -8,6 +8,7 @@ from django.core import validators
 from django.core import exceptions
 from django.utils import text
 
+from core import cache
 from core import model_constants
 from core import models
 
@@ -108,6 +109,9 @@ class Command(base.BaseCommand):
         # Remove any orphan genre records.
         self.remove_orphan_genres()
 
+        # Let every process know its cached data is stale.
+        cache.bump_data_generation()
+
     def walk_jsonl_files(self, files):
         """Yields dicts from JSON lines files.
 
@@ -2,6 +2,7 @@ import json
 import io
 
 from core.management.commands import load_data
+from core import cache
 from core import models
 from core import test
 
@@ -170,6 +171,7 @@ class LoadDataTest(test.TestCase):
         self.assertEqual(
             trope.trope.laconic_description,
             'Trope One laconic description.')
+        self.assertEqual(cache.get_data_generation(), 1)
 
     def test_genre_maps(self):
         f = self._build_data_file((
@@ -0,0 +1,117 @@
+import random
+import time
+
+from django.core.management import base
+
+from core.management.commands import warm_cache
+from core.search import minhash_lsh
+from core.search import search_api
+from core.search import work_similarity
+from core.search import work_trope_matrix
+
+
+class Command(base.BaseCommand):
+    """Measures approximate (MinHash LSH) search quality against exact search.
+
+    Runs searches for random reference sets with both exact and LSH
+    candidate generation, and reports recall@k and latency for each
+    number of LSH bands.
+    """
+
+    help = 'Measures recall of MinHash LSH candidate generation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bands', type=int, nargs='+',
+            default=[minhash_lsh.LSH_BANDS],
+            help='Numbers of LSH bands to measure.')
+        parser.add_argument(
+            '--reference-works', type=int, default=50,
+            help='Number of works in each random reference set.')
+        parser.add_argument(
+            '--samples', type=int, default=20,
+            help='Number of random reference sets to search for.')
+        parser.add_argument(
+            '--k', type=int, default=search_api.MAX_SEARCH_RESULTS,
+            help='Number of results to compare.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed for choosing reference sets.')
+
+    def handle(self, *args, **options):
+        warm_cache.Command().handle()
+        for bands in options['bands']:
+            results = measure_recall(
+                bands,
+                num_reference_works=options['reference_works'],
+                num_samples=options['samples'],
+                k=options['k'],
+                seed=options['seed'])
+            print(
+                ('bands=%d recall@%d=%.3f exact=%.1fms lsh=%.1fms '
+                 'candidates=%.0f') % (
+                    bands, options['k'], results['recall'],
+                    results['exact_seconds'] * 1000,
+                    results['lsh_seconds'] * 1000,
+                    results['candidates']))
+
+
+def measure_recall(
+        bands, num_reference_works=50, num_samples=20, k=10, seed=0):
+    """Compares LSH and exact search results for random reference sets.
+
+    Searches use the same configuration as search_api.get_similar_books.
+
+    Args:
+        bands: Integer number of LSH bands.
+        num_reference_works: Integer number of works per reference set.
+        num_samples: Integer number of reference sets to search for.
+        k: Integer number of results to compare.
+        seed: Integer random seed for choosing reference sets.
+
+    Returns:
+        Dict with these keys, each averaged over samples:
+            recall: Float fraction of exact top k results also in the
+                LSH top k. Samples without exact results count as 1.
+            exact_seconds: Float exact search latency.
+            lsh_seconds: Float LSH search latency.
+            candidates: Float number of LSH candidate works.
+    """
+    matrix = work_trope_matrix.get_work_trope_matrix()
+    index = minhash_lsh.get_minhash_lsh_index(bands)
+    all_work_ids = matrix.work_ids.tolist()
+    rand = random.Random(seed)
+    search_kwargs = {
+        'limit': k,
+        'tag_names': tuple(search_api.TROPE_TAG_WEIGHTS.keys()),
+        'tag_weights': search_api.TROPE_TAG_WEIGHTS,
+        'engine': work_similarity.MATRIX_ENGINE}
+
+    totals = {
+        'recall': 0.0, 'exact_seconds': 0.0, 'lsh_seconds': 0.0,
+        'candidates': 0.0}
+    if not all_work_ids or num_samples < 1:
+        return totals
+    for _ in range(num_samples):
+        work_ids = rand.sample(
+            all_work_ids, min(num_reference_works, len(all_work_ids)))
+
+        start = time.perf_counter()
+        exact_work_ids, _ = work_similarity.find_similar_works(
+            work_ids, **search_kwargs)
+        totals['exact_seconds'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        lsh_work_ids, _ = work_similarity.find_similar_works(
+            work_ids, lsh_bands=bands, **search_kwargs)
+        totals['lsh_seconds'] += time.perf_counter() - start
+
+        if exact_work_ids:
+            totals['recall'] += (
+                len(set(exact_work_ids).intersection(lsh_work_ids)) /
+                len(exact_work_ids))
+        else:
+            totals['recall'] += 1
+        totals['candidates'] += (
+            len(index.query(matrix.get_rows(work_ids))) - len(work_ids))
+    return {key: total / num_samples for (key, total) in totals.items()}
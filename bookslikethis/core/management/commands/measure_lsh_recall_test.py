@@ -0,0 +1,39 @@
+from unittest import mock
+
+from core import factories
+from core import test
+from core.management.commands import measure_lsh_recall
+
+
+class MeasureRecallTest(test.TestCase):
+
+    def setUp(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        tropes = [factories.TropeFactory.create(tags=[tag]) for _ in range(8)]
+        for i in range(6):
+            factories.WorkFactory.create(tropes=tropes[i:i + 3])
+
+    def test_happy(self):
+        results = measure_lsh_recall.measure_recall(
+            16, num_reference_works=2, num_samples=3)
+        self.assertEqual(
+            results,
+            {'recall': mock.ANY, 'exact_seconds': mock.ANY,
+             'lsh_seconds': mock.ANY, 'candidates': mock.ANY})
+        self.assertGreaterEqual(results['recall'], 0)
+        self.assertLessEqual(results['recall'], 1)
+
+    def test_command(self):
+        with mock.patch('builtins.print') as print_mock:
+            measure_lsh_recall.Command().handle(
+                bands=[8, 16], reference_works=2, samples=2, k=5, seed=0)
+        self.assertEqual(print_mock.call_count, 5)
+
+
+class MeasureRecallEmptyDbTest(test.TestCase):
+
+    def test_empty_db(self):
+        self.assertEqual(
+            measure_lsh_recall.measure_recall(16),
+            {'recall': 0, 'exact_seconds': 0, 'lsh_seconds': 0,
+             'candidates': 0})
@@ -1,7 +1,6 @@
 from django.core.management import base
 
-from core import data_api
-from core.search import search_api
+from core import warmup
 
 
 class Command(base.BaseCommand):
@@ -10,12 +9,7 @@ class Command(base.BaseCommand):
 
     def handle(self, *args, **options):
         print('Clearing cache...')
-        data_api._get_tropes.cache_clear()
-        data_api.get_trope_to_occurrence_count.cache_clear()
-        data_api.get_genre_info.cache_clear()
+        warmup.clear_caches()
         print('Warming cache...')
-        data_api.get_tropes()
-        data_api.get_trope_to_occurrence_count(
-            tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()))
-        data_api.get_genre_info()
+        warmup.warm_caches()
         print('Finished warming cache.')
@@ -8,10 +8,10 @@ class WarmCacheTest(test.TestCase):
     MOCK_CACHE = False
 
     def test_happy(self):
-        data_api.get_trope_to_occurrence_count.cache_clear()
+        data_api._get_trope_to_occurrence_count.cache_clear()
 
         command = warm_cache.Command()
         command.handle()
 
-        cache_info = data_api.get_trope_to_occurrence_count.cache_info()
+        cache_info = data_api._get_trope_to_occurrence_count.cache_info()
         self.assertEqual(cache_info.misses, 1)
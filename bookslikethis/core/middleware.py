@@ -4,6 +4,8 @@ import logging
 from django import http
 from django.conf import settings
 
+from core import data_loader
+
 log = logging.getLogger(__name__)
 
 
@@ -73,3 +75,27 @@ class JsonDebugToolbarMiddleware(object):
 
     def process_exception(self, request, exception):
         return None
+
+
+class DataLoaderMiddleware(object):
+    """Gives each request a data_loader scope.
+
+    In DEBUG mode, the count of DB queries made while handling the request
+    is returned in the X-DB-Query-Count header.
+    """
+
+    QUERY_COUNT_HEADER = 'X-DB-Query-Count'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with data_loader.request_scope() as loader:
+            response = self.get_response(request)
+        if settings.DEBUG:
+            response[DataLoaderMiddleware.QUERY_COUNT_HEADER] = str(
+                loader.query_count)
+        return response
+
+    def process_exception(self, request, exception):
+        return None
@@ -3,6 +3,7 @@ from django import test as dj_test
 from django.test import client
 
 from core import middleware
+from core import models
 from core import test
 
 
@@ -118,3 +119,26 @@ class JsonDebugToolbarMiddlewareTest(test.TestCase):
             lambda r: response)
         final_response = middle_inst(self.request)
         self.assertEqual(final_response.content, response.content)
+
+
+class DataLoaderMiddlewareTest(test.TestCase):
+
+    def setUp(self):
+        self.request = client.RequestFactory().get('/')
+
+    def _get_response(self, request):
+        models.Work.objects.filter(name='x').exists()
+        return http.HttpResponse('default')
+
+    def test_query_count_header(self):
+        middle_inst = middleware.DataLoaderMiddleware(self._get_response)
+        with dj_test.override_settings(DEBUG=True):
+            response = middle_inst(self.request)
+        self.assertEqual(
+            response[middleware.DataLoaderMiddleware.QUERY_COUNT_HEADER], '1')
+
+    def test_no_header_without_debug(self):
+        middle_inst = middleware.DataLoaderMiddleware(self._get_response)
+        response = middle_inst(self.request)
+        self.assertFalse(response.has_header(
+            middleware.DataLoaderMiddleware.QUERY_COUNT_HEADER))
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.9 on 2026-10-16 21:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20190311_0040'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarWorkTropeWeight',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified_date', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('weight', models.FloatField()),
+                ('trope', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Trope')),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Work')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarWork',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified_date', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('similar_work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Work')),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_works', to='core.Work')),
+            ],
+            options={
+                'unique_together': {('work', 'rank')},
+            },
+        ),
+    ]
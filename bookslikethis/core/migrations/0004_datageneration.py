@@ -0,0 +1,26 @@
+# Generated by Django 2.2.9 on 2026-10-16 21:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_similarwork_similarworktropeweight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataGeneration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified_date', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('generation', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
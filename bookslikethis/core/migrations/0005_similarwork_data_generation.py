@@ -0,0 +1,18 @@
+# Generated by Django 2.2.9 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_datageneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarwork',
+            name='data_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
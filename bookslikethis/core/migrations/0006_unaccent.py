@@ -0,0 +1,13 @@
+from django.contrib.postgres import operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_similarwork_data_generation'),
+    ]
+
+    operations = [
+        operations.UnaccentExtension(),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# Normalizes a work name for exact matching, like
+# core.search.autocomplete_index.normalize_name. unaccent is only stable,
+# since its dictionary could change, so naming the dictionary is what makes
+# this safe to declare immutable and index.
+CREATE_FUNCTION_SQL = r'''
+CREATE FUNCTION core_normalize_name(text) RETURNS text AS $$
+    SELECT btrim(regexp_replace(
+        public.unaccent('public.unaccent'::regdictionary, lower($1)),
+        '\s+', ' ', 'g'))
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_unaccent'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_FUNCTION_SQL,
+            reverse_sql='DROP FUNCTION core_normalize_name(text)'),
+        migrations.RunSQL(
+            'CREATE INDEX core_work_normalized_name '
+            'ON core_work (core_normalize_name(name))',
+            reverse_sql='DROP INDEX core_work_normalized_name'),
+    ]
@@ -151,3 +151,52 @@ class TropeTrope(BaseModel):
 
     def __str__(self):
         return '%s -> %s' % (self.from_trope, self.to_trope)
+
+
+class SimilarWork(BaseModel):
+    """A precomputed similarity search result for a single work.
+
+    Populated by the build_similar_works command. Results are only used
+    while data_generation matches the current data generation.
+    """
+    work = models.ForeignKey(
+        Work, on_delete=models.CASCADE, related_name='similar_works')
+    similar_work = models.ForeignKey(
+        Work, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+    data_generation = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('work', 'rank')]
+
+    def __str__(self):
+        return '%s -> %s' % (self.work, self.similar_work)
+
+
+class SimilarWorkTropeWeight(BaseModel):
+    """A trope distinctiveness weight for a work's precomputed results.
+
+    Only tropes shared with at least one SimilarWork are stored.
+    """
+    work = models.ForeignKey(
+        Work, on_delete=models.CASCADE, related_name='+')
+    trope = models.ForeignKey(Trope, on_delete=models.CASCADE)
+    weight = models.FloatField()
+
+    def __str__(self):
+        return '%s <-> %s' % (self.trope, self.work)
+
+
+class DataGeneration(BaseModel):
+    """Counts changes to content data, so caches can tell when they're stale.
+
+    There is at most one row, with id SINGLETON_ID. See
+    cache.get_data_generation.
+    """
+    SINGLETON_ID = 1
+
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.generation)
@@ -0,0 +1,174 @@
+"""In-process cache of autocomplete suggestions.
+
+Autocomplete traffic is a stream of short, overlapping queries. Queries
+with the same trigrams have the same similarity to every name, so they
+share one entry: "Dune", "dune" and "dune!" are one query to pg_trgm.
+
+Each entry holds a pool of the best matches, up to POOL_SIZE names. Any
+request for at most that many suggestions, or for a query with fewer
+matches, is answered by slicing the pool.
+
+Pools from the in-memory autocomplete index and from the DB are kept
+apart, since the two can order equally similar names differently.
+"""
+import collections
+import time
+
+from django.conf import settings
+
+from core import cache
+from core.search import autocomplete_index
+
+# Max entries kept. The least recently used entry is evicted first.
+MAX_ENTRIES = 10000
+# Seconds an entry is used for.
+TTL_SECONDS = 300
+# Max names kept per entry.
+POOL_SIZE = 50
+
+
+class AutocompleteCache(object):
+    """A bounded, expiring map of normalized query to candidate pool.
+
+    Attributes:
+        hits: Integer count of lookups answered from the cache.
+        misses: Integer count of lookups that weren't.
+    """
+
+    def __init__(
+            self, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS,
+            clock=time.monotonic):
+        """Creates an empty cache.
+
+        Args:
+            max_entries: Optional, integer max entries kept.
+            ttl_seconds: Optional, float seconds an entry is used for.
+            clock: Optional, function returning the current time in
+                seconds.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_names(self, query, limit, min_similarity, source=None):
+        """Looks up suggestions for a query.
+
+        Args:
+            query: String, search query.
+            limit: Integer max names.
+            min_similarity: Float minimum trigram similarity of a name.
+            source: Optional, string name of where names come from.
+
+        Returns:
+            List of string work names, most similar first, or None if the
+            cache can't answer.
+        """
+        key = self._make_key(query, min_similarity, source)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, names, is_complete = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+            elif is_complete or limit <= len(names):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return names[:limit]
+        self.misses += 1
+        return None
+
+    def set_names(
+            self, query, min_similarity, names, is_complete, source=None):
+        """Stores a candidate pool for a query.
+
+        Args:
+            query: String, search query.
+            min_similarity: Float minimum trigram similarity of a name.
+            names: List of string work names, most similar first.
+            is_complete: Boolean, whether names holds every match.
+            source: Optional, string name of where names come from.
+        """
+        key = self._make_key(query, min_similarity, source)
+        self._entries[key] = (
+            self._clock() + self.ttl_seconds, list(names), is_complete)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self):
+        """Gets usage statistics.
+
+        Returns:
+            Dict with integer hits, misses and entries fields.
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'entries': len(self._entries)}
+
+    def clear(self):
+        """Removes every entry, and resets statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _make_key(self, query, min_similarity, source):
+        """Normalizes a query into a cache key.
+
+        Only ASCII queries are normalized to their trigrams, since the DB's
+        handling of other characters depends on its locale.
+        """
+        if all(ord(c) < 128 for c in query):
+            normalized = tuple(sorted(autocomplete_index.get_trigrams(query)))
+        else:
+            normalized = query
+        return (
+            normalized, min_similarity, source,
+            cache.get_data_generation())
+
+
+_autocomplete_cache = AutocompleteCache()
+
+
+def get_names(query, limit, min_similarity, fetch_names, source):
+    """Gets suggestions for a query, from the cache when possible.
+
+    "settings.CACHE_ENABLED = False" will disable any caching.
+
+    Args:
+        query: String, search query.
+        limit: Integer max names.
+        min_similarity: Float minimum trigram similarity of a name.
+        fetch_names: Function taking query, limit and min_similarity args,
+            and returning a list of names, most similar first.
+        source: String name of where fetch_names gets names from.
+
+    Returns:
+        List of string work names, most similar first.
+    """
+    if not settings.CACHE_ENABLED:
+        return fetch_names(query, limit, min_similarity)
+    names = _autocomplete_cache.get_names(
+        query, limit, min_similarity, source=source)
+    if names is None:
+        pool_size = max(limit, POOL_SIZE)
+        pool = fetch_names(query, pool_size, min_similarity)
+        _autocomplete_cache.set_names(
+            query, min_similarity, pool, len(pool) < pool_size,
+            source=source)
+        names = pool[:limit]
+    return names
+
+
+def get_stats():
+    """Gets usage statistics of this process's cache.
+
+    See AutocompleteCache.get_stats.
+    """
+    return _autocomplete_cache.get_stats()
+
+
+def clear():
+    """Empties this process's cache."""
+    _autocomplete_cache.clear()
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from core import factories
+from core import test
+from core.search import autocomplete_cache
+from core.search import autocomplete_index
+from core.search import search_api
+
+
+class AutocompleteCacheTest(test.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = autocomplete_cache.AutocompleteCache(
+            max_entries=2, ttl_seconds=10, clock=lambda: self.now)
+
+    def test_happy(self):
+        self.assertIsNone(self.cache.get_names('dune', 2, 0.2))
+        self.cache.set_names('dune', 0.2, ['Dune', 'Dune Messiah'], True)
+        self.assertEqual(
+            self.cache.get_names('dune', 2, 0.2), ['Dune', 'Dune Messiah'])
+        self.assertEqual(self.cache.get_names('dune', 1, 0.2), ['Dune'])
+        self.assertIsNone(self.cache.get_names('dune', 2, 0.3))
+        self.assertEqual(
+            self.cache.get_stats(), {'hits': 2, 'misses': 2, 'entries': 1})
+
+    def test_normalized_query(self):
+        self.cache.set_names('dune', 0.2, ['Dune'], True)
+        self.assertEqual(self.cache.get_names('DUNE!', 1, 0.2), ['Dune'])
+        self.assertEqual(self.cache.get_names(' dune ', 1, 0.2), ['Dune'])
+        self.assertIsNone(self.cache.get_names('dun', 1, 0.2))
+
+    def test_incomplete_pool(self):
+        self.cache.set_names('dune', 0.2, ['Dune'], False)
+        self.assertEqual(self.cache.get_names('dune', 1, 0.2), ['Dune'])
+        self.assertIsNone(self.cache.get_names('dune', 2, 0.2))
+
+    def test_source(self):
+        self.cache.set_names('dune', 0.2, ['Dune'], True, source='db')
+        self.assertEqual(
+            self.cache.get_names('dune', 1, 0.2, source='db'), ['Dune'])
+        self.assertIsNone(self.cache.get_names('dune', 1, 0.2))
+        self.assertIsNone(
+            self.cache.get_names('dune', 1, 0.2, source='index'))
+
+    def test_ttl(self):
+        self.cache.set_names('dune', 0.2, ['Dune'], True)
+        self.now = 9
+        self.assertEqual(self.cache.get_names('dune', 1, 0.2), ['Dune'])
+        self.now = 10
+        self.assertIsNone(self.cache.get_names('dune', 1, 0.2))
+        self.assertEqual(self.cache.get_stats()['entries'], 0)
+
+    def test_eviction(self):
+        self.cache.set_names('a', 0.2, [], True)
+        self.cache.set_names('b', 0.2, [], True)
+        self.cache.get_names('a', 1, 0.2)
+        self.cache.set_names('c', 0.2, [], True)
+        self.assertEqual(self.cache.get_names('a', 1, 0.2), [])
+        self.assertIsNone(self.cache.get_names('b', 1, 0.2))
+        self.assertEqual(self.cache.get_names('c', 1, 0.2), [])
+
+    def test_clear(self):
+        self.cache.set_names('a', 0.2, [], True)
+        self.cache.get_names('a', 1, 0.2)
+        self.cache.clear()
+        self.assertEqual(
+            self.cache.get_stats(), {'hits': 0, 'misses': 0, 'entries': 0})
+
+
+class GetAutocompleteSuggestionsCacheTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def setUp(self):
+        # Make suggestions come from the DB.
+        autocomplete_index.get_autocomplete_index.cache_clear()
+
+    def test_caching(self):
+        factories.WorkFactory.create(name='Dune')
+        factories.WorkFactory.create(name='Dune Messiah')
+        with mock.patch.object(
+                search_api, 'query_autocomplete_names',
+                wraps=search_api.query_autocomplete_names) as query_mock:
+            self.assertEqual(
+                search_api.get_autocomplete_suggestions('dune'),
+                [{'name': 'Dune'}, {'name': 'Dune Messiah'}])
+            self.assertEqual(
+                search_api.get_autocomplete_suggestions('Dune', limit=1),
+                [{'name': 'Dune'}])
+            query_mock.assert_called_once_with(
+                'dune', autocomplete_cache.POOL_SIZE,
+                search_api.MIN_AUTOCOMPLETE_SIMILARITY)
+        self.assertEqual(
+            autocomplete_cache.get_stats(),
+            {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_caching_index(self):
+        factories.WorkFactory.create(name='Dune')
+        factories.WorkFactory.create(name='Dune Messiah')
+        index = autocomplete_index.get_autocomplete_index()
+        with mock.patch.object(
+                autocomplete_index, 'get_built_autocomplete_index',
+                return_value=index), \
+                mock.patch.object(
+                    index, 'search', wraps=index.search) as search_mock:
+            self.assertEqual(
+                search_api.get_autocomplete_suggestions('dune'),
+                [{'name': 'Dune'}, {'name': 'Dune Messiah'}])
+            self.assertEqual(
+                search_api.get_autocomplete_suggestions('Dune', limit=1),
+                [{'name': 'Dune'}])
+            search_mock.assert_called_once_with(
+                'dune', autocomplete_cache.POOL_SIZE,
+                search_api.MIN_AUTOCOMPLETE_SIMILARITY)
+        self.assertEqual(
+            autocomplete_cache.get_stats(),
+            {'hits': 1, 'misses': 1, 'entries': 1})
@@ -0,0 +1,355 @@
+"""In-memory trigram index of work names, for autocomplete.
+
+Scores match Postgres pg_trgm's similarity function: names and queries
+are lowercased and split into words of letters and digits, each word is
+padded with two spaces in front and one behind, and similarity is the
+count of shared unique trigrams over the count of trigrams in either.
+
+Autocomplete queries grow a character at a time, so each index keeps the
+shared trigram counts of recent queries. A query that extends a cached one
+only reads the postings of the trigrams that differ, then every candidate
+is scored exactly as before.
+"""
+import collections
+import logging
+import re
+import threading
+import unicodedata
+
+import numpy as np
+from django.db import connection
+
+from core import cache
+from core import models
+
+log = logging.getLogger(__name__)
+
+# Runs of letters and digits, like pg_trgm's word characters.
+_WORD_RE = re.compile(r'[^\W_]+')
+
+# Max candidate names, over all cached queries, whose shared trigram counts
+# each index keeps. Each costs 8 bytes.
+MAX_CACHED_CANDIDATES = 2000000
+# Max characters dropped from the end of a query to find a cached one.
+MAX_PREFIX_DISTANCE = 3
+
+_build_thread = None
+_build_lock = threading.Lock()
+
+
+def get_trigrams(text):
+    """Extracts the unique trigrams of a string, as pg_trgm does.
+
+    Args:
+        text: String.
+
+    Returns:
+        Set of three character strings.
+    """
+    trigrams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = '  %s ' % word
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def normalize_name(name):
+    """Normalizes a work name for exact matching.
+
+    Lowercases, strips accents, and collapses whitespace. The DB function
+    core_normalize_name does the same with Postgres' unaccent dictionary.
+
+    Args:
+        name: String work name or search query.
+
+    Returns:
+        String.
+    """
+    decomposed = unicodedata.normalize('NFKD', name.lower())
+    return ' '.join(''.join(
+        c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+class AutocompleteIndex(object):
+    """A read-only map of trigram to the work names containing it.
+
+    Attributes:
+        work_ids: numpy int64 array of work ids.
+        names: List of string work names, one per work id.
+        trigram_counts: numpy int32 array of the count of unique trigrams
+            in each name.
+        indptr: numpy int64 array. The postings of the trigram in slot i
+            are positions[indptr[i]:indptr[i + 1]].
+        positions: numpy int32 array of concatenated postings, as
+            positions in work_ids.
+        normalized_name_to_position: Dict of normalized name to the
+            position in work_ids of the lowest work id with that name.
+            See normalize_name.
+    """
+
+    def __init__(self, work_ids, names):
+        """Builds the index.
+
+        Args:
+            work_ids: Iterable of integer work ids.
+            names: Iterable of string work names, one per work id.
+        """
+        self.work_ids = np.array(list(work_ids), dtype=np.int64)
+        self.names = list(names)
+        trigram_to_positions = {}
+        self.trigram_counts = np.zeros(len(self.names), dtype=np.int32)
+        self.normalized_name_to_position = {}
+        for position in np.argsort(self.work_ids, kind='stable').tolist():
+            self.normalized_name_to_position.setdefault(
+                normalize_name(self.names[position]), position)
+        for position, name in enumerate(self.names):
+            trigrams = get_trigrams(name)
+            self.trigram_counts[position] = len(trigrams)
+            for trigram in trigrams:
+                trigram_to_positions.setdefault(trigram, []).append(position)
+        self._trigram_to_slot = {
+            trigram: slot
+            for (slot, trigram) in enumerate(trigram_to_positions)}
+        self.indptr = np.zeros(len(trigram_to_positions) + 1, dtype=np.int64)
+        np.cumsum(
+            [len(p) for p in trigram_to_positions.values()],
+            out=self.indptr[1:])
+        self.positions = np.fromiter(
+            (p for ps in trigram_to_positions.values() for p in ps),
+            dtype=np.int32, count=int(self.indptr[-1]))
+        # Frozen set of query trigrams to shared trigram counts, least
+        # recently used first. See _get_shared_counts.
+        self._cached_counts = collections.OrderedDict()
+        self._cached_candidates = 0
+        self._cache_lock = threading.Lock()
+
+    def get_exact_match(self, query):
+        """Finds the work whose normalized name equals the query's.
+
+        Args:
+            query: String, search query.
+
+        Returns:
+            Tuple of integer work id and string name, or None. The lowest
+            work id wins among works with the same normalized name.
+        """
+        position = self.normalized_name_to_position.get(
+            normalize_name(query))
+        if position is None:
+            return None
+        return int(self.work_ids[position]), self.names[position]
+
+    def search(self, query, limit, min_similarity):
+        """Finds the names most similar to a query.
+
+        Args:
+            query: String, search query.
+            limit: Integer max results.
+            min_similarity: Float minimum trigram similarity of a result.
+                Must be above 0, since only names sharing a trigram with
+                the query are considered.
+
+        Returns:
+            List of (integer work id, string name, float similarity)
+            tuples, most similar first. Ties are ordered by work id.
+        """
+        query_trigrams = frozenset(get_trigrams(query))
+        hit_positions, shared = self._get_shared_counts(query, query_trigrams)
+        if not len(hit_positions):
+            return []
+        # pg_trgm computes similarity in single precision, then the
+        # threshold comparison promotes it to double.
+        union = (
+            len(query_trigrams) + self.trigram_counts[hit_positions] - shared)
+        similarities = shared.astype(np.float32) / union.astype(np.float32)
+        is_match = similarities.astype(np.float64) >= min_similarity
+        hit_positions = hit_positions[is_match]
+        similarities = similarities[is_match]
+        order = np.lexsort(
+            (self.work_ids[hit_positions], -similarities))[:limit]
+        return [
+            (int(self.work_ids[position]), self.names[position],
+             float(similarity))
+            for (position, similarity) in zip(
+                hit_positions[order].tolist(), similarities[order].tolist())]
+
+    def _get_shared_counts(self, query, query_trigrams):
+        """Counts the query trigrams in each name that has any of them.
+
+        Uses the counts of a cached shorter query when there is one and
+        that reads fewer postings. Then the postings of trigrams only the
+        query has are added, and those only the shorter query has are
+        subtracted.
+
+        Args:
+            query: String, search query.
+            query_trigrams: Frozen set of the query's trigrams.
+
+        Returns:
+            Tuple of:
+                numpy int32 array of positions in work_ids, ascending.
+                numpy int32 array of the count of query trigrams in the
+                    name at each position, all above 0.
+        """
+        counts = self._get_cached_counts(query_trigrams)
+        if counts is not None:
+            return counts
+        for distance in range(1, min(MAX_PREFIX_DISTANCE, len(query)) + 1):
+            prefix_trigrams = frozenset(get_trigrams(query[:-distance]))
+            prefix_counts = self._get_cached_counts(prefix_trigrams)
+            if prefix_counts is None:
+                continue
+            added = query_trigrams - prefix_trigrams
+            removed = prefix_trigrams - query_trigrams
+            if (len(prefix_counts[0]) + self._count_postings(added) +
+                    self._count_postings(removed) <
+                    self._count_postings(query_trigrams)):
+                counts = self._update_counts(prefix_counts, added, removed)
+            break
+        if counts is None:
+            counts = self._count_shared(query_trigrams)
+        self._cache_counts(query_trigrams, counts)
+        return counts
+
+    def _get_postings(self, trigrams):
+        """Gets the postings of the indexed trigrams among some.
+
+        Args:
+            trigrams: Iterable of three character strings.
+
+        Returns:
+            List of numpy int32 arrays of positions in work_ids.
+        """
+        slots = [
+            self._trigram_to_slot[t] for t in trigrams
+            if t in self._trigram_to_slot]
+        return [
+            self.positions[self.indptr[s]:self.indptr[s + 1]] for s in slots]
+
+    def _count_postings(self, trigrams):
+        """Counts the positions in the postings of some trigrams."""
+        return sum(len(p) for p in self._get_postings(trigrams))
+
+    def _count_shared(self, trigrams):
+        """Counts shared trigrams from every trigram's postings.
+
+        See _get_shared_counts.
+        """
+        postings = self._get_postings(trigrams)
+        if not postings:
+            return (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        positions, counts = np.unique(
+            np.concatenate(postings), return_counts=True)
+        return positions, counts.astype(np.int32)
+
+    def _update_counts(self, counts, added, removed):
+        """Counts shared trigrams from another query's counts.
+
+        Args:
+            counts: Tuple of the other query's positions and counts. See
+                _get_shared_counts.
+            added: Set of trigrams that only this query has.
+            removed: Set of trigrams that only the other query has.
+
+        Returns:
+            Tuple of positions and counts. See _get_shared_counts.
+        """
+        added_postings = self._get_postings(added)
+        removed_postings = self._get_postings(removed)
+        positions, inverse = np.unique(
+            np.concatenate(
+                [counts[0]] + added_postings + removed_postings),
+            return_inverse=True)
+        deltas = np.concatenate(
+            [counts[1]] +
+            [np.ones(len(p), dtype=np.int32) for p in added_postings] +
+            [np.full(len(p), -1, dtype=np.int32) for p in removed_postings])
+        new_counts = np.bincount(
+            inverse.ravel(), weights=deltas,
+            minlength=len(positions)).astype(np.int32)
+        is_shared = new_counts > 0
+        return positions[is_shared], new_counts[is_shared]
+
+    def _get_cached_counts(self, trigrams):
+        """Gets the cached counts for a set of query trigrams, or None."""
+        with self._cache_lock:
+            counts = self._cached_counts.get(trigrams)
+            if counts is not None:
+                self._cached_counts.move_to_end(trigrams)
+            return counts
+
+    def _cache_counts(self, trigrams, counts):
+        """Caches the counts for a set of query trigrams.
+
+        Evicts the least recently used counts past MAX_CACHED_CANDIDATES.
+        """
+        size = len(counts[0])
+        if size > MAX_CACHED_CANDIDATES:
+            return
+        with self._cache_lock:
+            if trigrams in self._cached_counts:
+                return
+            self._cached_counts[trigrams] = counts
+            self._cached_candidates += size
+            while self._cached_candidates > MAX_CACHED_CANDIDATES:
+                _, (positions, _) = self._cached_counts.popitem(last=False)
+                self._cached_candidates -= len(positions)
+
+
+@cache.lru_cache(maxsize=1)
+def get_autocomplete_index():
+    """Loads every work name into an AutocompleteIndex.
+
+    Returns:
+        AutocompleteIndex object.
+    """
+    works = list(models.Work.objects.values_list('id', 'name'))
+    return AutocompleteIndex(
+        [work_id for (work_id, _) in works], [name for (_, name) in works])
+
+
+def get_built_autocomplete_index():
+    """Gets the autocomplete index, only if it's already built.
+
+    Building the index takes far longer than a DB query, so it's never
+    done while serving a request. Warm-up builds it, and so does a
+    background thread started here when the data generation changes.
+
+    Returns:
+        AutocompleteIndex object, or None if the index isn't built for the
+        current data generation.
+    """
+    if (get_autocomplete_index.cache_info().currsize == 0 or
+            get_autocomplete_index.cache_generation() !=
+            cache.get_data_generation()):
+        _start_background_build()
+        return None
+    return get_autocomplete_index()
+
+
+def _start_background_build():
+    """Builds the index on a background thread, unless one is running.
+
+    Does nothing inside a transaction, since the thread's own connection
+    can't see its uncommitted writes.
+    """
+    global _build_thread
+    if connection.in_atomic_block:
+        return
+    with _build_lock:
+        if _build_thread is not None and _build_thread.is_alive():
+            return
+        _build_thread = threading.Thread(
+            target=_build, name='autocomplete-index', daemon=True)
+        _build_thread.start()
+
+
+def _build():
+    """Builds the index. Runs on the background thread."""
+    try:
+        get_autocomplete_index()
+    except Exception:
+        log.exception('Failed to build the autocomplete index.')
+    finally:
+        # No request finishes on this thread to close its connection.
+        connection.close()
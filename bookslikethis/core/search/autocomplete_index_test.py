@@ -0,0 +1,197 @@
+import itertools
+from unittest import mock
+
+from django.contrib.postgres import search as pg_search
+
+from core import cache
+from core import factories
+from core import models
+from core import test
+from core.search import autocomplete_index
+from core.search import search_api
+
+
+class GetTrigramsTest(test.TestCase):
+
+    def test_happy(self):
+        self.assertEqual(
+            autocomplete_index.get_trigrams('Cat'),
+            {'  c', ' ca', 'cat', 'at '})
+
+    def test_words(self):
+        self.assertEqual(
+            autocomplete_index.get_trigrams('a-B'),
+            {'  a', ' a ', '  b', ' b '})
+
+    def test_empty(self):
+        self.assertEqual(autocomplete_index.get_trigrams(''), set())
+        self.assertEqual(autocomplete_index.get_trigrams('!?'), set())
+
+
+class NormalizeNameTest(test.TestCase):
+
+    def test_happy(self):
+        self.assertEqual(
+            autocomplete_index.normalize_name(' Les  Misérables\t'),
+            'les miserables')
+
+
+class AutocompleteIndexTest(test.TestCase):
+
+    NAMES = [
+        'Taken', 'Taken Too', 'Taken Three Times: Shame On Me',
+        'War and Peace', 'Peace', 'Dune', 'Dune Messiah', 'Children of Dune',
+        "Ender's Game", 'Le Petit Prince', 'Catch-22']
+    QUERIES = [
+        'taken', 'Taken Too', 'peace', 'dune', 'dune m', 'ender', 'prince',
+        'catch 22', '22', 'x', '', '!!']
+
+    def setUp(self):
+        for name in AutocompleteIndexTest.NAMES:
+            factories.WorkFactory.create(name=name)
+        self.index = autocomplete_index.get_autocomplete_index()
+
+    def test_matches_postgres(self):
+        for query in AutocompleteIndexTest.QUERIES:
+            for min_similarity in (0.01, 0.2, 0.5):
+                works = models.Work.objects.annotate(
+                    similarity=pg_search.TrigramSimilarity(
+                        'name', query)).filter(
+                    similarity__gte=min_similarity)
+                expected = {w.name: w.similarity for w in works}
+                results = {
+                    name: similarity for (_, name, similarity) in
+                    self.index.search(
+                        query, len(AutocompleteIndexTest.NAMES),
+                        min_similarity)}
+                self.assertEqual(
+                    set(results), set(expected), (query, min_similarity))
+                # Postgres sends float4 values rounded to 6 or so digits.
+                for name, similarity in results.items():
+                    self.assertAlmostEqual(
+                        similarity, expected[name], places=6,
+                        msg=(query, min_similarity, name))
+
+    def test_order_and_limit(self):
+        results = self.index.search('dune', 2, 0.2)
+        self.assertEqual(
+            [name for (_, name, _) in results], ['Dune', 'Dune Messiah'])
+        self.assertGreater(results[0][2], results[1][2])
+
+    def test_exact_match(self):
+        work = models.Work.objects.get(name='Le Petit Prince')
+        self.assertEqual(
+            self.index.get_exact_match('  le  PETIT prínce'),
+            (work.id, work.name))
+        self.assertIsNone(self.index.get_exact_match('le petit'))
+
+    def test_exact_match_duplicate_names(self):
+        work = models.Work.objects.get(name='Dune')
+        factories.WorkFactory.create(name='DUNE')
+        index = autocomplete_index.get_autocomplete_index()
+        self.assertEqual(index.get_exact_match('dune'), (work.id, 'Dune'))
+
+
+class AutocompletePrefixTest(test.TestCase):
+
+    def setUp(self):
+        names = [
+            ' '.join(words) for words in itertools.product(
+                ['Dune', 'Dun', 'Duke', 'Messiah', 'War'],
+                ['', 'Messiah', 'of Dune', 'and Peace'])]
+        self.work_ids = list(range(100, 100 + len(names)))
+        self.names = names
+        self.index = autocomplete_index.AutocompleteIndex(
+            self.work_ids, self.names)
+
+    def test_typed_queries(self):
+        with mock.patch.object(
+                self.index, '_count_shared',
+                wraps=self.index._count_shared) as count_shared_mock:
+            for end in range(1, len('dune messiah') + 1):
+                query = 'dune messiah'[:end]
+                if query == 'dun':
+                    # Shorter queries read as many postings either way.
+                    count_shared_mock.reset_mock()
+                self.assertEqual(
+                    self.index.search(query, 10, 0.1),
+                    autocomplete_index.AutocompleteIndex(
+                        self.work_ids, self.names).search(query, 10, 0.1),
+                    query)
+            count_shared_mock.assert_not_called()
+
+    def test_max_cached_candidates(self):
+        with mock.patch.object(
+                autocomplete_index, 'MAX_CACHED_CANDIDATES',
+                len(self.names)):
+            self.index.search('dune', 10, 0.1)
+            self.index.search('war', 10, 0.1)
+            self.index.search('duke', 10, 0.1)
+        self.assertEqual(
+            list(self.index._cached_counts),
+            [frozenset(autocomplete_index.get_trigrams('war')),
+             frozenset(autocomplete_index.get_trigrams('duke'))])
+
+
+class GetBuiltAutocompleteIndexTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def setUp(self):
+        autocomplete_index.get_autocomplete_index.cache_clear()
+        patcher = mock.patch.object(
+            autocomplete_index, '_start_background_build')
+        self.start_build_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_not_built(self):
+        self.assertIsNone(autocomplete_index.get_built_autocomplete_index())
+        factories.WorkFactory.create(name='war')
+        # Suggestions fall back to the DB while the index builds.
+        self.assertEqual(
+            search_api.get_autocomplete_suggestions('war'), [{'name': 'war'}])
+        self.assertIsNone(autocomplete_index.get_built_autocomplete_index())
+        self.start_build_mock.assert_called_with()
+
+    def test_built(self):
+        factories.WorkFactory.create(name='war')
+        index = autocomplete_index.get_autocomplete_index()
+        self.assertIs(autocomplete_index.get_built_autocomplete_index(), index)
+        self.assertEqual(
+            search_api.get_autocomplete_suggestions('war'), [{'name': 'war'}])
+        self.start_build_mock.assert_not_called()
+
+    def test_stale(self):
+        autocomplete_index.get_autocomplete_index()
+        cache.bump_data_generation()
+        self.assertIsNone(autocomplete_index.get_built_autocomplete_index())
+        self.start_build_mock.assert_called_once_with()
+
+
+class StartBackgroundBuildTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def setUp(self):
+        autocomplete_index.get_autocomplete_index.cache_clear()
+        self.addCleanup(setattr, autocomplete_index, '_build_thread', None)
+
+    def test_happy(self):
+        factories.WorkFactory.create(name='war')
+        # Runs the build on this thread, which can see the test's data.
+        with mock.patch.object(
+                autocomplete_index.threading, 'Thread') as thread_mock, \
+                mock.patch.object(
+                    autocomplete_index, 'connection',
+                    mock.Mock(in_atomic_block=False)):
+            thread_mock.return_value.start.side_effect = (
+                lambda: thread_mock.call_args[1]['target']())
+            autocomplete_index._start_background_build()
+        index = autocomplete_index.get_built_autocomplete_index()
+        self.assertEqual(index.names, ['war'])
+
+    def test_in_transaction(self):
+        with mock.patch.object(
+                autocomplete_index.threading, 'Thread') as thread_mock:
+            autocomplete_index._start_background_build()
+        thread_mock.assert_not_called()
@@ -0,0 +1,150 @@
+"""In-memory inverted index of tropes to the works they appear in."""
+import numpy as np
+
+from core import cache
+from core.search import work_trope_matrix
+
+
+class TropeInvertedIndex(object):
+    """A read-only map of trope id to the sorted ids of works with the trope.
+
+    Attributes:
+        trope_ids: numpy int64 array of trope ids with at least one work,
+            sorted ascending.
+        indptr: numpy int64 array, length len(trope_ids) + 1. The postings
+            of trope_ids[i] are work_ids[indptr[i]:indptr[i + 1]].
+        work_ids: numpy int64 array of concatenated postings. Each posting
+            list is sorted ascending, without duplicates.
+    """
+
+    def __init__(self, edge_work_ids, edge_trope_ids):
+        """Builds the index from an edge list.
+
+        Args:
+            edge_work_ids: numpy int array of work ids.
+            edge_trope_ids: numpy int array of trope ids, connected to the
+                work id at the same position. Duplicate edges are ignored.
+        """
+        edge_work_ids = np.asarray(edge_work_ids, dtype=np.int64)
+        self.trope_ids, positions = np.unique(
+            edge_trope_ids, return_inverse=True)
+        order = np.lexsort((edge_work_ids, positions))
+        positions, work_ids = positions[order], edge_work_ids[order]
+        # Drop duplicate edges, which are adjacent once sorted.
+        is_new = np.ones(len(work_ids), dtype=bool)
+        is_new[1:] = (
+            (positions[1:] != positions[:-1]) |
+            (work_ids[1:] != work_ids[:-1]))
+        positions, self.work_ids = positions[is_new], work_ids[is_new]
+        self.indptr = np.zeros(len(self.trope_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(positions, minlength=len(self.trope_ids)),
+            out=self.indptr[1:])
+
+    def get_postings(self, trope_id):
+        """Gets the works with a trope.
+
+        Args:
+            trope_id: Integer trope id.
+
+        Returns:
+            numpy int64 array of work ids, sorted ascending.
+        """
+        position = work_trope_matrix.lookup_positions(
+            self.trope_ids, [trope_id])[0]
+        if position < 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.work_ids[self.indptr[position]:self.indptr[position + 1]]
+
+    def get_posting_lengths(self, trope_ids):
+        """Counts the works with each trope.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+
+        Returns:
+            numpy int64 array of work counts, in the same order as
+            trope_ids. Unknown tropes have a count of 0.
+        """
+        positions = work_trope_matrix.lookup_positions(
+            self.trope_ids, trope_ids)
+        lengths = self.indptr[positions + 1] - self.indptr[positions]
+        lengths[positions < 0] = 0
+        return lengths
+
+    def gather(self, trope_ids):
+        """Gets every posting of the given tropes.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+
+        Returns:
+            Tuple of two equal length numpy int64 arrays:
+                Work ids.
+                Index into trope_ids of the trope each work id was
+                    found under.
+        """
+        positions = work_trope_matrix.lookup_positions(
+            self.trope_ids, trope_ids)
+        owners = np.flatnonzero(positions >= 0)
+        positions = positions[owners]
+        starts = self.indptr[positions]
+        lengths = self.indptr[positions + 1] - starts
+        return (
+            self.work_ids[work_trope_matrix.concatenate_ranges(
+                starts, lengths)],
+            np.repeat(owners, lengths))
+
+    def union(self, trope_ids):
+        """Finds works with any of the given tropes.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+
+        Returns:
+            numpy int64 array of work ids, sorted ascending.
+        """
+        return np.unique(self.gather(trope_ids)[0])
+
+    def intersection(self, trope_ids):
+        """Finds works with all of the given tropes.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+
+        Returns:
+            numpy int64 array of work ids, sorted ascending. Empty if
+            trope_ids is empty.
+        """
+        trope_ids = list(trope_ids)
+        if not trope_ids:
+            return np.zeros(0, dtype=np.int64)
+        # Start with the shortest postings to keep intermediates small.
+        lengths = self.get_posting_lengths(trope_ids)
+        work_ids = None
+        for i in np.argsort(lengths, kind='stable').tolist():
+            postings = self.get_postings(trope_ids[i])
+            if work_ids is None:
+                work_ids = postings
+            else:
+                work_ids = np.intersect1d(
+                    work_ids, postings, assume_unique=True)
+            if not len(work_ids):
+                break
+        return work_ids
+
+
+@cache.lru_cache(maxsize=1)
+def get_trope_inverted_index():
+    """Builds a TropeInvertedIndex of every trope-work connection.
+
+    This transposes the cached work x trope matrix rather than querying
+    the DB again.
+
+    Returns:
+        TropeInvertedIndex object.
+    """
+    matrix = work_trope_matrix.get_work_trope_matrix()
+    return TropeInvertedIndex(
+        matrix.work_ids[matrix.entry_rows],
+        matrix.trope_ids[matrix.indices])
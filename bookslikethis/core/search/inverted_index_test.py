@@ -0,0 +1,62 @@
+from core import factories
+from core import test
+from core.search import inverted_index
+
+
+class TropeInvertedIndexTest(test.TestCase):
+
+    def setUp(self):
+        self.index = inverted_index.TropeInvertedIndex(
+            [30, 10, 10, 20, 10, 30], [7, 5, 9, 7, 5, 9])
+
+    def test_postings(self):
+        self.assertEqual(self.index.trope_ids.tolist(), [5, 7, 9])
+        # Duplicate edges are dropped.
+        self.assertEqual(self.index.get_postings(5).tolist(), [10])
+        self.assertEqual(self.index.get_postings(7).tolist(), [20, 30])
+        self.assertEqual(self.index.get_postings(9).tolist(), [10, 30])
+        self.assertEqual(self.index.get_postings(1).tolist(), [])
+
+    def test_posting_lengths(self):
+        self.assertEqual(
+            self.index.get_posting_lengths([9, 1, 5, 7]).tolist(),
+            [2, 0, 1, 2])
+        self.assertEqual(self.index.get_posting_lengths([]).tolist(), [])
+
+    def test_gather(self):
+        work_ids, owners = self.index.gather([9, 1, 7])
+        self.assertEqual(work_ids.tolist(), [10, 30, 20, 30])
+        self.assertEqual(owners.tolist(), [0, 0, 2, 2])
+
+    def test_union(self):
+        self.assertEqual(self.index.union([5, 7]).tolist(), [10, 20, 30])
+        self.assertEqual(self.index.union([9, 1]).tolist(), [10, 30])
+        self.assertEqual(self.index.union([]).tolist(), [])
+
+    def test_intersection(self):
+        self.assertEqual(self.index.intersection([7, 9]).tolist(), [30])
+        self.assertEqual(self.index.intersection([5, 9]).tolist(), [10])
+        self.assertEqual(self.index.intersection([5, 7]).tolist(), [])
+        self.assertEqual(self.index.intersection([5, 1]).tolist(), [])
+        self.assertEqual(self.index.intersection([]).tolist(), [])
+
+    def test_empty(self):
+        index = inverted_index.TropeInvertedIndex([], [])
+        self.assertEqual(index.get_postings(1).tolist(), [])
+        self.assertEqual(index.get_posting_lengths([1]).tolist(), [0])
+        self.assertEqual(index.union([1]).tolist(), [])
+
+
+class GetTropeInvertedIndexTest(test.TestCase):
+
+    def test_happy(self):
+        trope = factories.TropeFactory.create()
+        trope_two = factories.TropeFactory.create()
+        orphan_trope = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+        work_two = factories.WorkFactory.create(tropes=[trope_two])
+        index = inverted_index.get_trope_inverted_index()
+        self.assertEqual(index.get_postings(trope.id).tolist(), [work.id])
+        self.assertEqual(
+            index.get_postings(trope_two.id).tolist(), [work.id, work_two.id])
+        self.assertEqual(index.get_postings(orphan_trope.id).tolist(), [])
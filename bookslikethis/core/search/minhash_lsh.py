@@ -0,0 +1,146 @@
+"""MinHash signatures with LSH banding, for approximate candidate search.
+
+Each work's trope set is summarized by a MinHash signature: for each of
+MINHASH_NUM_PERMUTATIONS random hash functions, the lowest hash of any of
+its tropes. Two works agree at any one signature position with probability
+equal to the Jaccard similarity of their trope sets. Signatures are split
+into bands, and works whose signatures are identical across any band
+share a bucket. Works similar to a query work are likely to share at least
+one bucket with it, so bucket members make a small candidate set for exact
+scoring.
+
+The number of bands is the recall/latency knob. With b bands of r rows
+each, works with trope set similarity s share a bucket with probability
+1 - (1 - s^r)^b. More bands (so fewer rows per band) raise recall, at the
+cost of more candidates to score.
+"""
+import numpy as np
+
+from core import cache
+from core.search import work_trope_matrix
+
+# Length of each work's signature. Must be divisible by the number of bands.
+MINHASH_NUM_PERMUTATIONS = 64
+
+# Default number of LSH bands. See the module docstring.
+LSH_BANDS = 32
+
+# Seed for the random hash functions, so signatures are reproducible.
+MINHASH_SEED = 0
+
+# Hash functions are of the form (a * x + b) mod MINHASH_PRIME.
+MINHASH_PRIME = (1 << 31) - 1
+
+
+class MinHashLSHIndex(object):
+    """A read-only LSH index of the rows of a WorkTropeMatrix.
+
+    Attributes:
+        signatures: numpy uint32 array, shape (rows, num_permutations).
+            The MinHash signature of each matrix row.
+        num_bands: Integer number of bands.
+        band_keys: numpy uint64 array, shape (num_bands, rows). The bucket
+            key of each row in each band.
+        sorted_band_keys: numpy uint64 array, band_keys with each band
+            sorted ascending.
+        sorted_band_rows: numpy int64 array, the row of each entry in
+            sorted_band_keys.
+    """
+
+    def __init__(self, matrix, num_bands=LSH_BANDS,
+                 num_permutations=MINHASH_NUM_PERMUTATIONS):
+        """Builds the index.
+
+        Args:
+            matrix: WorkTropeMatrix object.
+            num_bands: Integer number of bands.
+            num_permutations: Integer signature length, divisible by
+                num_bands.
+
+        Raises:
+            ValueError if num_permutations isn't divisible by num_bands.
+        """
+        if num_bands < 1 or num_permutations % num_bands:
+            raise ValueError(
+                'Cannot split %d permutations into %d bands.' % (
+                    num_permutations, num_bands))
+        self.num_bands = num_bands
+        self.signatures = _calc_signatures(matrix, num_permutations)
+
+        rows_per_band = num_permutations // num_bands
+        num_rows = len(self.signatures)
+        self.band_keys = np.zeros((num_bands, num_rows), dtype=np.uint64)
+        for band in range(num_bands):
+            band_signatures = self.signatures[
+                :, band * rows_per_band:(band + 1) * rows_per_band]
+            # Combine the band's values into one key. Overflow just
+            # wraps, and any resulting collisions only add candidates.
+            for column in range(rows_per_band):
+                self.band_keys[band] *= np.uint64(1000003)
+                self.band_keys[band] ^= band_signatures[:, column].astype(
+                    np.uint64)
+        self.sorted_band_rows = np.argsort(
+            self.band_keys, axis=1, kind='stable')
+        self.sorted_band_keys = np.take_along_axis(
+            self.band_keys, self.sorted_band_rows, axis=1)
+
+    def query(self, rows):
+        """Finds rows sharing a bucket with any of the given rows.
+
+        Args:
+            rows: numpy int array of matrix row indexes.
+
+        Returns:
+            numpy int64 array of row indexes, sorted ascending. Includes
+            the given rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        candidates = [rows]
+        for band in range(self.num_bands):
+            keys = self.band_keys[band, rows]
+            starts = np.searchsorted(
+                self.sorted_band_keys[band], keys, side='left')
+            ends = np.searchsorted(
+                self.sorted_band_keys[band], keys, side='right')
+            candidates.append(self.sorted_band_rows[band][
+                work_trope_matrix.concatenate_ranges(starts, ends - starts)])
+        return np.unique(np.concatenate(candidates))
+
+
+def _calc_signatures(matrix, num_permutations):
+    """Calculates the MinHash signature of every matrix row.
+
+    Args:
+        matrix: WorkTropeMatrix object. Every row must have an entry.
+        num_permutations: Integer signature length.
+
+    Returns:
+        numpy uint32 array, shape (rows, num_permutations).
+    """
+    random_state = np.random.RandomState(MINHASH_SEED)
+    a = random_state.randint(1, MINHASH_PRIME, size=num_permutations)
+    b = random_state.randint(0, MINHASH_PRIME, size=num_permutations)
+    num_rows = matrix.shape[0]
+    signatures = np.zeros((num_rows, num_permutations), dtype=np.uint32)
+    if not num_rows:
+        return signatures
+    columns = matrix.indices.astype(np.int64)
+    for i in range(num_permutations):
+        hashes = (a[i] * columns + b[i]) % MINHASH_PRIME
+        signatures[:, i] = np.minimum.reduceat(hashes, matrix.indptr[:-1])
+    return signatures
+
+
+@cache.lru_cache(maxsize=4)
+def get_minhash_lsh_index(num_bands=LSH_BANDS):
+    """Builds a MinHashLSHIndex over every work with tropes.
+
+    Args:
+        num_bands: Integer number of bands.
+
+    Returns:
+        MinHashLSHIndex object, for the rows of the cached work x trope
+        matrix.
+    """
+    return MinHashLSHIndex(
+        work_trope_matrix.get_work_trope_matrix(), num_bands=num_bands)
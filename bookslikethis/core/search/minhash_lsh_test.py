@@ -0,0 +1,60 @@
+import numpy as np
+
+from core import factories
+from core import test
+from core.search import minhash_lsh
+from core.search import work_trope_matrix
+
+
+class MinHashLSHIndexTest(test.TestCase):
+
+    def setUp(self):
+        # Works 1 and 2 have the same tropes, work 3 overlaps heavily with
+        # them and work 4 shares nothing.
+        edges = (
+            [(1, t) for t in range(20)] +
+            [(2, t) for t in range(20)] +
+            [(3, t) for t in range(19)] + [(3, 99)] +
+            [(4, t) for t in range(100, 110)])
+        work_ids, trope_ids = zip(*edges)
+        self.matrix = work_trope_matrix.WorkTropeMatrix(work_ids, trope_ids)
+
+    def test_signatures(self):
+        index = minhash_lsh.MinHashLSHIndex(self.matrix)
+        self.assertEqual(
+            index.signatures.shape,
+            (4, minhash_lsh.MINHASH_NUM_PERMUTATIONS))
+        np.testing.assert_array_equal(
+            index.signatures[0], index.signatures[1])
+        # Disjoint trope sets have no signature values in common.
+        self.assertFalse(np.any(index.signatures[0] == index.signatures[3]))
+
+    def test_query(self):
+        index = minhash_lsh.MinHashLSHIndex(self.matrix)
+        self.assertEqual(index.query(np.array([0])).tolist(), [0, 1, 2])
+        self.assertEqual(index.query(np.array([3])).tolist(), [3])
+        self.assertEqual(
+            index.query(np.array([0, 3])).tolist(), [0, 1, 2, 3])
+        self.assertEqual(index.query(np.array([], dtype=int)).tolist(), [])
+
+    def test_bands(self):
+        # A single band only matches identical signatures.
+        index = minhash_lsh.MinHashLSHIndex(self.matrix, num_bands=1)
+        self.assertEqual(index.query(np.array([0])).tolist(), [0, 1])
+        with self.assertRaises(ValueError):
+            minhash_lsh.MinHashLSHIndex(self.matrix, num_bands=3)
+
+    def test_empty(self):
+        index = minhash_lsh.MinHashLSHIndex(
+            work_trope_matrix.WorkTropeMatrix([], []))
+        self.assertEqual(index.query(np.array([], dtype=int)).tolist(), [])
+
+
+class GetMinHashLSHIndexTest(test.TestCase):
+
+    def test_happy(self):
+        trope = factories.TropeFactory.create()
+        factories.WorkFactory.create(tropes=[trope])
+        factories.WorkFactory.create(tropes=[trope])
+        index = minhash_lsh.get_minhash_lsh_index()
+        self.assertEqual(index.query(np.array([0])).tolist(), [0, 1])
@@ -1,6 +1,9 @@
-from django.contrib.postgres import search as pg_search
+from django.db import connection
 
+from core.search import autocomplete_cache
+from core.search import autocomplete_index
 from core.search import work_similarity
+from core import cache
 from core import data_api
 from core import models
 
@@ -11,16 +14,31 @@ TROPE_TAG_WEIGHTS = {
     'characterization': 3,
     'character_as_device': 1, 'politics': 1}
 MAX_SEARCH_RESULTS = 10
+# Results stored per work by the build_similar_works command.
+# Should be at least MAX_SEARCH_RESULTS.
+MAX_PRECOMPUTED_RESULTS = 50
 MAX_AUTOCOMPLETE_RESULTS = 8
 
 # Min trigram similarity value for an autocomplete match.
 # 0-1, with 1 being identical.
 MIN_AUTOCOMPLETE_SIMILARITY = 0.2
 
+# Max similar works ranked per search, for paging through results.
+MAX_RANKED_RESULTS = 200
+
+# Version of get_similar_books results in the shared result cache.
+# Bump this when ranking changes, so stale results are ignored.
+SIMILAR_BOOKS_CACHE_VERSION = 1
+
 
 def get_similar_books(work_ids):
     """Finds books that are similar to a given set.
 
+    Results are cached in the shared result cache, keyed by the set of
+    work ids and the trope configuration. Single work searches are
+    answered from precomputed results when available. Otherwise results
+    are computed live.
+
     Args:
         work_ids: List of integer work ids.
 
@@ -28,16 +46,158 @@ def get_similar_books(work_ids):
         Tuple of:
             List of work ids, most similar first. May be empty.
             Dict of trope id to distinctiveness rating. Has entries for
-                every trope, obeying tag_names, in the work set.
+                every trope, obeying tag_names, in the work set. Precomputed
+                results only have entries for tropes shared with a result.
+    """
+    work_ids = tuple(sorted(set(work_ids)))
+    return cache.get_or_compute_result(
+        'similar_books',
+        (work_ids, tuple(sorted(TROPE_TAG_WEIGHTS.items()))),
+        lambda: _get_similar_books(work_ids),
+        version=SIMILAR_BOOKS_CACHE_VERSION)
+
+
+def get_similar_books_page(work_ids, offset=0, limit=MAX_SEARCH_RESULTS):
+    """Finds a page of books that are similar to a given set.
+
+    Pages within the first MAX_SEARCH_RESULTS results are sliced from a
+    shallow ranking, which is all most searches need. Later pages are
+    sliced from a ranking up to MAX_RANKED_RESULTS works deep. Both are
+    kept in the shared result cache, so later pages of the same search
+    aren't new searches. This is why paging needs only an offset: no page
+    ranks more than MAX_RANKED_RESULTS works, and that happens once.
+
+    Args:
+        work_ids: List of integer work ids.
+        offset: Optional, integer count of top results to skip.
+        limit: Optional, integer max number of results to return.
+
+    Returns:
+        Tuple of:
+            List of work ids, most similar first. May be empty.
+            Dict of trope id to distinctiveness rating. See
+                get_similar_books.
+            Integer offset of the next page, or None if there are no more
+                results.
+    """
+    work_ids = tuple(sorted(set(work_ids)))
+    end = min(offset + limit, MAX_RANKED_RESULTS)
+    if end <= MAX_SEARCH_RESULTS:
+        depth = MAX_SEARCH_RESULTS
+    else:
+        depth = MAX_RANKED_RESULTS
+    ranked_work_ids, trope_id_to_weight = cache.get_or_compute_result(
+        'ranked_similar_books',
+        (work_ids, tuple(sorted(TROPE_TAG_WEIGHTS.items())), depth),
+        # One extra result tells whether there's a page after the last one
+        # in this ranking.
+        lambda: _get_similar_books(work_ids, limit=depth + 1),
+        version=SIMILAR_BOOKS_CACHE_VERSION)
+    next_offset = end
+    if next_offset >= min(len(ranked_work_ids), MAX_RANKED_RESULTS):
+        next_offset = None
+    return (
+        ranked_work_ids[offset:end], trope_id_to_weight, next_offset)
+
+
+def get_similar_books_batch(work_id_sets):
+    """Finds books that are similar to each of many independent sets.
+
+    Gives the same results as calling get_similar_books for each set, but
+    shares the work between them: the shared result cache is read and
+    written once for the whole batch, stored results for single work sets
+    are fetched in one query, and repeated sets are only searched once.
+
+    Args:
+        work_id_sets: List of lists of integer work ids.
+
+    Returns:
+        List of tuples, as returned by get_similar_books, in the same
+        order as work_id_sets. Empty sets get empty results.
+    """
+    work_id_sets = [tuple(sorted(set(work_ids))) for work_ids in work_id_sets]
+    unique_work_id_sets = list(dict.fromkeys(work_id_sets))
+    tag_weights_key = tuple(sorted(TROPE_TAG_WEIGHTS.items()))
+    results = cache.get_or_compute_results(
+        'similar_books',
+        [(work_ids, tag_weights_key) for work_ids in unique_work_id_sets],
+        lambda key_parts_list: _get_similar_books_batch(
+            [work_ids for (work_ids, _) in key_parts_list]),
+        version=SIMILAR_BOOKS_CACHE_VERSION)
+    work_ids_to_result = dict(zip(unique_work_id_sets, results))
+    return [work_ids_to_result[work_ids] for work_ids in work_id_sets]
+
+
+def _get_similar_books(work_ids, limit=MAX_SEARCH_RESULTS):
+    """Finds books that are similar to a given set, without caching.
+
+    See get_similar_books. Single work searches deeper than the stored
+    results are computed live.
+    """
+    if len(work_ids) == 1 and limit <= MAX_PRECOMPUTED_RESULTS:
+        precomputed = data_api.get_precomputed_similar_works(
+            work_ids[0], limit=limit)
+        if precomputed is not None:
+            return precomputed
+    return _find_similar_books(work_ids, limit=limit)
+
+
+def _get_similar_books_batch(work_id_sets):
+    """Finds books that are similar to each set, without caching.
+
+    See get_similar_books_batch.
+    """
+    work_id_to_precomputed = data_api.get_precomputed_similar_works_by_work_id(
+        [work_ids[0] for work_ids in work_id_sets if len(work_ids) == 1],
+        limit=MAX_SEARCH_RESULTS)
+    results = []
+    for work_ids in work_id_sets:
+        if not work_ids:
+            results.append(([], {}))
+        elif len(work_ids) == 1 and work_ids[0] in work_id_to_precomputed:
+            results.append(work_id_to_precomputed[work_ids[0]])
+        else:
+            results.append(_find_similar_books(work_ids))
+    return results
+
+
+def _find_similar_books(work_ids, limit=MAX_SEARCH_RESULTS):
+    """Computes books that are similar to a given set, live.
+
+    See get_similar_books.
     """
     similar_work_ids = work_similarity.find_similar_works(
-        work_ids,
-        limit=MAX_SEARCH_RESULTS,
+        list(work_ids),
+        limit=limit,
         tag_names=tuple(TROPE_TAG_WEIGHTS.keys()),
         tag_weights=TROPE_TAG_WEIGHTS)
     return similar_work_ids
 
 
+def calc_similar_books_with_scores(
+        work_id, limit=MAX_PRECOMPUTED_RESULTS):
+    """Computes similar books for a single work, for precomputation.
+
+    Uses the same configuration as get_similar_books.
+
+    Args:
+        work_id: Integer work id.
+        limit: Optional, integer max number of results to return.
+
+    Returns:
+        Tuple of:
+            List of work ids, most similar first. May be empty.
+            List of float similarity scores, one per work id.
+            Dict of trope id to distinctiveness rating. Has entries for
+                every trope, obeying tag_names, in the work.
+    """
+    return work_similarity.find_similar_works_with_scores(
+        [work_id],
+        limit=limit,
+        tag_names=tuple(TROPE_TAG_WEIGHTS.keys()),
+        tag_weights=TROPE_TAG_WEIGHTS)
+
+
 def get_autocomplete_suggestions(
         query,
         limit=MAX_AUTOCOMPLETE_RESULTS,
@@ -56,25 +216,224 @@ def get_autocomplete_suggestions(
         Dicts have the following keys:
             name
     """
-    matching_works = models.Work.objects.annotate(
-        similarity=pg_search.TrigramSimilarity('name', query)).filter(
-        similarity__gte=min_similarity).order_by(
-        '-similarity')[:limit]
-    return [{'name': w.name} for w in matching_works]
+    # Answer from memory when the index is warm. It can't find names
+    # sharing no trigrams with the query, so a 0 threshold needs the DB.
+    index = autocomplete_index.get_built_autocomplete_index()
+    if index is not None and min_similarity > 0:
+        def fetch_names(query, limit, min_similarity):
+            return [
+                name
+                for (_, name, _) in index.search(
+                    query, limit, min_similarity)]
+
+        source = 'index'
+    else:
+        fetch_names = query_autocomplete_names
+        source = 'db'
+    return [
+        {'name': name}
+        for name in autocomplete_cache.get_names(
+            query, limit, min_similarity, fetch_names, source)]
+
+
+def query_autocomplete_names(query, limit, min_similarity):
+    """Finds the work names most similar to a query in the DB.
+
+    This is written so the GiST trigram index on Work.name can serve it as
+    a KNN scan: candidates come from pg_trgm's % operator, with the
+    threshold set for the session, in order of <-> distance. Rows are
+    rechecked against min_similarity, so results are exactly those with
+    similarity of at least min_similarity, most similar first, then by
+    work id.
+
+    Args:
+        query: String, search query.
+        limit: Integer max names.
+        min_similarity: Float minimum trigram similarity of a name.
+
+    Returns:
+        List of string work names, most similar first.
+    """
+    sql = '''
+        SELECT name FROM {table}
+        WHERE {similar_filter}similarity(name, %s) >= %s
+        ORDER BY name <-> %s, id
+        LIMIT %s
+    '''.format(
+        table=models.Work._meta.db_table,
+        similar_filter=_get_similar_filter('%s', min_similarity))
+    params = [query] if min_similarity > 0 else []
+    with connection.cursor() as cursor:
+        _set_similarity_threshold(cursor, min_similarity)
+        cursor.execute(sql, params + [query, min_similarity, query, limit])
+        return [name for (name, ) in cursor.fetchall()]
+
+
+def _set_similarity_threshold(cursor, min_similarity):
+    """Sets the threshold of pg_trgm's % operator for the DB session."""
+    sql, params = _get_similarity_threshold_sql(min_similarity)
+    if sql:
+        cursor.execute(sql, params)
+
+
+def _get_similarity_threshold_sql(min_similarity):
+    """Builds an SQL statement setting pg_trgm's % operator threshold.
+
+    Args:
+        min_similarity: Float minimum trigram similarity of a name.
+
+    Returns:
+        Tuple of string SQL statement, with a trailing semicolon, and list
+        of params. Both are empty if the threshold isn't used.
+    """
+    if min_similarity > 0:
+        return (
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, false);",
+            [str(min_similarity)])
+    return '', []
+
+
+def _get_similar_filter(query_sql, min_similarity):
+    """Builds an index-assisted SQL filter of names similar to a query.
+
+    Args:
+        query_sql: String SQL expression of the query.
+        min_similarity: Float minimum trigram similarity of a name.
+
+    Returns:
+        String SQL condition, with a trailing AND, or an empty string.
+        Names sharing no trigrams with the query match a 0 threshold, and
+        pg_trgm's % operator never finds those.
+    """
+    if min_similarity > 0:
+        return 'name %%%% %s AND ' % query_sql
+    return ''
+
+
+def resolve_search_queries(
+        queries, min_similarity=MIN_AUTOCOMPLETE_SIMILARITY):
+    """Resolves work name search queries to single works.
+
+    An exact match of the normalized name wins: lowercased, without
+    accents and with whitespace collapsed. Otherwise the most similar name
+    wins, as in get_autocomplete_suggestions. The in-memory autocomplete
+    index answers when it's built. Other queries are resolved in one DB
+    query. Among works with the same name, the lowest work id wins.
+
+    Args:
+        queries: List of string search queries.
+        min_similarity: Optional, float minimum trigram similarity of a
+            match.
+
+    Returns:
+        List of (integer work id, string name) tuples, or None where
+        nothing matched, in the same order as queries.
+    """
+    matches, _ = _resolve_names(queries, [], min_similarity)
+    return matches
+
+
+def resolve_work_ids(work_names, queries):
+    """Resolves exact work names and search queries to work ids.
+
+    Takes at most one DB query for both.
+
+    Args:
+        work_names: List of exact string work names. Every work with one
+            of these names matches.
+        queries: List of string search queries. See
+            resolve_search_queries.
+
+    Returns:
+        Set of integer work ids.
+    """
+    matches, work_ids = _resolve_names(
+        queries, work_names, MIN_AUTOCOMPLETE_SIMILARITY)
+    work_ids.update(match[0] for match in matches if match is not None)
+    return work_ids
+
+
+def _resolve_names(queries, work_names, min_similarity):
+    """Resolves search queries and exact work names together.
+
+    Args:
+        queries: List of string search queries. See
+            resolve_search_queries.
+        work_names: List of exact string work names.
+        min_similarity: Float minimum trigram similarity of a query match.
+
+    Returns:
+        Tuple of:
+            List of query matches. See resolve_search_queries.
+            Set of integer ids of works with one of the work names.
+    """
+    index = autocomplete_index.get_built_autocomplete_index()
+    query_to_match = {}
+    if index is not None and min_similarity > 0:
+        for query in queries:
+            match = index.get_exact_match(query)
+            if match is None:
+                match = next(iter(
+                    (work_id, name) for (work_id, name, _) in
+                    index.search(query, 1, min_similarity)), None)
+            query_to_match[query] = match
+    unresolved = [q for q in dict.fromkeys(queries) if q not in query_to_match]
+    work_names = list(dict.fromkeys(work_names))
+    work_ids = set()
+    if not unresolved and not work_names:
+        return [query_to_match.get(query) for query in queries], work_ids
+    table = models.Work._meta.db_table
+    # Setting the threshold in the same round trip as the lookup.
+    setup_sql, params = '', []
+    selects = []
+    if unresolved:
+        setup_sql, params = _get_similarity_threshold_sql(min_similarity)
+        # The exact match branch runs first, and the similar one only if it
+        # found nothing.
+        selects.append('''
+            SELECT q.query, best.id, best.name
+            FROM unnest(%s::text[]) AS q(query)
+            CROSS JOIN LATERAL (
+                (SELECT id, name FROM {table}
+                 WHERE core_normalize_name(name) =
+                     core_normalize_name(q.query)
+                 ORDER BY id
+                 LIMIT 1)
+                UNION ALL
+                (SELECT id, name FROM {table}
+                 WHERE {similar_filter}similarity(name, q.query) >= %s
+                 ORDER BY name <-> q.query, id
+                 LIMIT 1)
+                LIMIT 1) AS best
+        '''.format(
+            table=table,
+            similar_filter=_get_similar_filter('q.query', min_similarity)))
+        params = params + [unresolved, min_similarity]
+    if work_names:
+        selects.append(
+            'SELECT NULL, id, name FROM {table} WHERE name = ANY(%s)'.format(
+                table=table))
+        params = params + [work_names]
+    with connection.cursor() as cursor:
+        cursor.execute(setup_sql + ' UNION ALL '.join(selects), params)
+        for query, work_id, name in cursor.fetchall():
+            if query is None:
+                work_ids.add(work_id)
+            else:
+                query_to_match[query] = (work_id, name)
+    return [query_to_match.get(query) for query in queries], work_ids
 
 
 def get_work_id_for_search_query(query):
     """Attempts to convert a work name search query to a work id.
 
+    See resolve_search_queries.
+
     Args:
         query: String, search query.
 
     Returns:
         Integer work id, or None.
     """
-    matches = get_autocomplete_suggestions(query, limit=1)
-    if matches:
-        work_ids = data_api.get_work_ids_by_name([matches[0]['name']])
-        if work_ids:
-            return work_ids[0]
-    return None
+    match = resolve_search_queries([query])[0]
+    return match[0] if match is not None else None
@@ -1,7 +1,11 @@
 from unittest import mock
 
+from django.db import connection
+
 from core import factories
+from core import models
 from core import test
+from core.search import autocomplete_index
 from core.search import search_api
 from core.search import work_similarity
 
@@ -19,6 +23,239 @@ class GetSimilarBooksTest(test.TestCase):
                 tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()),
                 tag_weights=search_api.TROPE_TAG_WEIGHTS)
 
+    def test_precomputed(self):
+        work = factories.WorkFactory.create()
+        work_two = factories.WorkFactory.create()
+        trope = factories.TropeFactory.create()
+        factories.SimilarWorkFactory.create(
+            work=work, similar_work=work_two, rank=0)
+        factories.SimilarWorkTropeWeightFactory.create(
+            work=work, trope=trope, weight=2.0)
+        with mock.patch.object(
+                work_similarity, 'find_similar_works') as find_similar_mock:
+            self.assertEqual(
+                search_api.get_similar_books([work.id]),
+                ([work_two.id], {trope.id: 2.0}))
+            find_similar_mock.assert_not_called()
+            # Multi-work searches are always computed live.
+            search_api.get_similar_books([work.id, work_two.id])
+            find_similar_mock.assert_called_once()
+
+    def test_precomputed_matches_live(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        trope = factories.TropeFactory.create(tags=[tag])
+        trope_two = factories.TropeFactory.create(tags=[tag])
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+        factories.WorkFactory.create(tropes=[trope])
+        factories.WorkFactory.create(tropes=[trope, trope_two])
+        similar_work_ids, scores, trope_id_to_weight = (
+            search_api.calc_similar_books_with_scores(work.id))
+        self.assertEqual(
+            (similar_work_ids, trope_id_to_weight),
+            search_api.get_similar_books([work.id]))
+        self.assertEqual(len(scores), len(similar_work_ids))
+
+
+class GetSimilarBooksCacheTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_caching(self):
+        work = factories.WorkFactory.create()
+        work_two = factories.WorkFactory.create()
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=([3], {4: 1.0})) as find_similar_mock:
+            self.assertEqual(
+                search_api.get_similar_books([work.id, work_two.id]),
+                ([3], {4: 1.0}))
+            # Work order and duplicates don't matter.
+            self.assertEqual(
+                search_api.get_similar_books(
+                    [work_two.id, work.id, work.id]),
+                ([3], {4: 1.0}))
+            find_similar_mock.assert_called_once_with(
+                [work.id, work_two.id],
+                limit=search_api.MAX_SEARCH_RESULTS,
+                tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()),
+                tag_weights=search_api.TROPE_TAG_WEIGHTS)
+
+            search_api.get_similar_books([work.id])
+            self.assertEqual(find_similar_mock.call_count, 2)
+
+    def test_tag_weights_in_key(self):
+        work = factories.WorkFactory.create()
+        work_two = factories.WorkFactory.create()
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=([3], {})) as find_similar_mock:
+            search_api.get_similar_books([work.id, work_two.id])
+            with mock.patch.dict(search_api.TROPE_TAG_WEIGHTS, {'plot': 1}):
+                search_api.get_similar_books([work.id, work_two.id])
+            self.assertEqual(find_similar_mock.call_count, 2)
+
+
+class GetSimilarBooksPageTest(test.TestCase):
+
+    def test_pages(self):
+        work = factories.WorkFactory.create()
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=([3, 4, 5], {6: 1.0})) as find_similar_mock:
+            self.assertEqual(
+                search_api.get_similar_books_page([work.id], limit=2),
+                ([3, 4], {6: 1.0}, 2))
+            self.assertEqual(
+                search_api.get_similar_books_page(
+                    [work.id], offset=2, limit=2),
+                ([5], {6: 1.0}, None))
+            self.assertEqual(
+                search_api.get_similar_books_page(
+                    [work.id], offset=3, limit=2),
+                ([], {6: 1.0}, None))
+            find_similar_mock.assert_called_with(
+                [work.id],
+                limit=search_api.MAX_SEARCH_RESULTS + 1,
+                tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()),
+                tag_weights=search_api.TROPE_TAG_WEIGHTS)
+
+    def test_deep_pages(self):
+        work = factories.WorkFactory.create()
+        max_results = search_api.MAX_SEARCH_RESULTS
+        ranked_work_ids = list(range(100, 100 + max_results + 1))
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=(ranked_work_ids, {})) as find_similar_mock:
+            self.assertEqual(
+                search_api.get_similar_books_page([work.id]),
+                (ranked_work_ids[:max_results], {}, max_results))
+            self.assertEqual(
+                find_similar_mock.call_args[1]['limit'], max_results + 1)
+            self.assertEqual(
+                search_api.get_similar_books_page(
+                    [work.id], offset=max_results),
+                (ranked_work_ids[max_results:], {}, None))
+            self.assertEqual(
+                find_similar_mock.call_args[1]['limit'],
+                search_api.MAX_RANKED_RESULTS + 1)
+
+    def test_max_ranked_results(self):
+        work = factories.WorkFactory.create()
+        with mock.patch.object(search_api, 'MAX_RANKED_RESULTS', 12):
+            with mock.patch.object(
+                    work_similarity, 'find_similar_works',
+                    return_value=(list(range(20)), {})):
+                self.assertEqual(
+                    search_api.get_similar_books_page(
+                        [work.id], offset=10, limit=5),
+                    ([10, 11], {}, None))
+
+    def test_deep_pages_past_precomputed(self):
+        work = factories.WorkFactory.create()
+        work_two = factories.WorkFactory.create()
+        factories.SimilarWorkFactory.create(
+            work=work, similar_work=work_two, rank=0)
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=([], {})) as find_similar_mock:
+            self.assertEqual(
+                search_api.get_similar_books_page([work.id]),
+                ([work_two.id], {}, None))
+            find_similar_mock.assert_not_called()
+            # Deeper than the stored results.
+            search_api.get_similar_books_page(
+                [work.id], offset=search_api.MAX_SEARCH_RESULTS)
+            find_similar_mock.assert_called_once()
+
+    def test_first_page_matches_get_similar_books(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        trope = factories.TropeFactory.create(tags=[tag])
+        trope_two = factories.TropeFactory.create(tags=[tag])
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+        factories.WorkFactory.create(tropes=[trope])
+        factories.WorkFactory.create(tropes=[trope, trope_two])
+        similar_work_ids, trope_id_to_weight, _ = (
+            search_api.get_similar_books_page([work.id]))
+        self.assertEqual(
+            (similar_work_ids, trope_id_to_weight),
+            search_api.get_similar_books([work.id]))
+
+
+class GetSimilarBooksPageCacheTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_later_pages_cached(self):
+        work = factories.WorkFactory.create()
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=([3, 4, 5], {})) as find_similar_mock:
+            search_api.get_similar_books_page([work.id], limit=2)
+            search_api.get_similar_books_page([work.id], offset=2, limit=2)
+            find_similar_mock.assert_called_once()
+
+    def test_deep_pages_ranked_once(self):
+        work = factories.WorkFactory.create()
+        max_results = search_api.MAX_SEARCH_RESULTS
+        ranked_work_ids = list(range(search_api.MAX_RANKED_RESULTS + 1))
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=(ranked_work_ids, {})) as find_similar_mock:
+            offset = max_results
+            while offset is not None:
+                page, _, offset = search_api.get_similar_books_page(
+                    [work.id], offset=offset, limit=max_results)
+                self.assertTrue(page)
+            find_similar_mock.assert_called_once_with(
+                [work.id],
+                limit=search_api.MAX_RANKED_RESULTS + 1,
+                tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()),
+                tag_weights=search_api.TROPE_TAG_WEIGHTS)
+
+
+class GetSimilarBooksBatchTest(test.TestCase):
+
+    def test_matches_single_searches(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        trope = factories.TropeFactory.create(tags=[tag])
+        trope_two = factories.TropeFactory.create(tags=[tag])
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+        work_two = factories.WorkFactory.create(tropes=[trope])
+        work_three = factories.WorkFactory.create(tropes=[trope, trope_two])
+        precomputed_work = factories.WorkFactory.create()
+        factories.SimilarWorkFactory.create(
+            work=precomputed_work, similar_work=work, rank=0)
+        work_id_sets = [
+            [work.id], [work_two.id, work_three.id], [precomputed_work.id],
+            [work.id]]
+        self.assertEqual(
+            search_api.get_similar_books_batch(work_id_sets),
+            [search_api.get_similar_books(work_ids)
+             for work_ids in work_id_sets])
+
+    def test_empty(self):
+        self.assertEqual(search_api.get_similar_books_batch([]), [])
+        self.assertEqual(
+            search_api.get_similar_books_batch([[]]), [([], {})])
+
+
+class GetSimilarBooksBatchCacheTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_shares_single_search_cache(self):
+        work = factories.WorkFactory.create()
+        work_two = factories.WorkFactory.create()
+        with mock.patch.object(
+                work_similarity, 'find_similar_works',
+                return_value=([3], {4: 1.0})) as find_similar_mock:
+            search_api.get_similar_books([work.id, work_two.id])
+            self.assertEqual(
+                search_api.get_similar_books_batch(
+                    [[work_two.id, work.id], [work.id, work_two.id]]),
+                [([3], {4: 1.0}), ([3], {4: 1.0})])
+            find_similar_mock.assert_called_once()
+
 
 class GetAutocompleteSuggestionsTest(test.TestCase):
 
@@ -87,3 +324,103 @@ class GetWorkIdForSearchQueryTest(test.TestCase):
         self.assertEqual(
             search_api.get_work_id_for_search_query(work.name + 'z'),
             work.id)
+
+    def test_no_match(self):
+        factories.WorkFactory.create(name='Book')
+        self.assertIsNone(search_api.get_work_id_for_search_query('zzz'))
+
+    def test_duplicate_names(self):
+        work = factories.WorkFactory.create(name='Book')
+        factories.WorkFactory.create(name='Book')
+        self.assertEqual(
+            search_api.get_work_id_for_search_query('book'), work.id)
+
+
+class ResolveSearchQueriesTest(test.TestCase):
+
+    def setUp(self):
+        self.work = factories.WorkFactory.create(name='Les Misérables')
+        self.work_two = factories.WorkFactory.create(name='Les Mis')
+
+    def test_db(self):
+        with mock.patch.object(
+                autocomplete_index, 'get_built_autocomplete_index',
+                return_value=None), self.assertNumQueries(1):
+            self.assertEqual(
+                search_api.resolve_search_queries(
+                    ['Les Misérables', 'zzz', 'les mis', 'Les Misérables']),
+                [(self.work.id, self.work.name), None,
+                 (self.work_two.id, self.work_two.name),
+                 (self.work.id, self.work.name)])
+
+    def test_db_no_min_similarity(self):
+        self.assertEqual(
+            search_api.resolve_search_queries(
+                ['les miserables', 'zzz'], min_similarity=0),
+            [(self.work.id, self.work.name), (self.work.id, self.work.name)])
+
+    def test_db_exact_match(self):
+        factories.WorkFactory.create(name='les  miserables')
+        self.assertEqual(
+            search_api.resolve_search_queries(
+                [' LES MISERABLES', 'les mis']),
+            [(self.work.id, self.work.name),
+             (self.work_two.id, self.work_two.name)])
+
+    def test_normalized_name_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, models.Work._meta.db_table)
+        self.assertIn('core_work_normalized_name', constraints)
+
+
+class ResolveSearchQueriesIndexTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def setUp(self):
+        self.work = factories.WorkFactory.create(name='Les Misérables')
+        self.work_two = factories.WorkFactory.create(name='Les Mis')
+        autocomplete_index.get_autocomplete_index.cache_clear()
+        autocomplete_index.get_autocomplete_index()
+
+    def test_exact_match(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                search_api.resolve_search_queries(
+                    ['les miserables', 'LES MIS', 'misérables', 'zzz']),
+                [(self.work.id, self.work.name),
+                 (self.work_two.id, self.work_two.name),
+                 (self.work.id, self.work.name),
+                 None])
+
+
+class ResolveWorkIdsTest(test.TestCase):
+
+    def test_happy(self):
+        work = factories.WorkFactory.create(name='Book')
+        work_two = factories.WorkFactory.create(name='Other')
+        factories.WorkFactory.create(name='Unrelated')
+        self.assertEqual(
+            search_api.resolve_work_ids(['Book', 'Missing'], ['othe']),
+            {work.id, work_two.id})
+        self.assertEqual(search_api.resolve_work_ids([], []), set())
+
+    def test_one_query(self):
+        work = factories.WorkFactory.create(name='Book')
+        work_two = factories.WorkFactory.create(name='Book')
+        work_three = factories.WorkFactory.create(name='Other')
+        with mock.patch.object(
+                autocomplete_index, 'get_built_autocomplete_index',
+                return_value=None):
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    search_api.resolve_work_ids(['Book', 'Book'], ['othe']),
+                    {work.id, work_two.id, work_three.id})
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    search_api.resolve_work_ids(['Book'], []),
+                    {work.id, work_two.id})
+            with self.assertNumQueries(0):
+                self.assertEqual(
+                    search_api.resolve_work_ids([], []), set())
@@ -1,5 +1,11 @@
 import math
 
+import numpy as np
+
+# Max number of values held at once when summing intersection weights in
+# bulk. Bounds memory use for targets with many intersections.
+BATCH_CHUNK_SIZE = 1 << 20
+
 
 def dunning_log_likelihood(f1, s1, f2, s2):
     """Calculates Dunning log likelihood of an observation in two groups.
@@ -38,6 +44,44 @@ def dunning_log_likelihood(f1, s1, f2, s2):
     return likelihood
 
 
+def batch_dunning_log_likelihood(f1, s1, f2, s2):
+    """Calculates Dunning log likelihood of many observations at once.
+
+    Results equal those of calling dunning_log_likelihood with each set
+    of arguments, within float rounding: numpy's log can differ from
+    math.log in the last bit.
+
+    Args:
+        f1: numpy int array, observation frequencies in group one.
+        s1: Integer or numpy int array, total data points in group one.
+        f2: numpy int array, observation frequencies in group two.
+        s2: Integer or numpy int array, total data points in group two.
+
+    Returns:
+        numpy float64 array of log likelihoods, broadcast from the args.
+    """
+    f1, s1, f2, s2 = np.broadcast_arrays(
+        *[np.asarray(a, dtype=np.float64) for a in (f1, s1, f2, s2)])
+    likelihood = np.zeros(f1.shape, dtype=np.float64)
+    valid = (f1 + f2 != 0) & (s1 != 0) & (s2 != 0)
+    f1, s1, f2, s2 = f1[valid], s1[valid], f2[valid], s2[valid]
+
+    # Expected values
+    e1 = s1 * (f1 + f2) / (s1 + s2)
+    e2 = s2 * (f1 + f2) / (s1 + s2)
+    l1, l2 = np.zeros(len(f1)), np.zeros(len(f1))
+    has_l1 = (e1 != 0) & (f1 != 0)
+    l1[has_l1] = f1[has_l1] * np.log(f1[has_l1] / e1[has_l1])
+    has_l2 = (e2 != 0) & (f2 != 0)
+    l2[has_l2] = f2[has_l2] * np.log(f2[has_l2] / e2[has_l2])
+
+    valid_likelihood = 2 * (l1 + l2)
+    is_negative = f2 / s2 > f1 / s1
+    valid_likelihood[is_negative] = -valid_likelihood[is_negative]
+    likelihood[valid] = valid_likelihood
+    return likelihood
+
+
 def jaccard_similarity(
         set_a, set_b, element_to_weight=None, max_intersections=None):
     """Calculates Jaccard similarity, a measure of set overlap.
@@ -69,3 +113,158 @@ def jaccard_similarity(
     if not union:
         return 0.0
     return intersection / float(union)
+
+
+def batch_jaccard_similarity(
+        reference_set, target_sets, element_weights=None,
+        max_intersections=None):
+    """Calculates Jaccard similarity of one set to many sets at once.
+
+    Scores are identical to calling jaccard_similarity with each target.
+
+    Args:
+        reference_set: Iterable of integer element ids.
+        target_sets: Either a list of iterables of integer element ids, or
+            a sparse matrix with one set per row, such as a
+            scipy.sparse.csr_matrix or WorkTropeMatrix. Matrices need
+            indptr and indices attributes in CSR form, with no duplicate
+            entries within a row.
+        element_weights: Optional, numpy float array of weights, indexed
+            by element id. This results in a weighted Jaccard similarity.
+            Default weight is 1.
+        max_intersections: Optional integer, ignore intersections
+            beyond this threshold. If elements are weighted, the
+            strongest intersections are the ones counted.
+
+    Returns:
+        numpy float64 array of scores, one per target set. 0 (no overlap)
+        - 1 (complete overlap). Two empty sets score 0.
+    """
+    reference_ids = np.unique(np.asarray(list(reference_set), dtype=np.int64))
+    if hasattr(target_sets, 'indptr'):
+        indptr = np.asarray(target_sets.indptr, dtype=np.int64)
+        target_ids = np.asarray(target_sets.indices, dtype=np.int64)
+    else:
+        target_sets = [
+            np.unique(np.asarray(list(t), dtype=np.int64))
+            for t in target_sets]
+        indptr = np.zeros(len(target_sets) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in target_sets], out=indptr[1:])
+        target_ids = np.concatenate(
+            target_sets + [np.zeros(0, dtype=np.int64)])
+
+    target_sizes = np.diff(indptr)
+    targets = np.repeat(np.arange(len(target_sizes)), target_sizes)
+    is_intersection = np.isin(target_ids, reference_ids)
+    intersection_ids = target_ids[is_intersection]
+    if element_weights is None:
+        weights = np.ones(len(intersection_ids), dtype=np.float64)
+    else:
+        weights = np.asarray(
+            element_weights, dtype=np.float64)[intersection_ids]
+    return batch_jaccard_similarity_from_intersections(
+        targets[is_intersection], weights, len(reference_ids),
+        target_sizes, max_intersections=max_intersections)
+
+
+def batch_jaccard_similarity_from_intersections(
+        targets, weights, reference_size, target_sizes,
+        max_intersections=None):
+    """Calculates Jaccard similarity of one set to many, from intersections.
+
+    This is batch_jaccard_similarity for callers that already know which
+    elements each target shares with the reference set.
+
+    Args:
+        targets: numpy int array, the target index of each intersecting
+            element. Elements may be in any order.
+        weights: numpy float array, the weight of each intersecting
+            element. Weights below 1 count as 1, as in jaccard_similarity.
+        reference_size: Integer size of the reference set.
+        target_sizes: numpy int array of the size of each target set.
+        max_intersections: Optional integer, ignore intersections
+            beyond this threshold. The strongest intersections are the
+            ones counted.
+
+    Returns:
+        numpy float64 array of scores, one per target set.
+    """
+    target_sizes = np.asarray(target_sizes, dtype=np.int64)
+    intersection, intersection_size, counted = _sum_strongest_weights(
+        np.asarray(targets, dtype=np.int64),
+        np.maximum(np.asarray(weights, dtype=np.float64), 1),
+        len(target_sizes), max_intersections)
+    union = (
+        intersection +
+        (reference_size + target_sizes - intersection_size) - counted)
+    scores = np.zeros(len(target_sizes), dtype=np.float64)
+    np.divide(intersection, union, out=scores, where=union != 0)
+    return scores
+
+
+def _sum_strongest_weights(targets, weights, num_targets, max_weights):
+    """Totals the strongest weights of each target.
+
+    Weights beyond max_weights are dropped with a partial selection, and
+    the rest are summed strongest first, the same order used by
+    jaccard_similarity, so totals are identical.
+
+    Args:
+        targets: numpy int array, the target index of each weight.
+        weights: numpy float array of weights, all positive.
+        num_targets: Integer number of targets.
+        max_weights: Integer, max weights to total per target. None means
+            unlimited.
+
+    Returns:
+        Tuple of numpy arrays, one entry per target:
+            Float totals.
+            Integer count of weights.
+            Integer count of weights included in the total.
+    """
+    counts = np.bincount(targets, minlength=num_targets)
+    counted = counts
+    if max_weights is not None:
+        counted = np.minimum(counts, max_weights)
+    totals = np.zeros(num_targets, dtype=np.float64)
+    if not len(targets) or max_weights == 0:
+        return totals, counts, counted
+
+    # Lay each target's weights out in a row of a zero padded 2D array.
+    # Targets are handled in chunks of similar weight counts, to bound the
+    # array size.
+    order = np.argsort(targets, kind='stable')
+    targets, weights = targets[order], weights[order]
+    positions = np.arange(len(targets)) - (np.cumsum(counts) - counts)[
+        targets]
+    targets_by_count = np.argsort(counts, kind='stable')
+    sorted_counts = counts[targets_by_count]
+    row_of_target = np.zeros(num_targets, dtype=np.int64)
+    chunk_start = np.searchsorted(sorted_counts, 1)
+    while chunk_start < num_targets:
+        chunk_sizes = sorted_counts[chunk_start:] * np.arange(
+            1, num_targets - chunk_start + 1)
+        chunk_end = chunk_start + max(
+            np.searchsorted(chunk_sizes, BATCH_CHUNK_SIZE, side='right'), 1)
+        chunk_targets = targets_by_count[chunk_start:chunk_end]
+        row_of_target[chunk_targets] = np.arange(len(chunk_targets))
+        in_chunk = np.zeros(num_targets, dtype=bool)
+        in_chunk[chunk_targets] = True
+        hits = in_chunk[targets]
+        padded = np.zeros(
+            (len(chunk_targets), sorted_counts[chunk_end - 1]),
+            dtype=np.float64)
+        padded[row_of_target[targets[hits]], positions[hits]] = weights[hits]
+
+        # Keep only the strongest weights, in descending order. Padding
+        # zeros sort last and add nothing.
+        if max_weights is not None and padded.shape[1] > max_weights:
+            padded = -np.partition(-padded, max_weights - 1, axis=1)[
+                :, :max_weights]
+        padded = -np.sort(-padded, axis=1)
+        chunk_totals = np.zeros(len(chunk_targets), dtype=np.float64)
+        for column in range(padded.shape[1]):
+            chunk_totals += padded[:, column]
+        totals[chunk_targets] = chunk_totals
+        chunk_start = chunk_end
+    return totals, counts, counted
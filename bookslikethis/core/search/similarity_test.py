@@ -1,3 +1,8 @@
+import random
+from unittest import mock
+
+import numpy as np
+
 from core import test
 from core.search import similarity
 
@@ -121,3 +126,100 @@ class JaccardSimilarityTest(test.TestCase):
                 element_to_weight=weight_dict,
                 max_intersections=0),
             0)
+
+
+class BatchJaccardSimilarityTest(test.TestCase):
+
+    def setUp(self):
+        rand = random.Random(0)
+        self.reference_set = set(rand.sample(range(40), 15))
+        self.target_sets = [
+            set(rand.sample(range(40), rand.randint(0, 30)))
+            for _ in range(30)] + [set(), set(self.reference_set)]
+        # Includes weights below the floor of 1.
+        self.weights = np.array(
+            [rand.choice([0.5, 1, 2.5, 3, 7.25]) for _ in range(40)])
+
+    def assert_matches_scalar(self, target_sets, **kwargs):
+        element_to_weight = None
+        if kwargs.get('element_weights') is not None:
+            element_to_weight = dict(enumerate(kwargs['element_weights']))
+        scores = similarity.batch_jaccard_similarity(
+            self.reference_set, target_sets, **kwargs)
+        self.assertEqual(
+            scores.tolist(),
+            [similarity.jaccard_similarity(
+                self.reference_set, target_set,
+                element_to_weight=element_to_weight,
+                max_intersections=kwargs.get('max_intersections'))
+             for target_set in self.target_sets])
+
+    def test_matches_scalar(self):
+        for max_intersections in (None, 0, 1, 3, 20):
+            for element_weights in (None, self.weights):
+                self.assert_matches_scalar(
+                    self.target_sets, element_weights=element_weights,
+                    max_intersections=max_intersections)
+
+    def test_sparse_matrix(self):
+        target_sets = [sorted(t) for t in self.target_sets]
+        indptr = np.cumsum([0] + [len(t) for t in target_sets])
+        matrix = mock.Mock(
+            indptr=indptr, indices=np.array(sum(target_sets, [])))
+        self.assert_matches_scalar(
+            matrix, element_weights=self.weights, max_intersections=3)
+
+    def test_chunks(self):
+        with mock.patch.object(similarity, 'BATCH_CHUNK_SIZE', 8):
+            self.assert_matches_scalar(
+                self.target_sets, element_weights=self.weights,
+                max_intersections=3)
+
+    def test_empty(self):
+        self.assertEqual(
+            similarity.batch_jaccard_similarity(set(), []).tolist(), [])
+        self.assertEqual(
+            similarity.batch_jaccard_similarity(set(), [set()]).tolist(),
+            [0.0])
+
+
+class BatchJaccardSimilarityFromIntersectionsTest(test.TestCase):
+
+    def test_happy(self):
+        # Reference set {1, 2, 3}, targets {3, 4}, {1, 2, 3, 4} and {5}.
+        scores = similarity.batch_jaccard_similarity_from_intersections(
+            np.array([1, 1, 0, 1]), np.array([5, 5, 5, 5]), 3,
+            np.array([2, 4, 1]), max_intersections=2)
+        self.assertEqual(scores.tolist(), [.625, 10 / 12, 0.0])
+
+
+class BatchDunningLogLikelihoodTest(test.TestCase):
+
+    def test_matches_scalar(self):
+        rand = random.Random(0)
+        args = [(0, 0, 0, 0), (0, 10, 0, 10), (0, 10, 0, 0), (10, 10, 0, 10),
+                (1, 10, 10, 100), (3, 0, 2, 10), (3, 10, 2, 0)]
+        args += [
+            (rand.randint(0, 20), rand.randint(0, 100),
+             rand.randint(0, 20), rand.randint(0, 100))
+            for _ in range(200)]
+        f1, s1, f2, s2 = (np.array(a) for a in zip(*args))
+        np.testing.assert_allclose(
+            similarity.batch_dunning_log_likelihood(f1, s1, f2, s2),
+            [similarity.dunning_log_likelihood(*a) for a in args],
+            rtol=1e-12)
+
+    def test_scalar_totals(self):
+        np.testing.assert_allclose(
+            similarity.batch_dunning_log_likelihood(
+                np.array([2, 5, 1]), 10, np.array([1, 1, 5]), 10),
+            [similarity.dunning_log_likelihood(2, 10, 1, 10),
+             similarity.dunning_log_likelihood(5, 10, 1, 10),
+             similarity.dunning_log_likelihood(1, 10, 5, 10)],
+            rtol=1e-12)
+
+    def test_empty(self):
+        self.assertEqual(
+            similarity.batch_dunning_log_likelihood(
+                np.array([]), 0, np.array([]), 0).tolist(),
+            [])
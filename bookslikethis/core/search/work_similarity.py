@@ -1,5 +1,13 @@
+import collections
+
+import numpy as np
+
+from core import cache
 from core import data_api
+from core.search import inverted_index
+from core.search import minhash_lsh
 from core.search import similarity
+from core.search import work_trope_matrix
 
 # When works are compared based on tropes, only the strongest
 # this-many tropes are counted. Use None for no limit.
@@ -7,6 +15,31 @@ from core.search import similarity
 # lots of bland tropes.
 WORK_SIMILARITY_MAX_INTERSECTIONS = 20
 
+# Scoring engines for find_similar_works. Both produce the same ranking.
+# 'sets' scores candidate works one at a time using sets of tropes.
+# 'matrix' scores every candidate at once with vectorized operations over
+# an in-memory sparse work x trope matrix.
+SETS_ENGINE = 'sets'
+MATRIX_ENGINE = 'matrix'
+SIMILARITY_ENGINE = MATRIX_ENGINE
+
+# Whether shared tropes count by their distinctiveness rating, at least 1,
+# rather than 1 each. This changes rankings, so rerun build_similar_works
+# and clear the result cache after changing it.
+WEIGHT_SHARED_TROPES_BY_DISTINCTIVENESS = False
+
+# Whether the matrix engine may skip scoring works that provably can't
+# rank within the requested result limit.
+USE_TOP_K_PRUNING = True
+
+# Searches with at least this many reference works use approximate
+# candidate generation by default, only scoring works that share a
+# MinHash LSH bucket with a reference work. Large reference sets share a
+# trope with nearly every work, so exact candidate generation scores the
+# whole catalog. None disables this, and then the LSH index is only
+# built if a search asks for lsh_bands. See minhash_lsh.
+LSH_MIN_REFERENCE_WORKS = None
+
 # Genres to exclude when considering work similarity by genre.
 SIMILARITY_EXCLUDED_GENRES = {
     'Picaresque', 'Dime Novel', 'Sea Stories'}
@@ -39,50 +72,101 @@ def genre_similarity(reference_work_ids, target_work_ids):
     """
     reference_work_ids = set(reference_work_ids)
     target_work_ids = set(target_work_ids)
+    work_id_to_signature = get_work_genre_signatures()
 
-    def filter_genres(genres):
-        filtered_genres = set([])
-        for genre_name, genre_depth in genres:
-            if genre_depth != 0:
-                continue  # root genres only
-            if genre_name in SIMILARITY_EXCLUDED_GENRES:
-                continue
-            if genre_name in SIMILARITY_MERGED_GENRE_MAP:
-                genre_name = SIMILARITY_MERGED_GENRE_MAP[genre_name]
-            filtered_genres.add((genre_name, genre_depth))
-        return filtered_genres
-
-    work_id_to_genres = data_api.get_genres_with_depth_for_works(
-        reference_work_ids.union(target_work_ids))
-    work_id_to_genres = {
-        wid: filter_genres(genres)
-        for (wid, genres) in work_id_to_genres.items()}
+    # Most works share one of a few signatures, so score each distinct
+    # target signature once against the distinct reference signatures.
+    reference_signature_counts = collections.Counter(
+        work_id_to_signature.get(wid, 0) for wid in reference_work_ids)
+    signature_to_total = {}
 
     work_id_to_genre_similarity = {}
     for target_wid in target_work_ids:
-        target_genres = work_id_to_genres[target_wid]
-        jaccard_scores = []
-        for wid in reference_work_ids:
-            if wid == target_wid:
-                continue
-            source_genres = work_id_to_genres[wid]
-            jaccard_scores.append(
-                similarity.jaccard_similarity(source_genres, target_genres))
-        average_score = sum(jaccard_scores) / len(jaccard_scores)
+        target_signature = work_id_to_signature.get(target_wid, 0)
+        if target_signature not in signature_to_total:
+            signature_to_total[target_signature] = sum(
+                count * _signature_jaccard(target_signature, signature)
+                for (signature, count) in reference_signature_counts.items())
+        total = signature_to_total[target_signature]
+        num_references = len(reference_work_ids)
+        if target_wid in reference_work_ids:
+            # Works aren't compared with themselves.
+            total -= _signature_jaccard(target_signature, target_signature)
+            num_references -= 1
+        average_score = total / num_references if num_references else 0.0
         work_id_to_genre_similarity[target_wid] = average_score + 1
 
     return work_id_to_genre_similarity
 
 
+@cache.lru_cache(maxsize=1)
+def get_work_genre_signatures():
+    """Gets the filtered genres of every work, as bitmask signatures.
+
+    Only root genres are used. SIMILARITY_EXCLUDED_GENRES are dropped, and
+    SIMILARITY_MERGED_GENRE_MAP is applied.
+
+    Returns:
+        Dict of work id to integer signature, with one bit set per genre.
+        Works without genres are omitted, and have a signature of 0.
+    """
+    genre_id_to_name_and_depth = data_api.get_genre_info()
+    genre_id_to_name = {}
+    for genre_id, (genre_name, genre_depth) in (
+            genre_id_to_name_and_depth.items()):
+        if genre_depth != 0:
+            continue  # root genres only
+        if genre_name in SIMILARITY_EXCLUDED_GENRES:
+            continue
+        genre_id_to_name[genre_id] = SIMILARITY_MERGED_GENRE_MAP.get(
+            genre_name, genre_name)
+    genre_name_to_bit = {
+        name: 1 << i
+        for (i, name) in enumerate(sorted(set(genre_id_to_name.values())))}
+    genre_id_to_bit = {
+        gid: genre_name_to_bit[name]
+        for (gid, name) in genre_id_to_name.items()}
+
+    work_id_to_signature = {}
+    edge_work_ids, edge_genre_ids = data_api.get_genre_work_edges()
+    for work_id, genre_id in zip(
+            edge_work_ids.tolist(), edge_genre_ids.tolist()):
+        if genre_id in genre_id_to_bit:
+            work_id_to_signature[work_id] = (
+                work_id_to_signature.get(work_id, 0) |
+                genre_id_to_bit[genre_id])
+    return work_id_to_signature
+
+
+@cache.lru_cache(maxsize=1 << 16)
+def _signature_jaccard(signature_a, signature_b):
+    """Calculates Jaccard similarity of two genre signatures.
+
+    Equivalent to similarity.jaccard_similarity of the genre sets.
+
+    Args:
+        signature_a: Integer genre bitmask.
+        signature_b: Integer genre bitmask.
+
+    Returns:
+        Float, 0 (no overlap) - 1 (complete overlap). Two empty
+        signatures return 0.
+    """
+    union = bin(signature_a | signature_b).count('1')
+    if not union:
+        return 0.0
+    return bin(signature_a & signature_b).count('1') / float(union)
+
+
 def calc_trope_distinctiveness_for_works(
-        work_id_to_tropes, tag_names=None, tag_weights=None):
+        work_id_to_trope_ids, tag_names=None, tag_weights=None):
     """Scores the distinctiveness of tropes in a set of works.
 
     This compares trope frequency in the given set of works with the
     rest of the works in the database.
 
     Args:
-        work_id_to_tropes: Dict of work ids to set of tropes.
+        work_id_to_trope_ids: Dict of work ids to set of trope ids.
         tag_names: Optional, tuple of trope tag names to limit results to.
         tag_weights: Optional, dict of trope tag name to float weight.
 
@@ -91,64 +175,106 @@ def calc_trope_distinctiveness_for_works(
     """
     # Get trope frequencies within the work set.
     subset_trope_to_count = _get_trope_counts(
-        work_id_to_tropes, tag_names=tag_names)
+        work_id_to_trope_ids, tag_names=tag_names)
     subset_occurrences = sum(subset_trope_to_count.values())
-    # Get trope frequencies db-wide.
-    all_trope_to_count = data_api.get_trope_to_occurrence_count(
-        tag_names=tag_names)
-    all_occurrences = sum(all_trope_to_count.values())
+    # Get trope frequencies db-wide, from the length of each
+    # trope's posting list.
+    index = inverted_index.get_trope_inverted_index()
+    all_occurrences = int(index.get_posting_lengths(
+        data_api.get_trope_ids(tag_names=tag_names)).sum())
+    subset_trope_ids = list(subset_trope_to_count)
+    subset_trope_counts = np.array(
+        [subset_trope_to_count[tid] for tid in subset_trope_ids],
+        dtype=np.int64)
+    all_trope_counts = index.get_posting_lengths(subset_trope_ids)
 
     # Use frequencies to calculate log likelihood for each trope.
-    trope_to_likelihood = {}
-    for trope, works_count in subset_trope_to_count.items():
-        trope_to_likelihood[trope] = similarity.dunning_log_likelihood(
-            subset_trope_to_count[trope],
-            subset_occurrences,
-            (all_trope_to_count[trope.id] -
-                subset_trope_to_count.get(trope, 0)),
-            all_occurrences - subset_occurrences)
+    likelihoods = similarity.batch_dunning_log_likelihood(
+        subset_trope_counts,
+        subset_occurrences,
+        all_trope_counts - subset_trope_counts,
+        all_occurrences - subset_occurrences)
+    trope_id_to_likelihood = dict(
+        zip(subset_trope_ids, likelihoods.tolist()))
 
     if not tag_weights:
-        return {t.id: s for (t, s) in trope_to_likelihood.items()}
+        return trope_id_to_likelihood
+
+    # Apply any trope tag_name weighting. A trope takes whichever of its
+    # tag weights scores it highest.
+    low, high = data_api.get_trope_store().get_weight_bounds(
+        subset_trope_ids, tag_weights)
+    likelihoods = np.maximum(
+        likelihoods, np.maximum(likelihoods * low, likelihoods * high))
+    return dict(zip(subset_trope_ids, likelihoods.tolist()))
 
-    # Apply any trope tag_name weighting.
-    trope_id_to_weighted_likelihood = {}
-    for trope, original_weight in trope_to_likelihood.items():
-        trope_id_to_weighted_likelihood[trope.id] = original_weight
-        for cat_name in trope.get_tag_set():
-            if cat_name in tag_weights:
-                trope_id_to_weighted_likelihood[trope.id] = max(
-                    trope_id_to_weighted_likelihood[trope.id],
-                    original_weight * tag_weights[cat_name])
-    return trope_id_to_weighted_likelihood
 
+def _calc_trope_distinctiveness_for_columns(
+        matrix, store, columns, column_counts, allowed_columns,
+        tag_weights=None):
+    """Scores the distinctiveness of tropes in a set of works, in bulk.
 
-def _get_trope_counts(work_id_to_tropes, tag_names=None):
+    Produces the same scores as calc_trope_distinctiveness_for_works,
+    from flat arrays rather than trope objects.
+
+    Args:
+        matrix: WorkTropeMatrix object.
+        store: TropeStore object.
+        columns: numpy int array of the unique matrix columns of the
+            tropes in the work set.
+        column_counts: numpy int array, the number of works in the set
+            with each of columns.
+        allowed_columns: numpy bool array, indexed by column. The tropes
+            obeying tag_names.
+        tag_weights: Optional, dict of trope tag name to float weight.
+
+    Returns:
+        Dict of trope id to float distinctiveness score.
+    """
+    subset_occurrences = int(column_counts.sum())
+    all_occurrences = int(matrix.column_counts[allowed_columns].sum())
+    likelihoods = similarity.batch_dunning_log_likelihood(
+        column_counts,
+        subset_occurrences,
+        matrix.column_counts[columns] - column_counts,
+        all_occurrences - subset_occurrences)
+
+    trope_ids = matrix.trope_ids[columns]
+    if tag_weights:
+        # A trope takes whichever of its tag weights scores it highest.
+        low, high = store.get_weight_bounds(trope_ids, tag_weights)
+        likelihoods = np.maximum(
+            likelihoods,
+            np.maximum(likelihoods * low, likelihoods * high))
+    return dict(zip(trope_ids.tolist(), likelihoods.tolist()))
+
+
+def _get_trope_counts(work_id_to_trope_ids, tag_names=None):
     """Totals occurrences of each trope across works.
 
     Args:
-        work_id_to_tropes: Dict of work id to set of models.Trope objects.
+        work_id_to_trope_ids: Dict of work id to set of trope ids.
         tag_names: Optional, iterable of string trope tag names to limit
             similarity scoring to.
 
     Returns:
-        Dict of models.Trope to integer count.
+        Dict of integer trope id to integer count.
     """
-    if tag_names is None:
-        tag_names = []
-    tag_names = set(tag_names)
-    trope_to_count = {}
-    for tropes in work_id_to_tropes.values():
-        for trope in tropes:
-            if not tag_names or tag_names.intersection(trope.get_tag_set()):
-                trope_to_count.setdefault(trope, 0)
-                trope_to_count[trope] += 1
-    return trope_to_count
+    trope_to_count = collections.Counter()
+    for trope_ids in work_id_to_trope_ids.values():
+        trope_to_count.update(trope_ids)
+    if tag_names:
+        allowed_trope_ids = data_api.get_trope_id_set(tag_names)
+        trope_to_count = {
+            tid: count for (tid, count) in trope_to_count.items()
+            if tid in allowed_trope_ids}
+    return dict(trope_to_count)
 
 
 def find_similar_works(
         work_ids, limit=10,
-        tag_names=None, tag_weights=None, use_genre_weights=True):
+        tag_names=None, tag_weights=None, use_genre_weights=True,
+        engine=None, lsh_bands=None):
     """Finds works similar to an given set of works.
 
     Similarity is based on tropes in common. A genre similarity weighting is
@@ -163,28 +289,118 @@ def find_similar_works(
             weight. Any omitted entry will default to a weight of 1.
         use_genre_weights: Boolean, whether to apply a genre similarity
             scoring factor.
+        engine: Optional, one of the *_ENGINE constants. Defaults to
+            SIMILARITY_ENGINE.
+        lsh_bands: Optional, integer number of MinHash LSH bands. If given,
+            only works sharing an LSH bucket with a reference work are
+            scored. More bands raise recall and latency. Defaults to
+            minhash_lsh.LSH_BANDS for reference sets of at least
+            LSH_MIN_REFERENCE_WORKS works, otherwise exact candidate
+            generation. Only supported by the matrix engine.
 
     Returns:
         Tuple of:
-            List of work ids, most similar first.
+            List of work ids, most similar first. Ties are ordered by
+                work id.
             Dict of trope id to distinctiveness rating. Has entries for
                 every trope, obeying tag_names, in the work set.
     """
+    ranked_work_ids, _, tropes_by_distinctiveness = (
+        find_similar_works_with_scores(
+            work_ids, limit=limit, tag_names=tag_names,
+            tag_weights=tag_weights, use_genre_weights=use_genre_weights,
+            engine=engine, lsh_bands=lsh_bands))
+    return ranked_work_ids, tropes_by_distinctiveness
+
+
+def find_similar_works_with_scores(
+        work_ids, limit=10,
+        tag_names=None, tag_weights=None, use_genre_weights=True,
+        engine=None, lsh_bands=None):
+    """Finds works similar to an given set of works, with their scores.
+
+    See find_similar_works for args.
+
+    Returns:
+        Tuple of:
+            List of work ids, most similar first. Ties are ordered by
+                work id.
+            List of float similarity scores, one per work id.
+            Dict of trope id to distinctiveness rating. Has entries for
+                every trope, obeying tag_names, in the work set.
+    """
+    if engine is None:
+        engine = SIMILARITY_ENGINE
+    if (lsh_bands is None and engine == MATRIX_ENGINE and
+            LSH_MIN_REFERENCE_WORKS is not None and
+            len(set(work_ids)) >= LSH_MIN_REFERENCE_WORKS):
+        lsh_bands = minhash_lsh.LSH_BANDS
+
+    if lsh_bands is not None and engine != MATRIX_ENGINE:
+        raise ValueError('LSH candidates require the matrix engine.')
+    if engine == SETS_ENGINE:
+        match_work_ids, scores, tropes_by_distinctiveness = (
+            _score_works_with_sets(
+                work_ids, tag_names=tag_names, tag_weights=tag_weights,
+                use_genre_weights=use_genre_weights))
+    elif engine == MATRIX_ENGINE:
+        match_work_ids, scores, tropes_by_distinctiveness = (
+            _score_works_with_matrix(
+                work_ids, tag_names=tag_names, tag_weights=tag_weights,
+                use_genre_weights=use_genre_weights, limit=limit,
+                lsh_bands=lsh_bands))
+    else:
+        raise ValueError('Unknown similarity engine: %s' % engine)
+
+    order = _rank_works(match_work_ids, scores, limit)
+    return (
+        match_work_ids[order].tolist(), scores[order].tolist(),
+        tropes_by_distinctiveness)
+
+
+def _rank_works(work_ids, scores, limit):
+    """Orders works by descending score, then ascending id.
+
+    Args:
+        work_ids: numpy int array of work ids.
+        scores: numpy float array of scores, one per work id.
+        limit: Integer, max number of results to return. None means unlimited.
+
+    Returns:
+        numpy int array of positions in work_ids, best first.
+    """
+    order = np.lexsort((work_ids, -scores))
+    if limit is not None:
+        order = order[:limit]
+    return order
+
+
+def _score_works_with_sets(
+        work_ids, tag_names=None, tag_weights=None, use_genre_weights=True):
+    """Scores works against the reference set one at a time.
+
+    See find_similar_works for args.
+
+    Returns:
+        Tuple of:
+            numpy int64 array of matching work ids.
+            numpy float64 array of similarity scores, one per work id.
+            Dict of trope id to distinctiveness rating.
+    """
     # Look up the tropes in the reference set.
-    ref_work_id_to_tropes = data_api.get_tropes_by_work_id(
+    ref_work_id_to_trope_ids = data_api.get_trope_ids_by_work_id(
         work_ids, tag_names=tag_names)
-    ref_tropes = set.union(*ref_work_id_to_tropes.values())
+    ref_trope_ids = set.union(*ref_work_id_to_trope_ids.values())
 
     # Find works which share any relevant tropes with the reference
     # set, and fetch their tropes for analysis.
-    match_work_ids = {
-        wid for wid in data_api.get_work_ids_with_tropes(
-            ref_tropes) if wid not in work_ids}
-    match_work_to_ranking = {wid: 0 for wid in match_work_ids}
-    match_work_id_to_tropes = data_api.get_tropes_by_work_id(
+    match_work_ids = [
+        wid for wid in inverted_index.get_trope_inverted_index().union(
+            list(ref_trope_ids)).tolist() if wid not in work_ids]
+    match_work_id_to_trope_ids = data_api.get_trope_ids_by_work_id(
         match_work_ids, tag_names=tag_names)
 
-    # Score similarity of each matching work, and rank them.
+    # Score similarity of each matching work.
     if use_genre_weights:
         work_id_to_genre_similarity = genre_similarity(
             work_ids, match_work_ids)
@@ -192,21 +408,197 @@ def find_similar_works(
         work_id_to_genre_similarity = {wid: 1 for wid in match_work_ids}
 
     tropes_by_distinctiveness = calc_trope_distinctiveness_for_works(
-        ref_work_id_to_tropes, tag_names=tag_names, tag_weights=tag_weights)
-
-    for work_id in match_work_ids:
-        genre_weight = work_id_to_genre_similarity[work_id]
-        match_work_to_ranking[work_id] = similarity.jaccard_similarity(
-            ref_tropes,
-            match_work_id_to_tropes[work_id],
-            element_to_weight=tropes_by_distinctiveness,
-            max_intersections=WORK_SIMILARITY_MAX_INTERSECTIONS) * genre_weight
-    ranked_works = sorted(
-        match_work_to_ranking.items(),
-        key=lambda t: t[1],
-        reverse=True)
-    if limit is not None:
-        ranked_works = ranked_works[:limit]
-    return [rw[0] for rw in ranked_works], tropes_by_distinctiveness
+        ref_work_id_to_trope_ids, tag_names=tag_names,
+        tag_weights=tag_weights)
+
+    element_to_weight = None
+    if WEIGHT_SHARED_TROPES_BY_DISTINCTIVENESS:
+        element_to_weight = tropes_by_distinctiveness
+    scores = np.array([
+        similarity.jaccard_similarity(
+            ref_trope_ids,
+            match_work_id_to_trope_ids[work_id],
+            element_to_weight=element_to_weight,
+            max_intersections=WORK_SIMILARITY_MAX_INTERSECTIONS) *
+        work_id_to_genre_similarity[work_id]
+        for work_id in match_work_ids], dtype=np.float64)
+    return (
+        np.array(match_work_ids, dtype=np.int64), scores,
+        tropes_by_distinctiveness)
+
+
+def _score_works_with_matrix(
+        work_ids, tag_names=None, tag_weights=None, use_genre_weights=True,
+        limit=None, lsh_bands=None):
+    """Scores candidate works in bulk using the work x trope matrix.
+
+    Produces the same scores as _score_works_with_sets. If limit is given
+    and USE_TOP_K_PRUNING is set, works that provably can't rank within
+    the limit may be left out. If lsh_bands is given, only works sharing
+    an LSH bucket with a reference work are scored.
+    See find_similar_works for args.
+
+    Returns:
+        Tuple of:
+            numpy int64 array of matching work ids.
+            numpy float64 array of similarity scores, one per work id.
+            Dict of trope id to distinctiveness rating.
+    """
+    matrix = work_trope_matrix.get_work_trope_matrix()
+    index = inverted_index.get_trope_inverted_index()
+    store = data_api.get_trope_store()
+    allowed_columns = store.get_tag_mask(
+        matrix.trope_ids, tag_names=tag_names)
+
+    # Look up the tropes in the reference set. Each work counts once,
+    # however often it's listed.
+    work_ids = list(work_ids)
+    ref_rows = matrix.get_rows(work_ids)
+    _, ref_entry_columns = matrix.gather_rows(
+        np.unique(ref_rows[ref_rows >= 0]))
+    ref_entry_columns = ref_entry_columns[allowed_columns[ref_entry_columns]]
+    ref_columns, ref_column_counts = np.unique(
+        ref_entry_columns, return_counts=True)
+
+    tropes_by_distinctiveness = _calc_trope_distinctiveness_for_columns(
+        matrix, store, ref_columns, ref_column_counts,
+        allowed_columns, tag_weights=tag_weights)
+
+    column_weights = np.ones(matrix.shape[1], dtype=np.float64)
+    if WEIGHT_SHARED_TROPES_BY_DISTINCTIVENESS:
+        column_weights[ref_columns] = [
+            max(tropes_by_distinctiveness.get(tid, 1), 1)
+            for tid in matrix.trope_ids[ref_columns].tolist()]
+    row_trope_counts = matrix.count_row_columns(allowed_columns)
+    is_ref_row = np.zeros(matrix.shape[0], dtype=bool)
+    is_ref_row[ref_rows[ref_rows >= 0]] = True
+
+    def score_hits(hit_rows, hit_columns):
+        """Scores rows from their entries in reference columns."""
+        match_rows, hit_targets = np.unique(hit_rows, return_inverse=True)
+        match_work_ids = matrix.work_ids[match_rows]
+        scores = similarity.batch_jaccard_similarity_from_intersections(
+            hit_targets, column_weights[hit_columns], len(ref_columns),
+            row_trope_counts[match_rows],
+            max_intersections=WORK_SIMILARITY_MAX_INTERSECTIONS)
+
+        if use_genre_weights:
+            work_id_to_genre_similarity = genre_similarity(
+                work_ids, match_work_ids.tolist())
+            scores *= np.array([
+                work_id_to_genre_similarity[wid]
+                for wid in match_work_ids.tolist()], dtype=np.float64)
+        return match_work_ids, scores
+
+    if lsh_bands is not None:
+        # Score only approximate candidates, using all of their tropes.
+        rows = minhash_lsh.get_minhash_lsh_index(lsh_bands).query(
+            ref_rows[ref_rows >= 0])
+        rows = rows[~is_ref_row[rows]]
+        is_ref_column = np.zeros(matrix.shape[1], dtype=bool)
+        is_ref_column[ref_columns] = True
+        owners, columns = matrix.gather_rows(rows)
+        hits = is_ref_column[columns]
+        match_work_ids, scores = score_hits(rows[owners[hits]], columns[hits])
+    elif limit is not None and USE_TOP_K_PRUNING:
+        match_work_ids, scores = _score_top_works(
+            matrix, index, ref_columns, column_weights, is_ref_row,
+            score_hits, limit, 2 if use_genre_weights else 1)
+    else:
+        # Find every work sharing a reference trope, from the postings of
+        # the reference tropes.
+        hit_work_ids, hit_owners = index.gather(
+            matrix.trope_ids[ref_columns])
+        hit_rows = matrix.get_rows(hit_work_ids)
+        hit_columns = ref_columns[hit_owners]
+        is_match = ~is_ref_row[hit_rows]
+        match_work_ids, scores = score_hits(
+            hit_rows[is_match], hit_columns[is_match])
+    return match_work_ids, scores, tropes_by_distinctiveness
+
+
+def _score_top_works(
+        matrix, index, ref_columns, column_weights, is_ref_row,
+        score_hits, limit, max_multiplier):
+    """Scores candidate works, skipping those that can't rank within limit.
+
+    This is MaxScore style dynamic pruning. Reference tropes are visited
+    strongest first, in blocks of doubling size, and works found in their
+    postings are scored exactly. Works only found under the remaining,
+    weaker tropes have a score upper bound from the remaining weights.
+    Once that bound falls below the limit-th best score found so far,
+    no unvisited work can rank within the limit and scoring stops.
 
+    Args:
+        matrix: WorkTropeMatrix object.
+        index: TropeInvertedIndex object.
+        ref_columns: numpy int array of reference trope columns.
+        column_weights: numpy float array of trope weights, by column.
+        is_ref_row: numpy bool array, true for reference work rows.
+        score_hits: Function taking rows and reference columns of matrix
+            entries, and returning a tuple of work ids and scores.
+        limit: Integer, number of top works which must be scored.
+        max_multiplier: Float, max factor applied to similarity scores,
+            such as genre similarity.
 
+    Returns:
+        Tuple of numpy arrays of work ids and scores. Includes every work
+        able to rank within limit.
+    """
+    order = np.argsort(-column_weights[ref_columns], kind='stable')
+    ref_columns = ref_columns[order]
+    is_ref_column = np.zeros(matrix.shape[1], dtype=bool)
+    is_ref_column[ref_columns] = True
+
+    # Upper bound of the score of a work only sharing reference tropes
+    # from position i on. Shared weight is at most the sum of the
+    # strongest remaining weights that can be counted, and the union can
+    # be no smaller than the reference set.
+    num_refs = len(ref_columns)
+    max_counted = WORK_SIMILARITY_MAX_INTERSECTIONS
+    if max_counted is None:
+        max_counted = num_refs
+    cumulative_weights = np.zeros(num_refs + 1, dtype=np.float64)
+    np.cumsum(column_weights[ref_columns], out=cumulative_weights[1:])
+    starts = np.arange(num_refs + 1)
+    counted = np.minimum(num_refs - starts, max_counted)
+    shared_weight = (
+        cumulative_weights[starts + counted] - cumulative_weights[starts])
+    bounds = np.zeros(num_refs + 1, dtype=np.float64)
+    np.divide(
+        max_multiplier * shared_weight,
+        shared_weight + num_refs - counted,
+        out=bounds, where=shared_weight > 0)
+
+    is_visited_row = is_ref_row.copy()
+    work_ids, scores = [], []
+    threshold = None
+    start, block_size = 0, 1
+    while start < num_refs:
+        # Allow for rounding differences between bound and score sums.
+        if (threshold is not None and
+                bounds[start] * (1 + 1e-9) < threshold):
+            break
+        end = min(start + block_size, num_refs)
+        rows = np.unique(matrix.get_rows(index.gather(
+            matrix.trope_ids[ref_columns[start:end]])[0]))
+        rows = rows[~is_visited_row[rows]]
+        is_visited_row[rows] = True
+        start, block_size = end, block_size * 2
+        if not len(rows):
+            continue
+
+        # Score new works exactly, using all of their tropes.
+        owners, columns = matrix.gather_rows(rows)
+        hits = is_ref_column[columns]
+        block_work_ids, block_scores = score_hits(
+            rows[owners[hits]], columns[hits])
+        work_ids.append(block_work_ids)
+        scores.append(block_scores)
+        if sum(len(s) for s in scores) >= limit:
+            all_scores = np.concatenate(scores)
+            threshold = -np.partition(-all_scores, limit - 1)[limit - 1]
+
+    if not work_ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    return np.concatenate(work_ids), np.concatenate(scores)
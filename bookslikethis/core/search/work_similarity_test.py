@@ -3,6 +3,7 @@ from unittest import mock
 from core import data_api
 from core import factories
 from core import test
+from core.search import similarity
 from core.search import work_similarity
 
 
@@ -86,6 +87,71 @@ class GenreSimilarityTest(test.TestCase):
             {work_two.id: 2}
         )
 
+    def test_target_in_references(self):
+        genre = factories.GenreFactory.create()
+        genre_two = factories.GenreFactory.create()
+        work = factories.WorkFactory.create(genres=[genre])
+        work_two = factories.WorkFactory.create(genres=[genre, genre_two])
+        work_three = factories.WorkFactory.create(genres=[genre_two])
+        # Works aren't compared with themselves.
+        self.assertEqual(
+            work_similarity.genre_similarity(
+                [work.id, work_two.id, work_three.id],
+                [work.id, work_two.id]),
+            {work.id: 1.25, work_two.id: 1.5})
+        self.assertEqual(
+            work_similarity.genre_similarity([work.id], [work.id]),
+            {work.id: 1})
+
+    def test_shared_signatures(self):
+        genre = factories.GenreFactory.create()
+        genre_two = factories.GenreFactory.create()
+        references = [
+            factories.WorkFactory.create(genres=[genre]),
+            factories.WorkFactory.create(genres=[genre]),
+            factories.WorkFactory.create(genres=[genre, genre_two])]
+        targets = [
+            factories.WorkFactory.create(genres=[genre_two])
+            for _ in range(3)]
+        with mock.patch.object(
+                work_similarity, '_signature_jaccard',
+                wraps=work_similarity._signature_jaccard) as jaccard_mock:
+            self.assertEqual(
+                work_similarity.genre_similarity(
+                    [w.id for w in references], [w.id for w in targets]),
+                {w.id: 1 + .5 / 3 for w in targets})
+        # One call per distinct pair of signatures.
+        self.assertEqual(jaccard_mock.call_count, 2)
+
+
+class GetWorkGenreSignaturesTest(test.TestCase):
+
+    def test_happy(self):
+        merged_pair = list(
+            work_similarity.SIMILARITY_MERGED_GENRE_MAP.items())[0]
+        genre = factories.GenreFactory.create(name=merged_pair[0])
+        genre_two = factories.GenreFactory.create(name=merged_pair[1])
+        genre_three = factories.GenreFactory.create()
+        sub_genre = factories.GenreFactory.create(parent_genre=genre_three)
+        work = factories.WorkFactory.create(genres=[genre, genre_three])
+        work_two = factories.WorkFactory.create(genres=[genre_two])
+        work_three = factories.WorkFactory.create(genres=[sub_genre])
+        factories.WorkFactory.create()
+        signatures = work_similarity.get_work_genre_signatures()
+        self.assertEqual(set(signatures), {work.id, work_two.id})
+        self.assertEqual(bin(signatures[work.id]).count('1'), 2)
+        self.assertEqual(
+            signatures[work.id] & signatures[work_two.id],
+            signatures[work_two.id])
+        self.assertNotIn(work_three.id, signatures)
+
+    def test_signature_jaccard(self):
+        self.assertEqual(work_similarity._signature_jaccard(0, 0), 0.0)
+        self.assertEqual(work_similarity._signature_jaccard(0b11, 0b01), .5)
+        self.assertEqual(work_similarity._signature_jaccard(0b11, 0b11), 1.0)
+        self.assertEqual(
+            work_similarity._signature_jaccard(0b0111, 0b1100), .25)
+
 
 class CalcTropeDistinctivenessForWorksTest(test.TestCase):
 
@@ -95,7 +161,7 @@ class CalcTropeDistinctivenessForWorksTest(test.TestCase):
         trope_two = factories.TropeFactory.create()
         work_two = factories.WorkFactory.create(tropes=[trope_one])
         factories.WorkFactory.create(tropes=[trope_two])
-        work_to_tropes = data_api.get_tropes_by_work_id([work.id])
+        work_to_tropes = data_api.get_trope_ids_by_work_id([work.id])
         trope_id_to_score = (
             work_similarity.calc_trope_distinctiveness_for_works(
                 work_to_tropes))
@@ -110,7 +176,8 @@ class CalcTropeDistinctivenessForWorksTest(test.TestCase):
         self.assertEqual(round(trope_id_to_score[trope_one.id], 2), 0.58)
         # Including both works with the trope in the work set makes
         # it more distinct.
-        work_to_tropes = data_api.get_tropes_by_work_id([work.id, work_two.id])
+        work_to_tropes = data_api.get_trope_ids_by_work_id(
+            [work.id, work_two.id])
         trope_id_to_score = (
             work_similarity.calc_trope_distinctiveness_for_works(
                 work_to_tropes))
@@ -119,7 +186,7 @@ class CalcTropeDistinctivenessForWorksTest(test.TestCase):
 
     def test_no_tropes(self):
         work = factories.WorkFactory.create()
-        work_to_tropes = data_api.get_tropes_by_work_id([work.id])
+        work_to_tropes = data_api.get_trope_ids_by_work_id([work.id])
         self.assertEqual(
             work_similarity.calc_trope_distinctiveness_for_works(
                 work_to_tropes),
@@ -131,7 +198,7 @@ class CalcTropeDistinctivenessForWorksTest(test.TestCase):
         in_trope = factories.TropeFactory.create(tags=[in_tag])
         out_trope = factories.TropeFactory.create(tags=[out_tag])
         work = factories.WorkFactory.create(tropes=[in_trope, out_trope])
-        work_to_tropes = data_api.get_tropes_by_work_id([work.id])
+        work_to_tropes = data_api.get_trope_ids_by_work_id([work.id])
         self.assertEqual(
             work_similarity.calc_trope_distinctiveness_for_works(
                 work_to_tropes, tag_names=[in_tag.name]),
@@ -147,7 +214,7 @@ class CalcTropeDistinctivenessForWorksTest(test.TestCase):
         work = factories.WorkFactory.create(
             tropes=[trope_one, trope_two, trope_both])
         factories.WorkFactory.create(tropes=[other_trope])
-        work_to_tropes = data_api.get_tropes_by_work_id([work.id])
+        work_to_tropes = data_api.get_trope_ids_by_work_id([work.id])
         trope_id_to_score = (
             work_similarity.calc_trope_distinctiveness_for_works(
                 work_to_tropes,
@@ -175,3 +242,187 @@ class FindSimilarWorksTest(test.TestCase):
         self.assertEqual(
             trope_id_to_score,
             {trope_one.id: mock.ANY, trope_two.id: mock.ANY})
+
+    def test_engines_match(self):
+        tag = factories.TropeTagFactory.create(name='plot')
+        other_tag = factories.TropeTagFactory.create(name='other')
+        tropes = [factories.TropeFactory.create(tags=[tag]) for _ in range(6)]
+        other_trope = factories.TropeFactory.create(tags=[other_tag])
+        genre = factories.GenreFactory.create()
+        work = factories.WorkFactory.create(
+            tropes=tropes[:4] + [other_trope], genres=[genre])
+        work_two = factories.WorkFactory.create(tropes=tropes[2:5])
+        factories.WorkFactory.create(tropes=tropes[:2], genres=[genre])
+        factories.WorkFactory.create(tropes=tropes[:2])
+        factories.WorkFactory.create(tropes=tropes[3:] + [other_trope])
+        factories.WorkFactory.create(tropes=[tropes[5], other_trope])
+        for kwargs in (
+                {},
+                {'tag_names': (tag.name, ), 'tag_weights': {tag.name: 3}},
+                {'use_genre_weights': False},
+                {'limit': 2}):
+            self.assertEqual(
+                work_similarity.find_similar_works(
+                    [work.id, work_two.id],
+                    engine=work_similarity.MATRIX_ENGINE, **kwargs),
+                work_similarity.find_similar_works(
+                    [work.id, work_two.id],
+                    engine=work_similarity.SETS_ENGINE, **kwargs))
+
+    def test_ties_ordered_by_id(self):
+        trope = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(tropes=[trope])
+        matches = [
+            factories.WorkFactory.create(tropes=[trope]) for _ in range(3)]
+        for engine in (
+                work_similarity.MATRIX_ENGINE, work_similarity.SETS_ENGINE):
+            ranked_works, _ = work_similarity.find_similar_works(
+                [work.id], engine=engine)
+            self.assertEqual(ranked_works, sorted(w.id for w in matches))
+
+    def test_no_tropes(self):
+        work = factories.WorkFactory.create()
+        factories.WorkFactory.create(tropes=[factories.TropeFactory.create()])
+        self.assertEqual(
+            work_similarity.find_similar_works([work.id]), ([], {}))
+
+    def test_unknown_engine(self):
+        work = factories.WorkFactory.create()
+        with self.assertRaises(ValueError):
+            work_similarity.find_similar_works([work.id], engine='fake')
+
+
+class DistinctivenessWeightsTest(test.TestCase):
+
+    def setUp(self):
+        self.common_trope = factories.TropeFactory.create()
+        self.rare_trope = factories.TropeFactory.create()
+        self.work = factories.WorkFactory.create(
+            tropes=[self.common_trope, self.rare_trope])
+        self.common_match = factories.WorkFactory.create(
+            tropes=[self.common_trope])
+        self.rare_match = factories.WorkFactory.create(
+            tropes=[self.rare_trope])
+        for _ in range(10):
+            factories.WorkFactory.create(
+                tropes=[self.common_trope, factories.TropeFactory.create()])
+
+    def _find_similar_works(self, **kwargs):
+        return work_similarity.find_similar_works(
+            [self.work.id], limit=2, use_genre_weights=False, **kwargs)[0]
+
+    def test_off(self):
+        """Every shared trope counts 1, so ties are ordered by id."""
+        for engine in (
+                work_similarity.MATRIX_ENGINE, work_similarity.SETS_ENGINE):
+            self.assertEqual(
+                self._find_similar_works(engine=engine),
+                [self.common_match.id, self.rare_match.id])
+
+    @mock.patch.object(
+        work_similarity, 'WEIGHT_SHARED_TROPES_BY_DISTINCTIVENESS', True)
+    def test_on(self):
+        """Sharing the rare trope counts for more."""
+        for engine in (
+                work_similarity.MATRIX_ENGINE, work_similarity.SETS_ENGINE):
+            self.assertEqual(
+                self._find_similar_works(engine=engine),
+                [self.rare_match.id, self.common_match.id])
+
+    @mock.patch.object(
+        work_similarity, 'WEIGHT_SHARED_TROPES_BY_DISTINCTIVENESS', True)
+    def test_on_pruning(self):
+        for limit in (1, 2, 5):
+            with mock.patch.object(
+                    work_similarity, 'USE_TOP_K_PRUNING', False):
+                expected = work_similarity.find_similar_works(
+                    [self.work.id], limit=limit)
+            self.assertEqual(
+                work_similarity.find_similar_works(
+                    [self.work.id], limit=limit),
+                expected)
+
+
+class TopKPruningTest(test.TestCase):
+
+    def setUp(self):
+        self.first_trope = factories.TropeFactory.create()
+        self.second_trope = factories.TropeFactory.create()
+        self.work = factories.WorkFactory.create(
+            tropes=[self.first_trope, self.second_trope])
+        self.full_match = factories.WorkFactory.create(
+            tropes=[self.first_trope, self.second_trope])
+        self.partial_matches = [
+            factories.WorkFactory.create(tropes=[self.second_trope])
+            for _ in range(10)]
+
+    def test_same_results(self):
+        for limit in (1, 2, 5, 20):
+            for use_genre_weights in (True, False):
+                with mock.patch.object(
+                        work_similarity, 'USE_TOP_K_PRUNING', False):
+                    expected = work_similarity.find_similar_works(
+                        [self.work.id], limit=limit,
+                        use_genre_weights=use_genre_weights)
+                self.assertEqual(
+                    work_similarity.find_similar_works(
+                        [self.work.id], limit=limit,
+                        use_genre_weights=use_genre_weights),
+                    expected)
+
+    def test_skips_works(self):
+        score_func = similarity.batch_jaccard_similarity_from_intersections
+        with mock.patch.object(
+                similarity, score_func.__name__,
+                wraps=score_func) as score_mock:
+            ranked_works, _ = work_similarity.find_similar_works(
+                [self.work.id], limit=1, use_genre_weights=False)
+        self.assertEqual(ranked_works, [self.full_match.id])
+        # Works only sharing the second trope, visited last, can't beat
+        # the full match, so they were never scored.
+        self.assertEqual(score_mock.call_count, 1)
+        scored_targets = score_mock.call_args[0][0]
+        self.assertEqual(len(set(scored_targets.tolist())), 1)
+
+
+class LshCandidatesTest(test.TestCase):
+
+    def setUp(self):
+        tropes = [factories.TropeFactory.create() for _ in range(30)]
+        self.work = factories.WorkFactory.create(tropes=tropes[:20])
+        self.near_match = factories.WorkFactory.create(tropes=tropes[:19])
+        # Shares a trope, but is too dissimilar to share an LSH bucket.
+        self.far_match = factories.WorkFactory.create(
+            tropes=tropes[19:30])
+
+    def test_happy(self):
+        ranked_works, _ = work_similarity.find_similar_works(
+            [self.work.id])
+        self.assertEqual(
+            ranked_works, [self.near_match.id, self.far_match.id])
+        ranked_works, trope_id_to_score = work_similarity.find_similar_works(
+            [self.work.id], lsh_bands=16)
+        self.assertEqual(ranked_works, [self.near_match.id])
+        # Distinctiveness doesn't depend on candidate generation.
+        self.assertEqual(
+            trope_id_to_score,
+            work_similarity.find_similar_works([self.work.id])[1])
+
+    def test_min_reference_works(self):
+        with mock.patch.object(
+                work_similarity, 'LSH_MIN_REFERENCE_WORKS', 1):
+            ranked_works, _ = work_similarity.find_similar_works(
+                [self.work.id])
+        self.assertEqual(ranked_works, [self.near_match.id])
+        with mock.patch.object(
+                work_similarity, 'LSH_MIN_REFERENCE_WORKS', 2):
+            ranked_works, _ = work_similarity.find_similar_works(
+                [self.work.id])
+        self.assertEqual(
+            ranked_works, [self.near_match.id, self.far_match.id])
+
+    def test_sets_engine(self):
+        with self.assertRaises(ValueError):
+            work_similarity.find_similar_works(
+                [self.work.id], engine=work_similarity.SETS_ENGINE,
+                lsh_bands=16)
@@ -0,0 +1,172 @@
+"""In-memory sparse work x trope matrix used for similarity scoring."""
+import numpy as np
+
+from core import cache
+from core import data_api
+
+
+class WorkTropeMatrix(object):
+    """A read-only compressed sparse row (CSR) matrix of works x tropes.
+
+    Works and tropes are mapped to dense, zero-based row and column indexes,
+    ordered by id. Row r holds the columns of every trope connected to the
+    work with id work_ids[r], in ascending order.
+
+    Attributes:
+        work_ids: numpy int64 array of work ids, indexed by row.
+        trope_ids: numpy int64 array of trope ids, indexed by column.
+        indptr: numpy int64 array, length rows + 1. The columns of row r
+            are indices[indptr[r]:indptr[r + 1]].
+        indices: numpy int32 array of column indexes.
+        entry_rows: numpy int32 array, the row of each entry in indices.
+        column_counts: numpy int64 array, the number of entries in each
+            column. This is the number of works with each trope.
+    """
+
+    def __init__(self, edge_work_ids, edge_trope_ids):
+        """Builds the matrix from an edge list.
+
+        Args:
+            edge_work_ids: numpy int array of work ids.
+            edge_trope_ids: numpy int array of trope ids, connected to the
+                work id at the same position. Duplicate edges are ignored.
+        """
+        self.work_ids, rows = np.unique(edge_work_ids, return_inverse=True)
+        self.trope_ids, columns = np.unique(
+            edge_trope_ids, return_inverse=True)
+        # Sort by row then column, dropping duplicate edges.
+        entries = np.unique(
+            rows.astype(np.int64) * len(self.trope_ids) + columns)
+        self.entry_rows = (entries // max(len(self.trope_ids), 1)).astype(
+            np.int32)
+        self.indices = (entries % max(len(self.trope_ids), 1)).astype(
+            np.int32)
+        self.indptr = np.zeros(len(self.work_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.entry_rows, minlength=len(self.work_ids)),
+            out=self.indptr[1:])
+        self.column_counts = np.bincount(
+            self.indices, minlength=len(self.trope_ids)).astype(np.int64)
+
+    @property
+    def shape(self):
+        return len(self.work_ids), len(self.trope_ids)
+
+    def get_rows(self, work_ids):
+        """Maps work ids to row indexes.
+
+        Args:
+            work_ids: Iterable of integer work ids.
+
+        Returns:
+            numpy int64 array of row indexes, in the same order. Works
+            without any tropes are mapped to -1.
+        """
+        return lookup_positions(self.work_ids, work_ids)
+
+    def get_columns(self, trope_ids):
+        """Maps trope ids to column indexes.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+
+        Returns:
+            numpy int64 array of column indexes, in the same order. Tropes
+            without any works are mapped to -1.
+        """
+        return lookup_positions(self.trope_ids, trope_ids)
+
+    def get_column_mask(self, trope_ids=None):
+        """Builds a boolean column mask.
+
+        Args:
+            trope_ids: Optional, iterable of trope ids to include.
+                None includes every column.
+
+        Returns:
+            numpy bool array, indexed by column.
+        """
+        if trope_ids is None:
+            return np.ones(len(self.trope_ids), dtype=bool)
+        mask = np.zeros(len(self.trope_ids), dtype=bool)
+        columns = self.get_columns(trope_ids)
+        mask[columns[columns >= 0]] = True
+        return mask
+
+    def get_row_columns(self, row):
+        """Gets the column indexes of a row."""
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def gather_rows(self, rows):
+        """Gets every entry of the given rows.
+
+        Args:
+            rows: numpy int array of row indexes.
+
+        Returns:
+            Tuple of two equal length numpy arrays:
+                Index into rows of the row each entry belongs to.
+                Column indexes.
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[np.asarray(rows) + 1] - starts
+        return (
+            np.repeat(np.arange(len(starts)), lengths),
+            self.indices[concatenate_ranges(starts, lengths)])
+
+    def count_row_columns(self, column_mask):
+        """Counts the entries of each row that fall in column_mask.
+
+        Args:
+            column_mask: numpy bool array, indexed by column.
+
+        Returns:
+            numpy int64 array, indexed by row.
+        """
+        return np.bincount(
+            self.entry_rows, weights=column_mask[self.indices],
+            minlength=len(self.work_ids)).astype(np.int64)
+
+
+def lookup_positions(sorted_ids, ids):
+    """Maps ids to their positions in a sorted id array.
+
+    Args:
+        sorted_ids: numpy int array of unique ids, sorted ascending.
+        ids: Iterable of integer ids to look up.
+
+    Returns:
+        numpy int64 array of positions in sorted_ids, in the same order as
+        ids. Ids not found are mapped to -1.
+    """
+    ids = np.asarray(list(ids), dtype=np.int64)
+    if not len(sorted_ids):
+        return np.full(len(ids), -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_ids, ids)
+    positions[positions >= len(sorted_ids)] = 0
+    return np.where(sorted_ids[positions] == ids, positions, -1)
+
+
+def concatenate_ranges(starts, lengths):
+    """Concatenates integer ranges, like a vectorized arange.
+
+    Args:
+        starts: numpy int array of range starts.
+        lengths: numpy int array of range lengths.
+
+    Returns:
+        numpy int64 array.
+    """
+    offsets = np.arange(lengths.sum(), dtype=np.int64)
+    offsets += np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets
+
+
+@cache.lru_cache(maxsize=1)
+def get_work_trope_matrix():
+    """Loads every trope-work connection into a WorkTropeMatrix.
+
+    Returns:
+        WorkTropeMatrix object.
+    """
+    return WorkTropeMatrix(*data_api.get_trope_work_edges())
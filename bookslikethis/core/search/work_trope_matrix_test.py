@@ -0,0 +1,86 @@
+import numpy as np
+
+from core import factories
+from core import test
+from core.search import work_trope_matrix
+
+
+class WorkTropeMatrixTest(test.TestCase):
+
+    def setUp(self):
+        self.matrix = work_trope_matrix.WorkTropeMatrix(
+            [30, 10, 10, 20, 10], [7, 5, 9, 7, 5])
+
+    def test_shape(self):
+        self.assertEqual(self.matrix.shape, (3, 3))
+        self.assertEqual(self.matrix.work_ids.tolist(), [10, 20, 30])
+        self.assertEqual(self.matrix.trope_ids.tolist(), [5, 7, 9])
+
+    def test_rows(self):
+        # Duplicate edges are dropped.
+        self.assertEqual(self.matrix.indptr.tolist(), [0, 2, 3, 4])
+        self.assertEqual(self.matrix.get_row_columns(0).tolist(), [0, 2])
+        self.assertEqual(self.matrix.get_row_columns(1).tolist(), [1])
+        self.assertEqual(self.matrix.get_row_columns(2).tolist(), [1])
+        self.assertEqual(self.matrix.entry_rows.tolist(), [0, 0, 1, 2])
+        self.assertEqual(self.matrix.column_counts.tolist(), [1, 2, 1])
+
+    def test_lookups(self):
+        self.assertEqual(
+            self.matrix.get_rows([30, 10, 15, 99]).tolist(), [2, 0, -1, -1])
+        self.assertEqual(self.matrix.get_columns([9, 1]).tolist(), [2, -1])
+
+    def test_gather_rows(self):
+        owners, columns = self.matrix.gather_rows(np.array([2, 0]))
+        self.assertEqual(owners.tolist(), [0, 1, 1])
+        self.assertEqual(columns.tolist(), [1, 0, 2])
+        owners, columns = self.matrix.gather_rows(np.array([], dtype=int))
+        self.assertEqual(owners.tolist(), [])
+        self.assertEqual(columns.tolist(), [])
+
+    def test_column_mask(self):
+        self.assertEqual(
+            self.matrix.get_column_mask().tolist(), [True, True, True])
+        self.assertEqual(
+            self.matrix.get_column_mask([9, 1]).tolist(),
+            [False, False, True])
+        self.assertEqual(
+            self.matrix.count_row_columns(
+                self.matrix.get_column_mask([5, 7])).tolist(),
+            [1, 1, 1])
+
+    def test_empty(self):
+        matrix = work_trope_matrix.WorkTropeMatrix([], [])
+        self.assertEqual(matrix.shape, (0, 0))
+        self.assertEqual(matrix.get_rows([1]).tolist(), [-1])
+        self.assertEqual(matrix.count_row_columns(
+            matrix.get_column_mask()).tolist(), [])
+
+
+class ConcatenateRangesTest(test.TestCase):
+
+    def test_happy(self):
+        self.assertEqual(
+            work_trope_matrix.concatenate_ranges(
+                np.array([5, 0, 9]), np.array([2, 0, 3])).tolist(),
+            [5, 6, 9, 10, 11])
+
+    def test_empty(self):
+        self.assertEqual(
+            work_trope_matrix.concatenate_ranges(
+                np.array([], dtype=int), np.array([], dtype=int)).tolist(),
+            [])
+
+
+class GetWorkTropeMatrixTest(test.TestCase):
+
+    def test_happy(self):
+        trope = factories.TropeFactory.create()
+        trope_two = factories.TropeFactory.create()
+        work = factories.WorkFactory.create(tropes=[trope, trope_two])
+        work_two = factories.WorkFactory.create(tropes=[trope_two])
+        factories.WorkFactory.create()
+        matrix = work_trope_matrix.get_work_trope_matrix()
+        self.assertEqual(matrix.work_ids.tolist(), [work.id, work_two.id])
+        self.assertEqual(matrix.trope_ids.tolist(), [trope.id, trope_two.id])
+        self.assertEqual(matrix.indices.tolist(), [0, 1, 1])
@@ -4,6 +4,9 @@ from unittest import mock
 from django import test
 from webpack_loader import loader
 
+from core import cache
+from core.search import autocomplete_cache
+
 
 class TestCase(test.TestCase):
     """Base test case for this project."""
@@ -16,6 +19,8 @@ class TestCase(test.TestCase):
         self.maxDiff = None
         # Suppress log messages below error.
         logging.disable(logging.ERROR)
+        # Don't carry a data generation over from another test's DB state.
+        cache.forget_data_generation()
 
     def run(self, *args, **kwargs):
         self._setUp()
@@ -25,4 +30,6 @@ class TestCase(test.TestCase):
                 with self.settings(CACHE_ENABLED=False):
                     super().run(*args, **kwargs)
             else:
+                cache.get_result_cache().clear()
+                autocomplete_cache.clear()
                 super().run(*args, **kwargs)
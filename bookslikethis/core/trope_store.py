@@ -0,0 +1,127 @@
+"""Compact in-memory table of every trope's tags."""
+import numpy as np
+
+
+class TropeStore(object):
+    """A read-only map of trope id to the tags of the trope.
+
+    Tropes are plain ints rather than model instances, and their tags are
+    flat arrays, so tag filters and tag weights can be applied to many
+    tropes at once.
+
+    Attributes:
+        trope_ids: numpy int64 array of every trope id, ascending.
+        tag_names: Tuple of string tag names, ascending.
+        memberships: numpy bool array, shape (len(trope_ids) + 1,
+            len(tag_names)). memberships[i, j] is whether trope_ids[i] has
+            tag_names[j]. The extra last row is all False, so that unknown
+            tropes, at position -1, have no tags.
+    """
+
+    def __init__(self, trope_ids, edge_trope_ids, edge_tag_names):
+        """Builds the store.
+
+        Args:
+            trope_ids: Iterable of every integer trope id.
+            edge_trope_ids: Iterable of integer trope ids.
+            edge_tag_names: Iterable of string tag names, connected to the
+                trope id at the same position. Duplicate edges are ignored.
+        """
+        self.trope_ids = np.unique(
+            np.asarray(list(trope_ids), dtype=np.int64))
+        edge_tag_names = list(edge_tag_names)
+        self.tag_names = tuple(sorted(set(edge_tag_names)))
+        tag_name_to_column = {
+            name: i for (i, name) in enumerate(self.tag_names)}
+        self.memberships = np.zeros(
+            (len(self.trope_ids) + 1, len(self.tag_names)), dtype=bool)
+        self.memberships[
+            self._get_positions(edge_trope_ids),
+            [tag_name_to_column[name] for name in edge_tag_names]] = True
+        # Edges of unknown tropes landed in the last row.
+        self.memberships[-1] = False
+
+    def get_trope_ids(self, tag_names=None):
+        """Gets the ids of tropes with any of the given tags.
+
+        Args:
+            tag_names: Optional, iterable of string tag names. None matches
+                every trope, including tropes without tags.
+
+        Returns:
+            List of integer trope ids, ascending.
+        """
+        return self.trope_ids[
+            self.get_tag_mask(self.trope_ids, tag_names=tag_names)].tolist()
+
+    def get_trope_id_set(self, tag_names):
+        """Gets the ids of tropes with any of the given tags, as a set.
+
+        Args:
+            tag_names: Iterable of string tag names. Unknown names are
+                ignored.
+
+        Returns:
+            frozenset of integer trope ids.
+        """
+        return frozenset(self.get_trope_ids(tag_names=tag_names))
+
+    def get_tag_mask(self, trope_ids, tag_names=None):
+        """Finds which tropes have any of the given tags.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+            tag_names: Optional, iterable of string tag names. None matches
+                every trope, including tropes without tags.
+
+        Returns:
+            numpy bool array, in the same order as trope_ids.
+        """
+        positions = self._get_positions(trope_ids)
+        if tag_names is None:
+            return np.ones(len(positions), dtype=bool)
+        columns = self._get_tag_columns(tag_names)
+        return self.memberships[positions][:, columns].any(axis=1)
+
+    def get_weight_bounds(self, trope_ids, tag_weights):
+        """Finds the lowest and highest tag weight of each trope.
+
+        Args:
+            trope_ids: Iterable of integer trope ids.
+            tag_weights: Dict of string tag name to float weight.
+
+        Returns:
+            Tuple of two numpy float64 arrays, in the same order as
+            trope_ids: the min and the max weight of the trope's tags in
+            tag_weights. Tropes without any such tag get 1 for both.
+        """
+        positions = self._get_positions(trope_ids)
+        columns = self._get_tag_columns(tag_weights)
+        weights = np.array(
+            [tag_weights[self.tag_names[column]]
+             for column in columns.tolist()], dtype=np.float64)
+        memberships = self.memberships[positions][:, columns]
+        has_weight = memberships.any(axis=1)
+        low = np.where(memberships, weights, np.inf).min(
+            axis=1, initial=np.inf)
+        high = np.where(memberships, weights, -np.inf).max(
+            axis=1, initial=-np.inf)
+        low[~has_weight] = 1
+        high[~has_weight] = 1
+        return low, high
+
+    def _get_positions(self, trope_ids):
+        """Maps trope ids to positions in trope_ids, or -1 if unknown."""
+        trope_ids = np.asarray(list(trope_ids), dtype=np.int64)
+        if not len(self.trope_ids):
+            return np.full(len(trope_ids), -1, dtype=np.int64)
+        positions = np.searchsorted(self.trope_ids, trope_ids)
+        positions[positions >= len(self.trope_ids)] = 0
+        return np.where(self.trope_ids[positions] == trope_ids, positions, -1)
+
+    def _get_tag_columns(self, tag_names):
+        """Maps tag names to column indexes, skipping unknown tags."""
+        tag_names = set(tag_names)
+        return np.array(
+            [i for (i, name) in enumerate(self.tag_names)
+             if name in tag_names], dtype=np.int64)
@@ -0,0 +1,67 @@
+from core import test
+from core import trope_store
+
+
+class TropeStoreTest(test.TestCase):
+
+    def setUp(self):
+        self.store = trope_store.TropeStore(
+            [9, 3, 5, 7],
+            [5, 5, 3, 9, 3], ['plot', 'setting', 'plot', 'politics', 'plot'])
+
+    def test_store(self):
+        self.assertEqual(self.store.trope_ids.tolist(), [3, 5, 7, 9])
+        self.assertEqual(
+            self.store.tag_names, ('plot', 'politics', 'setting'))
+        # Duplicate edges are dropped, and unknown tropes have no tags.
+        self.assertEqual(
+            self.store.memberships.tolist(),
+            [[True, False, False],
+             [True, False, True],
+             [False, False, False],
+             [False, True, False],
+             [False, False, False]])
+
+    def test_trope_ids(self):
+        self.assertEqual(self.store.get_trope_ids(), [3, 5, 7, 9])
+        self.assertEqual(self.store.get_trope_ids(['plot']), [3, 5])
+        self.assertEqual(
+            self.store.get_trope_ids(['setting', 'politics']), [5, 9])
+        self.assertEqual(self.store.get_trope_ids([]), [])
+        self.assertEqual(self.store.get_trope_ids(['fake']), [])
+
+    def test_trope_id_set(self):
+        self.assertEqual(
+            self.store.get_trope_id_set(['politics', 'setting']),
+            frozenset([5, 9]))
+        self.assertEqual(
+            self.store.get_trope_id_set(('plot', 'plot', 'fake')),
+            frozenset([3, 5]))
+        self.assertEqual(self.store.get_trope_id_set([]), frozenset())
+
+    def test_tag_mask(self):
+        self.assertEqual(
+            self.store.get_tag_mask(
+                [9, 5, 3, 7, 100], ['setting', 'politics']).tolist(),
+            [True, True, False, False, False])
+        self.assertEqual(
+            self.store.get_tag_mask([9, 100]).tolist(), [True, True])
+        self.assertEqual(
+            self.store.get_tag_mask([9, 7], []).tolist(), [False, False])
+        self.assertEqual(
+            self.store.get_tag_mask([9], ['fake']).tolist(), [False])
+
+    def test_weight_bounds(self):
+        low, high = self.store.get_weight_bounds(
+            [3, 5, 9, 7, 100], {'setting': 0.5, 'plot': 3, 'fake': 10})
+        self.assertEqual(low.tolist(), [3, 0.5, 1, 1, 1])
+        self.assertEqual(high.tolist(), [3, 3, 1, 1, 1])
+
+    def test_empty(self):
+        store = trope_store.TropeStore([], [], [])
+        self.assertEqual(store.get_trope_ids(), [])
+        self.assertEqual(
+            store.get_tag_mask([1], ['plot']).tolist(), [False])
+        low, high = store.get_weight_bounds([1], {'plot': 3})
+        self.assertEqual(low.tolist(), [1])
+        self.assertEqual(high.tolist(), [1])
@@ -0,0 +1,33 @@
+"""Health check view."""
+import os
+
+from django import http
+from django import views
+
+from core import cache
+from core import warmup
+from core.search import autocomplete_cache
+
+
+class HealthView(views.View):
+    """Reports whether this worker process is ready to serve searches.
+
+    Responds with status 503 until search caches are first warmed. After
+    a data change, caches are rewarmed in the background, while the
+    process keeps serving and reports itself as stale.
+    """
+
+    def get(self, request):
+        cache_readiness = warmup.get_cache_readiness()
+        stale = not all(cache_readiness.values())
+        if stale:
+            warmup.rewarm_in_background()
+        ready = not stale or warmup.has_warmed()
+        return http.JsonResponse(
+            {'ready': ready,
+             'stale': stale,
+             'pid': os.getpid(),
+             'data_generation': cache.get_data_generation(),
+             'caches': cache_readiness,
+             'autocomplete_cache': autocomplete_cache.get_stats()},
+            status=200 if ready else 503)
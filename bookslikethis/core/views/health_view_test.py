@@ -0,0 +1,45 @@
+import json
+from unittest import mock
+
+from core import cache
+from core import test
+from core import warmup
+
+
+class HealthViewTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_ready(self):
+        warmup.warm_caches()
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['ready'])
+        self.assertEqual(data['data_generation'], 0)
+        self.assertEqual(
+            set(data['caches']), set(warmup.get_cache_readiness()))
+        self.assertTrue(all(data['caches'].values()))
+
+    def test_cold(self):
+        warmup.clear_caches()
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 503)
+        data = json.loads(response.content)
+        self.assertFalse(data['ready'])
+        self.assertTrue(data['stale'])
+        self.assertFalse(any(data['caches'].values()))
+
+    def test_stale(self):
+        """Stale processes keep serving while caches are rewarmed."""
+        warmup.warm_caches()
+        cache.bump_data_generation()
+        with mock.patch.object(
+                warmup, 'rewarm_in_background') as rewarm_mock:
+            response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue(data['ready'])
+        self.assertTrue(data['stale'])
+        self.assertEqual(data['data_generation'], 1)
+        rewarm_mock.assert_called_once_with()
@@ -1,45 +1,168 @@
 """Search related views."""
+import json
+import logging
+
 from django import http
 from django import views
+from django.utils import decorators
+from django.views.decorators import csrf
 
 from core.search import search_api
-from core import data_api
+from core import data_loader
+from core import json_fragments
+
+log = logging.getLogger(__name__)
 
 
 class SearchView(views.View):
-    """Searches for works similar to a given set."""
+    """Searches for works similar to a given set.
+
+    Results are paged with the offset and limit query parameters. Responses
+    include the next_offset to request, or null after the last page.
+
+    There's no cursor on purpose. Rankings stop at
+    search_api.MAX_RANKED_RESULTS (200) works, and the deep ranking is
+    computed once per search and kept in the shared result cache, so every
+    later page is a slice of it. A cursor wouldn't save any ranking work,
+    and offsets stay valid however the pages are requested.
+    """
 
     MAX_QUERY_WORKS = 200
+    MAX_PAGE_SIZE = 50
 
     def get(self, request):
-        work_info_dicts = []
+        try:
+            offset, limit = self._extract_page(request)
+        except ValueError as e:
+            return http.HttpResponseBadRequest(str(e))
+        results = b'[]'
+        next_offset = None
         work_ids = self._extract_work_ids(request)
         if work_ids:
-            similar_work_ids, trope_id_to_weight = (
-                search_api.get_similar_books(
-                    work_ids))
+            similar_work_ids, trope_id_to_weight, next_offset = (
+                search_api.get_similar_books_page(
+                    work_ids, offset=offset, limit=limit))
             if similar_work_ids:
-                work_info_dicts = data_api.get_work_info_dicts_by_id(
+                # Assembled from pre-encoded fragments, rather than
+                # building and encoding result dicts for every request.
+                results = json_fragments.encode_work_results(
                     similar_work_ids,
                     allowed_trope_id_to_weight=trope_id_to_weight)
-        return http.JsonResponse(
-            {'results': work_info_dicts})
+        return http.HttpResponse(
+            b'{"results": ' + results +
+            b', "next_offset": ' + json.dumps(next_offset).encode('ascii') +
+            b'}',
+            content_type='application/json')
+
+    def _extract_page(self, request):
+        """Turns offset and limit query parameters into integers.
+
+        Raises:
+            ValueError if either parameter is malformed.
+        """
+        try:
+            offset = int(request.GET.get('offset', 0))
+            limit = int(request.GET.get(
+                'limit', search_api.MAX_SEARCH_RESULTS))
+        except ValueError:
+            raise ValueError('offset and limit must be integers.')
+        if offset < 0 or not 0 < limit <= SearchView.MAX_PAGE_SIZE:
+            raise ValueError(
+                'offset must be at least 0, and limit between 1 and %s.' % (
+                    SearchView.MAX_PAGE_SIZE))
+        return offset, limit
 
     def _extract_work_ids(self, request):
-        """Turns query parameter into a set of work ids."""
-        work_ids = set([])
-        if request.GET.getlist('works'):
-            work_ids = work_ids.union(set(
-                data_api.get_work_ids_by_name(
-                    request.GET.getlist('works'))))
+        """Turns query parameters into a set of work ids."""
         query = request.GET.get('query')
-        if query:
-            work_id = search_api.get_work_id_for_search_query(query)
-            if work_id is not None:
-                work_ids.add(work_id)
+        work_ids = search_api.resolve_work_ids(
+            request.GET.getlist('works'), [query] if query else [])
         return set(list(work_ids)[:SearchView.MAX_QUERY_WORKS])
 
 
+@decorators.method_decorator(csrf.csrf_exempt, name='dispatch')
+class BatchSearchView(views.View):
+    """Searches for works similar to each of many sets, for API clients.
+
+    Takes a JSON body like {"queries": [[work id, ...], ...]}, and streams
+    newline delimited JSON back: one {"results": [...]} line per query, in
+    the same order. Queries are searched in chunks, so clients can start
+    reading results before the whole batch is done. A query that fails
+    gets an {"error": "..."} line instead, since the response status is
+    sent before any search runs.
+    """
+
+    MAX_QUERIES = 1000
+    CHUNK_SIZE = 50
+
+    def post(self, request):
+        try:
+            queries = self._extract_queries(request)
+        except ValueError as e:
+            return http.HttpResponseBadRequest(str(e))
+        return http.StreamingHttpResponse(
+            self._stream_results(queries),
+            content_type='application/x-ndjson')
+
+    def _extract_queries(self, request):
+        """Parses the request body into a list of lists of work ids.
+
+        Raises:
+            ValueError if the body is malformed.
+        """
+        try:
+            queries = json.loads(request.body.decode('utf-8'))['queries']
+        except (UnicodeDecodeError, KeyError, TypeError, ValueError):
+            raise ValueError('Expected a JSON object with a queries list.')
+        if not isinstance(queries, list):
+            raise ValueError('Expected a JSON object with a queries list.')
+        max_queries = BatchSearchView.MAX_QUERIES
+        if len(queries) > max_queries:
+            raise ValueError('At most %s queries are allowed.' % max_queries)
+        if not all(
+                isinstance(work_ids, list) and
+                all(isinstance(wid, int) and not isinstance(wid, bool)
+                    for wid in work_ids)
+                for work_ids in queries):
+            raise ValueError('Each query must be a list of work ids.')
+        return [
+            work_ids[:SearchView.MAX_QUERY_WORKS] for work_ids in queries]
+
+    def _stream_results(self, queries):
+        """Yields a line of JSON results, or an error, per query."""
+        # This runs after the view returns, when DataLoaderMiddleware's
+        # scope is over, so chunks share a scope of their own.
+        with data_loader.request_scope():
+            for start in range(
+                    0, len(queries), BatchSearchView.CHUNK_SIZE):
+                chunk = queries[start:start + BatchSearchView.CHUNK_SIZE]
+                try:
+                    lines = self._search(chunk)
+                except Exception:
+                    # Search the chunk's queries one by one, to find which
+                    # failed.
+                    lines = []
+                    for work_ids in chunk:
+                        try:
+                            lines.extend(self._search([work_ids]))
+                        except Exception:
+                            log.exception(
+                                'Batch search failed: %s', work_ids)
+                            lines.append(b'{"error": "Search failed."}\n')
+                yield from lines
+
+    def _search(self, queries):
+        """Searches queries together.
+
+        Returns:
+            List of lines of JSON results, one per query.
+        """
+        return [
+            b'{"results": ' + results + b'}\n'
+            for results in json_fragments.encode_work_results_batch(
+                search_api.get_similar_books_batch(queries))]
+
+
 class AutocompleteView(views.View):
     """Autocompleter for work names."""
 
@@ -1,8 +1,11 @@
 import json
 from unittest import mock
 
+from core import data_loader
 from core import test
 from core import factories
+from core.search import search_api
+from core.views import search_views
 
 
 class SearchViewTest(test.TestCase):
@@ -157,6 +160,141 @@ class SearchViewTest(test.TestCase):
               'genres': []}])
 
 
+class SearchViewPaginationTest(test.TestCase):
+
+    def setUp(self):
+        tag = factories.TropeTagFactory.create()
+        trope = factories.TropeFactory.create(tags=[tag])
+        self.work = factories.WorkFactory.create(tropes=[trope])
+        self.similar_works = [
+            factories.WorkFactory.create(tropes=[trope]) for _ in range(3)]
+
+    def test_pages(self):
+        response = self.client.get(
+            '/api/search/?works=%s&limit=2' % self.work.name)
+        self.assertEquals(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEquals(len(data['results']), 2)
+        self.assertEquals(data['next_offset'], 2)
+
+        response = self.client.get(
+            '/api/search/?works=%s&limit=2&offset=%s' % (
+                self.work.name, data['next_offset']))
+        self.assertEquals(response.status_code, 200)
+        next_data = json.loads(response.content)
+        self.assertEquals(len(next_data['results']), 1)
+        self.assertIsNone(next_data['next_offset'])
+        self.assertCountEqual(
+            [r['id'] for r in data['results'] + next_data['results']],
+            [w.id for w in self.similar_works])
+
+    def test_bad_params(self):
+        too_big = search_views.SearchView.MAX_PAGE_SIZE + 1
+        for params in ('offset=a', 'limit=a', 'offset=-1', 'limit=0',
+                       'limit=%s' % too_big):
+            response = self.client.get(
+                '/api/search/?works=%s&%s' % (self.work.name, params))
+            self.assertEquals(response.status_code, 400, params)
+
+
+class BatchSearchViewTest(test.TestCase):
+
+    def _post(self, body):
+        return self.client.post(
+            '/api/search/batch/', body, content_type='application/json')
+
+    def test_happy(self):
+        tag = factories.TropeTagFactory.create()
+        trope = factories.TropeFactory.create(tags=[tag])
+        work = factories.WorkFactory.create(tropes=[trope])
+        work_two = factories.WorkFactory.create(tropes=[trope], creator=None)
+
+        response = self._post(json.dumps(
+            {'queries': [[work.id], [], [work_two.id], [work.id]]}))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals(
+            [[r['id'] for r in json.loads(line)['results']]
+             for line in lines],
+            [[work_two.id], [], [work.id], [work_two.id]])
+
+        single_response = self.client.get(
+            '/api/search/?works=%s' % work.name)
+        # Batch lines aren't paged, so they have no next_offset.
+        self.assertEquals(
+            json.loads(lines[0])['results'],
+            json.loads(single_response.content)['results'])
+
+    def test_chunks(self):
+        tag = factories.TropeTagFactory.create()
+        trope = factories.TropeFactory.create(tags=[tag])
+        work = factories.WorkFactory.create(tropes=[trope])
+        factories.WorkFactory.create(tropes=[trope])
+        with mock.patch.object(search_views.BatchSearchView, 'CHUNK_SIZE', 2):
+            response = self._post(json.dumps({'queries': [[work.id]] * 5}))
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals(len(lines), 5)
+        self.assertEquals(len({line for line in lines}), 1)
+
+    def test_loader_scope(self):
+        loaders = []
+
+        def get_similar_books_batch(work_id_sets):
+            loaders.append(data_loader.get_current_loader())
+            return [[] for _ in work_id_sets]
+
+        with mock.patch.object(
+                search_views.BatchSearchView, 'CHUNK_SIZE', 1), \
+                mock.patch.object(
+                    search_api, 'get_similar_books_batch',
+                    side_effect=get_similar_books_batch):
+            response = self._post(json.dumps({'queries': [[1], [2]]}))
+            b''.join(response.streaming_content)
+        self.assertIsNotNone(loaders[0])
+        self.assertIs(loaders[0], loaders[1])
+        self.assertIsNone(data_loader.get_current_loader())
+
+    def test_failed_query(self):
+        tag = factories.TropeTagFactory.create()
+        trope = factories.TropeFactory.create(tags=[tag])
+        work = factories.WorkFactory.create(tropes=[trope])
+        work_two = factories.WorkFactory.create(tropes=[trope])
+        get_similar_books_batch = search_api.get_similar_books_batch
+
+        def fail_for_work_two(work_id_sets):
+            if [work_two.id] in work_id_sets:
+                raise ValueError
+            return get_similar_books_batch(work_id_sets)
+
+        with mock.patch.object(
+                search_api, 'get_similar_books_batch',
+                side_effect=fail_for_work_two):
+            response = self._post(json.dumps(
+                {'queries': [[work.id], [work_two.id], [work.id]]}))
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            [json.loads(line) for line in lines][1],
+            {'error': 'Search failed.'})
+        self.assertEquals(
+            [[r['id'] for r in json.loads(line)['results']]
+             for line in (lines[0], lines[2])],
+            [[work_two.id], [work_two.id]])
+
+    def test_bad_request(self):
+        for body in ('', 'nope', '[]', '{"queries": 1}',
+                     '{"queries": [["a"]]}', '{"queries": [1]}',
+                     '{"queries": [[true]]}'):
+            response = self._post(body)
+            self.assertEquals(response.status_code, 400, body)
+
+    def test_too_many_queries(self):
+        with mock.patch.object(search_views.BatchSearchView, 'MAX_QUERIES', 1):
+            response = self._post(json.dumps({'queries': [[1], [2]]}))
+        self.assertEquals(response.status_code, 400)
+
+
 class AutocompleteViewTest(test.TestCase):
 
     def test_happy(self):
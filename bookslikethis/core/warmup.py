@@ -0,0 +1,168 @@
+"""Fills in-process caches before requests need them."""
+import gc
+import logging
+import threading
+
+from django import db
+from django.conf import settings
+
+from core import cache
+from core import data_api
+from core import index_snapshot
+from core import json_fragments
+from core.search import autocomplete_cache
+from core.search import autocomplete_index
+from core.search import inverted_index
+from core.search import minhash_lsh
+from core.search import search_api
+from core.search import work_similarity
+from core.search import work_trope_matrix
+
+# Cached functions always filled by warm_caches, in the order they're
+# filled. See get_warmed_functions.
+WARMED_FUNCTIONS = (
+    index_snapshot.get_snapshot,
+    data_api.get_trope_store,
+    data_api._get_trope_id_set,
+    data_api._get_sorted_trope_ids,
+    data_api._get_trope_to_occurrence_count,
+    data_api.get_genre_info,
+    work_trope_matrix.get_work_trope_matrix,
+    inverted_index.get_trope_inverted_index,
+    work_similarity.get_work_genre_signatures,
+    json_fragments.get_trope_fragments,
+    json_fragments.get_work_header_fragments,
+    autocomplete_index.get_autocomplete_index,
+)
+
+log = logging.getLogger(__name__)
+
+# Whether warm_caches has completed in this process, or in the process it
+# was forked from.
+_has_warmed = False
+_rewarm_thread = None
+_rewarm_lock = threading.Lock()
+
+
+def clear_caches():
+    """Empties every in-process cache, and the shared result cache."""
+    global _has_warmed
+    _has_warmed = False
+    for func in WARMED_FUNCTIONS + (minhash_lsh.get_minhash_lsh_index, ):
+        func.cache_clear()
+    cache.get_result_cache().clear()
+    autocomplete_cache.clear()
+
+
+def warm_caches():
+    """Fills every in-process cache used for searches."""
+    global _has_warmed
+    index_snapshot.get_snapshot()
+    data_api.get_trope_store()
+    data_api.get_trope_ids(
+        tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()))
+    data_api.get_trope_to_occurrence_count(
+        tag_names=tuple(search_api.TROPE_TAG_WEIGHTS.keys()))
+    data_api.get_genre_info()
+    work_trope_matrix.get_work_trope_matrix()
+    inverted_index.get_trope_inverted_index()
+    if _uses_lsh():
+        minhash_lsh.get_minhash_lsh_index()
+    work_similarity.get_work_genre_signatures()
+    json_fragments.get_trope_fragments()
+    json_fragments.get_work_header_fragments()
+    autocomplete_index.get_autocomplete_index()
+    _has_warmed = True
+
+
+def get_warmed_functions():
+    """Gets the cached functions filled by warm_caches.
+
+    The MinHash LSH index is only included when searches use it, since it
+    takes a while to build and holds a signature per work. Otherwise it's
+    built on first use.
+
+    Returns:
+        Tuple of functions, in the order they're filled.
+    """
+    if not _uses_lsh():
+        return WARMED_FUNCTIONS
+    position = WARMED_FUNCTIONS.index(
+        inverted_index.get_trope_inverted_index) + 1
+    return (
+        WARMED_FUNCTIONS[:position] + (minhash_lsh.get_minhash_lsh_index, ) +
+        WARMED_FUNCTIONS[position:])
+
+
+def _uses_lsh():
+    """Checks whether searches use the MinHash LSH index by default."""
+    return work_similarity.LSH_MIN_REFERENCE_WORKS is not None
+
+
+def has_warmed():
+    """Checks whether caches were warmed once, of any data generation.
+
+    Returns:
+        Boolean.
+    """
+    return _has_warmed
+
+
+def rewarm_in_background():
+    """Warms caches on a background thread, unless one is running.
+
+    Caches otherwise only refill when a request needs them, so this lets
+    a process catch up with a data change without waiting for traffic.
+    Does nothing when caching is disabled, or inside a transaction, since
+    the thread's own connection can't see its uncommitted writes.
+    """
+    global _rewarm_thread
+    if not settings.CACHE_ENABLED or db.connection.in_atomic_block:
+        return
+    with _rewarm_lock:
+        if _rewarm_thread is not None and _rewarm_thread.is_alive():
+            return
+        _rewarm_thread = threading.Thread(
+            target=_rewarm, name='rewarm-caches', daemon=True)
+        _rewarm_thread.start()
+
+
+def _rewarm():
+    """Warms caches. Runs on the background thread."""
+    try:
+        warm_caches()
+    except Exception:
+        log.exception('Failed to rewarm caches.')
+    finally:
+        # No request finishes on this thread to close its connection.
+        db.connection.close()
+
+
+def get_cache_readiness():
+    """Checks which in-process caches hold data of the current generation.
+
+    Returns:
+        Dict of string qualified function name to boolean, for each of
+        get_warmed_functions.
+    """
+    generation = cache.get_data_generation()
+    return {
+        '%s.%s' % (func.__module__, func.__name__): (
+            func.cache_info().currsize > 0 and
+            func.cache_generation() == generation)
+        for func in get_warmed_functions()}
+
+
+def prepare_to_fork():
+    """Warms caches in a server process that will fork workers.
+
+    Forked workers share the warmed data with the parent, page by page,
+    until either writes to a page. Freezing the garbage collector keeps
+    collections in the workers from touching, and so copying, the pages
+    of these long lived objects.
+    """
+    warm_caches()
+    # DB connections can't be shared across a fork.
+    db.connections.close_all()
+    gc.collect()
+    gc.freeze()
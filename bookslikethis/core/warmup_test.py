@@ -0,0 +1,102 @@
+import gc
+from unittest import mock
+
+from core import data_api
+from core import test
+from core import warmup
+from core.search import minhash_lsh
+from core.search import work_similarity
+from core.search import work_trope_matrix
+
+
+class WarmCachesTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_happy(self):
+        warmup.clear_caches()
+        warmup.warm_caches()
+        data_api.get_trope_ids()
+        work_trope_matrix.get_work_trope_matrix()
+        self.assertEqual(data_api.get_trope_store.cache_info().misses, 1)
+        self.assertEqual(
+            work_trope_matrix.get_work_trope_matrix.cache_info().misses, 1)
+        # LSH is off by default, so its index isn't built.
+        self.assertEqual(
+            minhash_lsh.get_minhash_lsh_index.cache_info().currsize, 0)
+
+    @mock.patch.object(work_similarity, 'LSH_MIN_REFERENCE_WORKS', 10)
+    def test_lsh(self):
+        warmup.clear_caches()
+        warmup.warm_caches()
+        self.assertEqual(
+            minhash_lsh.get_minhash_lsh_index.cache_info().currsize, 1)
+
+
+class GetCacheReadinessTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def test_happy(self):
+        warmup.clear_caches()
+        readiness = warmup.get_cache_readiness()
+        self.assertEqual(len(readiness), len(warmup.WARMED_FUNCTIONS))
+        self.assertNotIn(
+            'core.search.minhash_lsh.get_minhash_lsh_index', readiness)
+        self.assertFalse(readiness['core.data_api.get_trope_store'])
+
+        data_api.get_trope_ids()
+        self.assertTrue(
+            warmup.get_cache_readiness()['core.data_api.get_trope_store'])
+
+        warmup.warm_caches()
+        self.assertTrue(all(warmup.get_cache_readiness().values()))
+
+    @mock.patch.object(work_similarity, 'LSH_MIN_REFERENCE_WORKS', 10)
+    def test_lsh(self):
+        warmup.clear_caches()
+        self.assertFalse(
+            warmup.get_cache_readiness()[
+                'core.search.minhash_lsh.get_minhash_lsh_index'])
+        warmup.warm_caches()
+        self.assertTrue(all(warmup.get_cache_readiness().values()))
+
+
+class RewarmInBackgroundTest(test.TestCase):
+
+    MOCK_CACHE = False
+
+    def setUp(self):
+        self.addCleanup(setattr, warmup, '_rewarm_thread', None)
+
+    def test_happy(self):
+        warmup.clear_caches()
+        # Runs the warm-up on this thread, which can see the test's data.
+        with mock.patch.object(
+                warmup.threading, 'Thread') as thread_mock, \
+                mock.patch.object(
+                    warmup.db, 'connection',
+                    mock.Mock(in_atomic_block=False)):
+            thread_mock.return_value.start.side_effect = (
+                lambda: thread_mock.call_args[1]['target']())
+            warmup.rewarm_in_background()
+            # Only one runs at a time.
+            warmup.rewarm_in_background()
+        thread_mock.assert_called_once()
+        self.assertTrue(warmup.has_warmed())
+        self.assertTrue(all(warmup.get_cache_readiness().values()))
+
+    def test_in_transaction(self):
+        with mock.patch.object(warmup.threading, 'Thread') as thread_mock:
+            warmup.rewarm_in_background()
+        thread_mock.assert_not_called()
+
+
+class PrepareToForkTest(test.TestCase):
+
+    def test_happy(self):
+        with mock.patch.object(warmup, 'warm_caches') as warm_mock, \
+                mock.patch.object(gc, 'freeze') as freeze_mock:
+            warmup.prepare_to_fork()
+        warm_mock.assert_called_once_with()
+        freeze_mock.assert_called_once_with()
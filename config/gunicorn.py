@@ -1,4 +1,30 @@
+# Nginx starts sending traffic once this file exists.
+READY_FILE = '/tmp/app-initialized'
+
+
+def on_starting(server):
+    # With --preload, the app is already loaded here, before any worker
+    # forks. Warm it so that workers share one copy of the search data.
+    if server.cfg.preload_app:
+        from core import warmup
+        warmup.prepare_to_fork()
+
+
 def when_ready(server):
-    open('/tmp/app-initialized', 'w').close()
+    # Without --preload, workers warm themselves. See post_worker_init.
+    if server.cfg.preload_app:
+        _signal_ready()
+
+
+def post_worker_init(worker):
+    # Runs after the worker loads the app, before it accepts requests.
+    if not worker.cfg.preload_app:
+        from core import warmup
+        warmup.warm_caches()
+        _signal_ready()
+
+
+def _signal_ready():
+    open(READY_FILE, 'w').close()
 
-bind = 'unix:///tmp/nginx.socket'
\ No newline at end of file
+bind = 'unix:///tmp/nginx.socket'